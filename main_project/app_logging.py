@@ -0,0 +1,195 @@
+# Structured, non-blocking logging
+#
+# Request code only puts records on a bounded queue; a listener thread formats
+# them (JSON lines by default) and writes them to stderr. When the queue is full
+# records are dropped and counted rather than blocking the event loop. Each
+# record carries the correlation ID of the request that logged it, taken from
+# the X-Request-ID header or generated, and echoed back in the response.
+#
+# High-volume events pass extra={"sample_rate": 0.01} to keep about 1 in 100;
+# kept records show the rate so counts can be scaled back up.
+
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Libraries that log routine events at INFO, kept at WARNING unless LOG_LEVEL is DEBUG;
+# the pools in db_pool log through SQLAlchemy under their own module name
+QUIET_LOGGERS = ("sqlalchemy", "db_pool", "httpx", "httpcore", "multipart", "PIL")
+# Opt-in: stop recording caller file/line, process and thread on every LogRecord.
+# This switches process-wide flags of the logging module, for all libraries too
+LOG_LEAN_RECORDS = os.getenv("LOG_LEAN_RECORDS", "0") == "1"
+# Share of high-volume (per request) events kept, see HIGH_VOLUME
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+REQUEST_ID_HEADER = "X-Request-ID"
+# Client supplied IDs are only trusted when short and plain
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+# Attributes every LogRecord has; anything else was passed through extra=
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "correlation_id"}
+
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+# logger.debug("...", extra=HIGH_VOLUME) for events logged on every request
+HIGH_VOLUME = {"sample_rate": LOG_SAMPLE_RATE}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            entry["correlation_id"] = record.correlation_id
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s")
+
+
+class RequestContextFilter(logging.Filter):
+    # Runs in the caller, where the request's context is still current
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return False
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int = LOG_QUEUE_SIZE):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the listener thread; only a traceback is rendered now,
+        # while its frames are still intact
+        if record.exc_info:
+            record = copy.copy(record)
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # SimpleQueue has no bound of its own; the size check is approximate across threads
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put(record)
+
+
+class LoggingState:
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        # logging module flags as they were before lean records were switched on
+        self.saved_flags = None
+
+    def stats(self) -> dict:
+        if self.handler is None:
+            return {}
+        return {"queued": self.handler.queue.qsize(), "dropped": self.handler.dropped}
+
+
+state = LoggingState()
+
+
+LEAN_FLAGS = ("_srcfile", "logProcesses", "logMultiprocessing", "logThreads")
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, queue_size: int = LOG_QUEUE_SIZE, stream=None,
+                  lean_records: bool = LOG_LEAN_RECORDS) -> None:
+    # Idempotent; the root logger gets the queue handler, the listener owns the stream
+    if state.listener is not None:
+        return
+    if lean_records:
+        # Our formatters do not show caller file/line, process or thread; not collecting
+        # them makes each LogRecord cheaper, but applies to every logger in the process
+        state.saved_flags = {name: getattr(logging, name) for name in LEAN_FLAGS}
+        logging._srcfile = None
+        logging.logProcesses = logging.logMultiprocessing = logging.logThreads = False
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+    state.handler = NonBlockingQueueHandler(queue.SimpleQueue(), queue_size)
+    state.handler.addFilter(RequestContextFilter())
+    state.listener = logging.handlers.QueueListener(state.handler.queue, output, respect_handler_level=True)
+    state.listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(state.handler)
+    if logging.getLevelName(level) != logging.DEBUG:
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    # Flushes what is still queued
+    if state.listener is None:
+        return
+    state.listener.stop()
+    logging.getLogger().removeHandler(state.handler)
+    state.listener = None
+    if state.saved_flags is not None:
+        for name, value in state.saved_flags.items():
+            setattr(logging, name, value)
+        state.saved_flags = None
+
+
+class RequestIdMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"])[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        token = correlation_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            correlation_id.reset(token)
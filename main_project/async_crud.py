@@ -0,0 +1,157 @@
+# Async versions of the crud.py helpers, for routes running on AsyncSession
+
+from typing import Optional
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from db_models import User, Part, CarParameter, Cart, CartItem
+from pydantic_models import CartSummary
+from catalog_cache import catalog_cache
+
+
+async def get_user_by_username(db: AsyncSession, username: str) -> User:
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalars().first()
+
+
+async def get_user_role(db: AsyncSession, user_id: int) -> Optional[str]:
+    return (await db.execute(select(User.role).filter(User.id == user_id))).scalar_one_or_none()
+
+
+async def get_or_create_cart(db: AsyncSession, user_id: int) -> Cart:
+    # Items are loaded up front, lazy loading is not available on AsyncSession
+    result = await db.execute(select(Cart).options(selectinload(Cart.items)).filter(Cart.user_id == user_id))
+    cart = result.scalars().first()
+    if not cart:
+        cart = Cart(user_id=user_id, items=[])
+        db.add(cart)
+        await db.commit()
+        await db.refresh(cart, ["items"])
+    return cart
+
+async def get_cart_summary(db: AsyncSession, user_id: int) -> CartSummary:
+    # One aggregate query; a user without a cart simply gets zeros
+    result = await db.execute(
+        select(
+            func.coalesce(func.sum(CartItem.quantity), 0),
+            func.count(CartItem.id),
+            func.coalesce(func.sum(CartItem.quantity * Part.price), 0.0),
+        )
+        .select_from(CartItem)
+        .join(Cart, CartItem.cart_id == Cart.id)
+        .join(Part, CartItem.part_id == Part.id)
+        .filter(Cart.user_id == user_id)
+    )
+    item_count, line_count, total_price = result.one()
+    return CartSummary(item_count=item_count, line_count=line_count, total_price=total_price)
+
+async def add_part_to_db(db: AsyncSession, name: str, description: str, price: float, currency: str, stock_quantity: int, part_parameters: int = None, photo_path: str = None) -> None:
+    new_part = Part(
+        part_name=name,
+        description=description,
+        price=price,
+        currency=currency,
+        stock_quantity=stock_quantity,
+        part_parameters_id=part_parameters,
+        photo_path=photo_path
+    )
+    db.add(new_part)
+    await db.commit()
+    catalog_cache.bump()
+
+
+# Add car part parameters to the `part_parameters` table in the database.
+async def add_part_parameters_to_db(db: AsyncSession, car_name: str, manufacturer: str, year: int, engine_type: str) -> None:
+    new_part_parameter = CarParameter(
+        car_name=car_name,
+        manufacturer=manufacturer,
+        year=year,
+        engine_type=engine_type
+    )
+    db.add(new_part_parameter)
+    await db.commit()
+    await db.refresh(new_part_parameter)
+    catalog_cache.bump()
+
+
+# Remove a part from the `parts` table in the database by its ID.
+async def remove_part_from_db(db: AsyncSession, part_id: int) -> None:
+    part_to_remove = await db.get(Part, part_id)
+    if part_to_remove:
+        await db.delete(part_to_remove)
+        await db.commit()
+        catalog_cache.bump()
+
+
+# Stock reservation. Each primitive is a single conditional statement, so
+# concurrent requests can never take more stock than there is. They do not
+# commit: the caller commits them together with the cart change.
+
+def dialect_insert(db: AsyncSession, table):
+    # INSERT .. ON CONFLICT is spelled the same on both backends we run on
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+async def reserve_stock(db: AsyncSession, part_id: int, quantity: int) -> bool:
+    result = await db.execute(
+        update(Part)
+        .where(Part.id == part_id, Part.stock_quantity >= quantity)
+        .values(stock_quantity=Part.stock_quantity - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def release_stock(db: AsyncSession, part_id: int, quantity: int) -> None:
+    await db.execute(
+        update(Part)
+        .where(Part.id == part_id)
+        .values(stock_quantity=Part.stock_quantity + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def ensure_cart_id(db: AsyncSession, user_id: int) -> int:
+    await db.execute(dialect_insert(db, Cart).values(user_id=user_id).on_conflict_do_nothing(index_elements=["user_id"]))
+    return (await db.execute(select(Cart.id).filter(Cart.user_id == user_id))).scalar_one()
+
+
+async def upsert_cart_item(db: AsyncSession, cart_id: int, part_id: int, quantity: int) -> None:
+    insert = dialect_insert(db, CartItem).values(cart_id=cart_id, part_id=part_id, quantity=quantity)
+    await db.execute(insert.on_conflict_do_update(
+        index_elements=["cart_id", "part_id"],
+        set_={"quantity": CartItem.quantity + insert.excluded.quantity},
+    ))
+
+
+async def get_user_cart_item(db: AsyncSession, user_id: int, item_id: int) -> CartItem:
+    result = await db.execute(
+        select(CartItem).join(Cart, CartItem.cart_id == Cart.id).filter(CartItem.id == item_id, Cart.user_id == user_id)
+    )
+    return result.scalars().first()
+
+
+async def set_cart_item_quantity(db: AsyncSession, item_id: int, old_quantity: int, quantity: int) -> bool:
+    # Only applies if nobody changed the item since it was read
+    result = await db.execute(
+        update(CartItem)
+        .where(CartItem.id == item_id, CartItem.quantity == old_quantity)
+        .values(quantity=quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def delete_cart_item(db: AsyncSession, user_id: int, item_id: int):
+    # Returns (part_id, quantity) of the deleted row, or None if it was already gone
+    owned = select(CartItem.id).join(Cart, CartItem.cart_id == Cart.id).filter(CartItem.id == item_id, Cart.user_id == user_id)
+    result = await db.execute(
+        delete(CartItem)
+        .where(CartItem.id.in_(owned))
+        .returning(CartItem.part_id, CartItem.quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.first()
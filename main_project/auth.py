@@ -1,13 +1,25 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Form, Request
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
 from datetime import timedelta, datetime
 from fastapi.middleware.cors import CORSMiddleware
 from jose import jwt, JWTError
 from db_models import User
-from database import get_db
+from database import get_db, get_async_db
+import async_crud
+from app_logging import HIGH_VOLUME
 from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 # CORS Middleware to allow frontend communication
 app = FastAPI()
@@ -23,8 +35,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Password hashing settings
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing settings. Hashes made with fewer rounds than BCRYPT_ROUNDS
+# are upgraded on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
@@ -40,6 +54,48 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# bcrypt burns tens of milliseconds of CPU per call, so the async paths run it on
+# a small dedicated thread pool (bcrypt releases the GIL) instead of the event loop.
+# Work beyond max_pending is refused with a 503 rather than queued without bound.
+class PasswordWorkerPool:
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login attempts in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "max_pending": self.max_pending, "pending": self.pending, "rejected": self.rejected}
+
+
+password_pool = PasswordWorkerPool(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32")),
+)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_pool.run(pwd_context.hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple:
+    # Returns (matches, new_hash); new_hash is set when the stored hash needs upgrading
+    return await password_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=15))
@@ -51,15 +107,99 @@ def authenticate_user(username: str, password: str, db: Session) -> User:
     user = db.query(User).filter(User.username == username).first()
     
     if not user:
-        print(f"User with username {username} not found.")
+        logger.debug("Unknown username", extra={"username": username})
         return False
     
     if not verify_password(password, user.hashed_password):
-        print(f"Password for {username} does not match.")
+        logger.debug("Password does not match", extra={"username": username})
         return False
     
     return user
 
+
+async def authenticate_user_async(username: str, password: str, db: AsyncSession) -> User:
+    user = await async_crud.get_user_by_username(db, username)
+
+    if not user:
+        logger.debug("Unknown username", extra={"username": username})
+        return False
+
+    matches, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not matches:
+        logger.debug("Password does not match", extra={"username": username})
+        return False
+
+    # Transparent rehash when the configured work factor changed
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    return user
+
+# Short-lived cache of authenticated users, keyed by token, so repeat requests
+# skip the JWT decode and the user lookup. Cached users are expunged from the
+# session that loaded them, so a rollback there cannot expire them; read-only.
+class PrincipalCache:
+    def __init__(self, ttl: float = 30.0, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[User]:
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self.entries[token]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token: str, user: User, token_expires_at: float) -> None:
+        if self.ttl <= 0:
+            return
+        # Never outlive the token itself
+        expires_at = min(time.time() + self.ttl, token_expires_at)
+        with self.lock:
+            self.entries[token] = (expires_at, user)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self.lock:
+            for token in [token for token, (_, user) in self.entries.items() if user.id == user_id]:
+                del self.entries[token]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+principal_cache = PrincipalCache(ttl=float(os.getenv("AUTH_CACHE_TTL", "30")))
+
+
+async def is_admin(db: AsyncSession, user: User) -> bool:
+    # Read from the database, not the cached principal: the cache is per worker, so a
+    # role change made on another worker would take up to AUTH_CACHE_TTL to arrive here
+    return await async_crud.get_user_role(db, user.id) == "admin"
+
+
 def get_token_from_cookie(request: Request) -> str:
     token = request.cookies.get("access_token")
     if not token:
@@ -67,25 +207,31 @@ def get_token_from_cookie(request: Request) -> str:
     return token
 
 
-def get_current_user(token: str = Depends(get_token_from_cookie), db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: str = Depends(get_token_from_cookie), db: AsyncSession = Depends(get_async_db)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    print("0")
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            print("1")
+            logger.debug("Token without subject", extra=HIGH_VOLUME)
             raise credentials_exception
     except JWTError:
-        print("2")
+        logger.debug("Invalid or expired token", extra=HIGH_VOLUME)
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
+    user = await async_crud.get_user_by_username(db, username)
     if user is None:
-        print("3")
+        logger.debug("Token for unknown user", extra={"username": username})
         raise credentials_exception
+    # Detached with its columns loaded; later requests share it across sessions
+    db.expunge(user)
+    principal_cache.set(token, user, payload.get("exp", float("inf")))
     return user
\ No newline at end of file
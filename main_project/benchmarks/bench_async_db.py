@@ -0,0 +1,82 @@
+# Concurrent-request throughput: sync Session inside `async def` vs AsyncSession
+#
+# Run from main_project:
+#   DATABASE_URL=sqlite:///./bench.db python -m benchmarks.bench_async_db --requests 200 --query-ms 20
+#
+# Every request runs one query that takes --query-ms on the database side
+# (a `sleep()` SQL function is registered on SQLite connections, pg_sleep is
+# used on PostgreSQL). With the sync session the event loop is stuck for the
+# whole query, so requests are served one after another; with AsyncSession
+# the loop keeps serving other requests while the driver waits.
+# Keep --concurrency below the sync pool size: past that, the sync route waits
+# for a pooled connection on the loop thread and stalls until pool_timeout.
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI, Depends
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import engine, async_engine, get_db, get_async_db
+from benchmarks.common import measure_throughput
+
+
+def install_sleep_function(sync_engine) -> None:
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def register_sleep(dbapi_connection, connection_record):
+        dbapi_connection.create_function("sleep", 1, lambda seconds: time.sleep(seconds) or 0)
+
+
+def sleep_statement(dialect_name: str, seconds: float):
+    if dialect_name == "postgresql":
+        return text("SELECT pg_sleep(:s)").bindparams(s=seconds)
+    return text("SELECT sleep(:s)").bindparams(s=seconds)
+
+
+def build_app(query_seconds: float) -> FastAPI:
+    app = FastAPI()
+
+    # Before: the pattern every route used, a blocking query inside `async def`
+    @app.get("/sync")
+    async def sync_route(db: Session = Depends(get_db)) -> dict:
+        db.execute(sleep_statement(engine.dialect.name, query_seconds))
+        return {"ok": True}
+
+    # After: the same query awaited on AsyncSession
+    @app.get("/async")
+    async def async_route(db: AsyncSession = Depends(get_async_db)) -> dict:
+        await db.execute(sleep_statement(async_engine.dialect.name, query_seconds))
+        return {"ok": True}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync vs async session throughput benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--query-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    install_sleep_function(engine)
+    install_sleep_function(async_engine.sync_engine)
+    app = build_app(args.query_ms / 1000)
+
+    async def run_all():
+        for label, path in (("sync Session (before)", "/sync"), ("AsyncSession (after)", "/async")):
+            elapsed = await measure_throughput(app, path, args.requests, args.concurrency)
+            print(f"{label:<24} {args.requests / elapsed:8.1f} req/s  ({elapsed:.2f}s for {args.requests} requests)")
+        # Pooled aiosqlite connections keep their worker threads alive until disposed
+        await async_engine.dispose()
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Bandwidth and server CPU saved by ETag/304 on a replay of page views
+#
+# Visitors browse /main, /cart and /catalog repeatedly; a write to the catalog
+# happens every --write-every requests. The same replay runs once with browsers
+# that keep ETags and once with browsers that never revalidate.
+#
+# Run from main_project:
+#   DATABASE_URL=sqlite:///./bench.db python -m benchmarks.bench_conditional --visitors 50 --views 2000
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import httpx
+
+import main
+from auth import create_access_token
+from catalog_cache import catalog_cache
+from database import AsyncSessionLocal, async_engine, create_database
+from db_models import User, Part, Cart, CartItem
+from benchmarks.common import stub_templates
+
+PAGES = ["/main", "/main", "/main", "/cart", "/catalog"]
+
+
+async def seed(visitors: int, parts: int) -> list:
+    tokens = []
+    async with AsyncSessionLocal() as db:
+        catalog = [Part(part_name=f"ReplayPart{i}", description="replay " * 20, price=10.0 + i, currency="EUR", stock_quantity=100) for i in range(parts)]
+        db.add_all(catalog)
+        await db.flush()
+        for _ in range(visitors):
+            username = f"replay-{uuid.uuid4()}"
+            user = User(username=username, email=f"{username}@bench.local", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            cart = Cart(user_id=user.id)
+            db.add(cart)
+            await db.flush()
+            db.add_all([CartItem(cart_id=cart.id, part_id=part.id, quantity=1) for part in random.sample(catalog, 3)])
+            tokens.append(create_access_token({"sub": username}))
+        await db.commit()
+    return tokens
+
+
+async def replay(tokens: list, views: int, write_every: int, revalidate: bool) -> dict:
+    rng = random.Random(1)
+    etags = {}
+    sent = not_modified = 0
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cpu, wall = time.process_time(), time.perf_counter()
+        for i in range(views):
+            if write_every and i and i % write_every == 0:
+                catalog_cache.bump()
+            token = rng.choice(tokens)
+            path = rng.choice(PAGES)
+            headers = {"If-None-Match": etags[token, path]} if revalidate and (token, path) in etags else {}
+            response = await client.get(path, headers=headers, cookies={"access_token": token})
+            if response.status_code == 304:
+                not_modified += 1
+            else:
+                response.raise_for_status()
+                etags[token, path] = response.headers.get("etag")
+            sent += len(response.content)
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return {"bytes": sent, "not_modified": not_modified, "cpu": cpu, "wall": wall}
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Conditional GET replay")
+    parser.add_argument("--visitors", type=int, default=50)
+    parser.add_argument("--views", type=int, default=2000)
+    parser.add_argument("--parts", type=int, default=50)
+    parser.add_argument("--write-every", type=int, default=200)
+    args = parser.parse_args()
+
+    # Importing the app no longer creates the schema
+    create_database()
+    main.templates = stub_templates()
+
+    async def run_all():
+        tokens = await seed(args.visitors, args.parts)
+        results = {}
+        for label, revalidate in (("no validators", False), ("ETag / 304", True)):
+            results[label] = await replay(tokens, args.views, args.write_every, revalidate)
+            r = results[label]
+            print(f"{label:<14} {r['bytes'] / 1024:9.1f} KiB body  {r['not_modified']:5d} x 304  "
+                  f"cpu {r['cpu']:.2f}s  wall {r['wall']:.2f}s")
+        base, conditional = results["no validators"], results["ETag / 304"]
+        print(f"saved {1 - conditional['bytes'] / base['bytes']:.1%} of body bytes and {1 - conditional['cpu'] / base['cpu']:.1%} of CPU")
+        await async_engine.dispose()
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main_cli()
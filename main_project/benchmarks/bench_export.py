@@ -0,0 +1,46 @@
+# Streaming export: time to first byte, throughput and peak memory
+#
+# Run from main_project (reuses the fitment benchmark catalog):
+#   DATABASE_URL=sqlite:///./bench_fitment.db python -m benchmarks.bench_export --parts 1000000
+
+import argparse
+import asyncio
+import resource
+import time
+
+from database import engine, async_engine, AsyncSessionLocal
+from catalog_export import export_chunks
+from benchmarks.bench_fitment import seed
+
+
+async def measure(fmt: str, compress: bool) -> tuple:
+    start = time.perf_counter()
+    # The first chunk is only the header, the second carries the first rows
+    chunk_times, size = [], 0
+    async for chunk in export_chunks(AsyncSessionLocal, fmt, compress):
+        if len(chunk_times) < 2:
+            chunk_times.append(time.perf_counter() - start)
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    await async_engine.dispose()
+    return chunk_times[-1], elapsed, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Catalog export benchmark")
+    parser.add_argument("--parts", type=int, default=1000000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--no-gzip", action="store_true")
+    args = parser.parse_args()
+
+    seed(args.parts)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    first_rows, elapsed, size = asyncio.run(measure(args.format, not args.no_gzip))
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{args.parts} parts as {args.format}{'' if args.no_gzip else '.gz'} ({engine.dialect.name}): "
+          f"first rows {first_rows * 1000:.1f} ms, total {elapsed:.1f}s ({args.parts / elapsed:,.0f} rows/s), "
+          f"{size / 2**20:.1f} MiB, peak RSS {rss_before:.0f} -> {rss_after:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Fitment lookup and facet latency on a synthetic catalog
+#
+# Run from main_project:
+#   DATABASE_URL=sqlite:///./bench_fitment.db python -m benchmarks.bench_fitment --parts 1000000
+
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import func, insert, select
+
+from database import Base, engine, async_engine, AsyncSessionLocal
+from db_models import Part, CarParameter
+from fitment import find_fitting_parts, fitment_facets
+from benchmarks.common import percentile
+
+MAKES = {
+    "Volkswagen": ["Golf", "Passat", "Polo", "Tiguan"],
+    "Audi": ["A3", "A4", "A6", "Q5"],
+    "BMW": ["320", "520", "X3", "X5"],
+    "Toyota": ["Corolla", "Yaris", "RAV4", "Auris"],
+    "Ford": ["Focus", "Fiesta", "Mondeo", "Kuga"],
+}
+YEARS = range(2000, 2025)
+ENGINES = ["Diesel", "Petrol", "Hybrid", "Electric"]
+
+
+def seed(parts: int, batch_size: int = 20000) -> list:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        if not connection.execute(select(func.count(CarParameter.id))).scalar_one():
+            connection.execute(insert(CarParameter), [
+                {"manufacturer": make, "car_name": model, "year": year, "engine_type": engine_type}
+                for make, models in MAKES.items() for model in models for year in YEARS for engine_type in ENGINES
+            ])
+        vehicles = connection.execute(select(CarParameter.id, CarParameter.manufacturer, CarParameter.car_name, CarParameter.year, CarParameter.engine_type)).all()
+        existing = connection.execute(select(func.count(Part.id))).scalar_one()
+
+    rng = random.Random(42)
+    remaining = max(parts - existing, 0)
+    while remaining:
+        size = min(batch_size, remaining)
+        with engine.begin() as connection:
+            connection.execute(insert(Part), [
+                {"part_name": f"Part {rng.randint(0, 10**6)}", "price": 10.0, "stock_quantity": 1, "part_parameters_id": rng.choice(vehicles).id}
+                for _ in range(size)
+            ])
+        remaining -= size
+    return vehicles
+
+
+async def measure(vehicles: list, lookups: int) -> dict:
+    rng = random.Random(7)
+    timings = {"vehicle parts": [], "vehicle facets": [], "make+year parts": []}
+    async with AsyncSessionLocal() as db:
+        for _ in range(lookups):
+            _, make, model, year, engine_type = rng.choice(vehicles)
+            exact = {"manufacturer": make, "car_name": model, "year": year, "engine_type": engine_type}
+            for label, call in (
+                ("vehicle parts", lambda: find_fitting_parts(db, **exact)),
+                ("vehicle facets", lambda: fitment_facets(db, **exact)),
+                ("make+year parts", lambda: find_fitting_parts(db, manufacturer=make, year=year)),
+            ):
+                start = time.perf_counter()
+                await call()
+                timings[label].append((time.perf_counter() - start) * 1000)
+    await async_engine.dispose()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fitment lookup benchmark")
+    parser.add_argument("--parts", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    vehicles = seed(args.parts)
+    print(f"catalog ready: {args.parts} parts, {len(vehicles)} vehicles in {time.perf_counter() - start:.1f}s ({engine.dialect.name})")
+
+    for label, samples in asyncio.run(measure(vehicles, args.lookups)).items():
+        print(f"{label:<18} p50 {percentile(samples, 50):7.2f} ms  p95 {percentile(samples, 95):7.2f} ms  p99 {percentile(samples, 99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Bulk import throughput and memory on a generated supplier feed
+#
+# Run from main_project:
+#   DATABASE_URL=sqlite:///./bench_import.db python -m benchmarks.bench_import --rows 500000 --batch-size 5000
+
+import argparse
+import csv
+import os
+import random
+import resource
+import tempfile
+import time
+
+from database import create_database, engine
+from bulk_import import import_parts
+from benchmarks.bench_fitment import MAKES, YEARS, ENGINES
+from benchmarks.bench_search import COMPONENTS, SYSTEMS, MAKERS
+
+FIELDS = ["part_number", "part_name", "description", "price", "stock_quantity", "manufacturer", "car_name", "car_manufacturer", "year", "engine_type"]
+
+
+def write_feed(path: str, rows: int) -> None:
+    rng = random.Random(42)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for i in range(rows):
+            make = rng.choice(list(MAKES))
+            system, component = rng.choice(SYSTEMS), rng.choice(COMPONENTS)
+            writer.writerow([
+                f"FEED-{i:08d}", f"{system.title()} {component}", f"{component} for the {system} system",
+                round(rng.uniform(1, 500), 2), rng.randint(0, 100), rng.choice(MAKERS),
+                rng.choice(MAKES[make]), make, rng.choice(YEARS), rng.choice(ENGINES),
+            ])
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import benchmark")
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    create_database()
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-import-"), "feed.csv")
+    write_feed(path, args.rows)
+    print(f"feed: {args.rows} rows, {os.path.getsize(path) / 2**20:.1f} MiB ({engine.dialect.name})")
+
+    # Peak RSS before and after shows whether memory grows with the file
+    baseline = max_rss_mb()
+    start = time.perf_counter()
+    with open(path, newline="") as stream:
+        report = import_parts(engine, stream, "csv", args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"first import:  {report.processed / elapsed:,.0f} rows/s, {report.batches} batches, peak RSS {baseline:.0f} -> {max_rss_mb():.0f} MiB")
+
+    # Same feed again takes the update path of the upsert
+    start = time.perf_counter()
+    with open(path, newline="") as stream:
+        report = import_parts(engine, stream, "csv", args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"re-import:     {report.processed / elapsed:,.0f} rows/s, peak RSS {max_rss_mb():.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Cost on the request thread of print() versus the queued structured logger
+#
+# Each variant logs the same per-request line N times and reports the time the
+# caller spends per call, once with a fast sink (a file) and once with a slow one
+# (a stream that takes --sink-delay per write, like a congested stdout pipe).
+# print() and a plain StreamHandler pay the sink on every call; the queue handler
+# only enqueues, and a DEBUG line with the default INFO level costs a level check.
+# "lean records" is the LOG_LEAN_RECORDS=1 opt-in.
+#
+# Run from main_project:
+#   python -m benchmarks.bench_logging --calls 20000
+
+import argparse
+import contextlib
+import logging
+import tempfile
+import time
+
+from app_logging import JSONFormatter, setup_logging, shutdown_logging, state
+
+
+class SlowStream:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def per_call_us(log_once, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        log_once(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def variants(stream):
+    def printing(i):
+        print(f"Login successful for user: user-{i}", file=stream)
+
+    def sync_handler(i):
+        logger.info("Login succeeded", extra={"username": f"user-{i}"})
+
+    def queued(i):
+        logger.info("Login succeeded", extra={"username": f"user-{i}"})
+
+    def queued_debug(i):
+        logger.debug("Login succeeded", extra={"username": f"user-{i}"})
+
+    logger = logging.getLogger("bench_logging")
+    logger.propagate = False
+    root = logging.getLogger()
+
+    yield "print()", printing, contextlib.nullcontext()
+
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JSONFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    yield "StreamHandler (sync)", sync_handler, contextlib.nullcontext()
+    logger.removeHandler(handler)
+
+    logger.propagate = True
+    logger.setLevel(logging.NOTSET)
+    setup_logging(level="INFO", stream=stream)
+    yield "queued, INFO", queued, contextlib.nullcontext()
+    yield "queued, DEBUG off", queued_debug, contextlib.nullcontext()
+    dropped = state.handler.dropped
+    shutdown_logging()
+    setup_logging(level="INFO", stream=stream, lean_records=True)
+    yield "queued, lean records", queued, contextlib.nullcontext()
+    dropped += state.handler.dropped
+    shutdown_logging()
+    root.setLevel(logging.WARNING)
+    if dropped:
+        print(f"  (queue full, {dropped} records dropped)")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Logging overhead benchmark")
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--sink-delay", type=float, default=0.0005, help="seconds per write of the slow sink")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryFile("w") as fast:
+        sinks = [("file sink", fast, args.calls), (f"slow sink ({args.sink_delay * 1000:.1f} ms/write)", SlowStream(args.sink_delay), args.calls // 20)]
+        for sink_name, stream, calls in sinks:
+            print(f"{sink_name}, {calls} calls")
+            for name, log_once, context in variants(stream):
+                with context:
+                    print(f"  {name:<22} {per_call_us(log_once, calls):8.2f} us/call on the caller")
+
+
+if __name__ == "__main__":
+    main_cli()
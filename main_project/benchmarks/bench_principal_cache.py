@@ -0,0 +1,63 @@
+# Requests per second on /cart with and without the principal cache
+#
+# Run from main_project:
+#   DATABASE_URL=sqlite:///./bench.db python -m benchmarks.bench_principal_cache --requests 2000
+
+import argparse
+import asyncio
+import uuid
+
+import main
+from auth import principal_cache, create_access_token, get_password_hash
+from database import AsyncSessionLocal, async_engine, create_database
+from db_models import User, Part, Cart, CartItem
+from benchmarks.common import stub_templates, measure_throughput
+
+
+async def seed(items: int) -> str:
+    async with AsyncSessionLocal() as db:
+        username = f"bench-{uuid.uuid4()}"
+        user = User(username=username, email=f"{username}@bench.local", hashed_password=get_password_hash("bench"))
+        db.add(user)
+        await db.flush()
+        cart = Cart(user_id=user.id)
+        db.add(cart)
+        await db.flush()
+        for i in range(items):
+            part = Part(part_name=f"BenchPart{i}", description="bench", price=10.0, currency="EUR", stock_quantity=100)
+            db.add(part)
+            await db.flush()
+            db.add(CartItem(cart_id=cart.id, part_id=part.id, quantity=1))
+        await db.commit()
+    return create_access_token({"sub": username})
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Principal cache benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--cart-items", type=int, default=5)
+    args = parser.parse_args()
+
+    # Importing the app no longer creates the schema
+    create_database()
+    main.templates = stub_templates()
+    ttl = principal_cache.ttl
+
+    async def run_all():
+        token = await seed(args.cart_items)
+        cookies = {"access_token": token}
+        for label, cache_ttl in (("without principal cache", 0), ("with principal cache", ttl or 30)):
+            principal_cache.ttl = cache_ttl
+            principal_cache.clear()
+            hits_before = principal_cache.stats()["hits"]
+            elapsed = await measure_throughput(main.app, "/cart", args.requests, args.concurrency, cookies)
+            hit_rate = (principal_cache.stats()["hits"] - hits_before) / args.requests
+            print(f"{label:<24} {args.requests / elapsed:8.1f} req/s  hit rate {hit_rate:.2%}")
+        await async_engine.dispose()
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,89 @@
+# Search latency on a synthetic catalog
+#
+# Run from main_project (seeding 500k parts takes a minute on SQLite):
+#   DATABASE_URL=sqlite:///./bench_search.db python -m benchmarks.bench_search --parts 500000 --queries 500
+
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import func, insert, select
+
+from database import Base, engine, async_engine, AsyncSessionLocal
+from db_models import Part
+from search import ensure_search_index, search_parts
+from benchmarks.common import percentile
+
+COMPONENTS = ["filter", "pad", "disc", "plug", "belt", "pump", "sensor", "gasket", "bearing", "hose", "mount", "valve"]
+SYSTEMS = ["oil", "air", "fuel", "brake", "timing", "water", "coolant", "exhaust", "wheel", "engine", "cabin", "steering"]
+MAKERS = ["Bosch", "Mann", "Brembo", "NGK", "Gates", "Elring", "SKF", "Valeo", "Febi", "Mahle"]
+ADJECTIVES = ["vented", "ceramic", "iridium", "reinforced", "heavy", "sport", "standard", "premium"]
+
+
+def synthetic_parts(count: int, rng: random.Random):
+    for i in range(count):
+        system, component = rng.choice(SYSTEMS), rng.choice(COMPONENTS)
+        yield {
+            "part_name": f"{system.title()} {component}",
+            "description": f"{rng.choice(ADJECTIVES)} {component} for the {system} system",
+            "price": round(rng.uniform(1, 500), 2),
+            "currency": "EUR",
+            "stock_quantity": rng.randint(0, 100),
+            "part_number": f"{rng.choice(MAKERS)[:3].upper()}-{i:07d}",
+            "manufacturer": rng.choice(MAKERS),
+        }
+
+
+def seed(count: int, batch_size: int = 10000) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        existing = connection.execute(select(func.count(Part.id))).scalar_one()
+    rng = random.Random(42)
+    rows = synthetic_parts(max(count - existing, 0), rng)
+    while True:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            break
+        with engine.begin() as connection:
+            connection.execute(insert(Part), batch)
+    with engine.begin() as connection:
+        ensure_search_index(connection)
+
+
+async def run_queries(queries: int, limit: int) -> list:
+    rng = random.Random(7)
+    timings = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(queries):
+            query = rng.choice([
+                f"{rng.choice(SYSTEMS)} {rng.choice(COMPONENTS)}",
+                rng.choice(MAKERS),
+                f"{rng.choice(ADJECTIVES)} {rng.choice(COMPONENTS)}",
+                f"{rng.choice(MAKERS)[:3].upper()}-00{rng.randint(10, 99)}",
+            ])
+            start = time.perf_counter()
+            await search_parts(db, query, limit=limit)
+            timings.append((time.perf_counter() - start) * 1000)
+    await async_engine.dispose()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Full-text search benchmark")
+    parser.add_argument("--parts", type=int, default=500000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    seed(args.parts)
+    print(f"catalog ready: {args.parts} parts in {time.perf_counter() - start:.1f}s ({engine.dialect.name})")
+
+    timings = asyncio.run(run_queries(args.queries, args.limit))
+    print(f"{args.queries} searches, page size {args.limit}: "
+          f"p50 {percentile(timings, 50):.2f} ms  p95 {percentile(timings, 95):.2f} ms  p99 {percentile(timings, 99):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Throughput of server.py with 1..N worker processes
+#
+# Starts the production entry point for each worker count, drives one route
+# from several load-generator processes for a fixed time and reports req/s
+# and latency. The generators run on the same machine, so leave cores for
+# them: on a 4-core box, compare 1..3 workers.
+#
+# Run from main_project:
+#   DATABASE_URL=sqlite:///./bench.db python -m benchmarks.bench_workers --workers 1 2 4 --duration 10
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.bench_cold_start import free_port
+from benchmarks.common import percentile
+
+
+async def generate_load(url: str, concurrency: int, duration: float) -> tuple:
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def user():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def client_process(args: tuple) -> tuple:
+    return asyncio.run(generate_load(*args))
+
+
+def wait_until_ready(url: str, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+def measure(workers: int, args) -> dict:
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "server.py", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1"],
+                              env={**os.environ, "LOG_LEVEL": "warning"}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}{args.path}"
+        wait_until_ready(url, 120)
+        # Workers come up one by one; give the last one time to finish its startup
+        time.sleep(2 + workers * 0.5)
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.map(client_process, [(url, args.concurrency, args.duration)] * args.clients)
+    finally:
+        server.terminate()
+        server.wait()
+    latencies = [latency for result in results for latency in result[0]]
+    return {
+        "workers": workers,
+        "rps": len(latencies) / args.duration,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": sum(result[1] for result in results),
+    }
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Worker scaling benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/catalog?limit=20")
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per load generator")
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, GET {args.path}, {args.clients} x {args.concurrency} connections, {args.duration:.0f}s per run")
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in args.workers:
+        result = measure(workers, args)
+        baseline = baseline or result["rps"]
+        print(f"{workers:>7} {result['rps']:>9.0f} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7}"
+              f"   x{result['rps'] / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
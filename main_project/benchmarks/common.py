@@ -0,0 +1,43 @@
+# Shared helpers for the benchmark scripts
+
+import asyncio
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi.templating import Jinja2Templates
+
+# Stand-ins for the page templates, touching the same context the real pages do
+STUB_TEMPLATES = {
+    "shop.html": "{% for product in products %}{{ product.part_name }}{% endfor %}{{ cart_count }}",
+    "cart.html": "{% for item in cart_items %}{{ item.name }} {{ item.quantity }}{% endfor %}{{ cart_total }}",
+    "admin.html": "{{ parts_html }}{{ part_parameters_html }}",
+}
+
+
+def stub_templates() -> Jinja2Templates:
+    directory = tempfile.mkdtemp(prefix="bench-templates-")
+    for name, source in STUB_TEMPLATES.items():
+        with open(f"{directory}/{name}", "w") as f:
+            f.write(source)
+    return Jinja2Templates(directory=directory)
+
+
+async def measure_throughput(app, path: str, requests: int, concurrency: int, cookies: dict = None) -> float:
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies=cookies) as client:
+        async def one():
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - start
+
+
+def percentile(samples: list, p: float) -> float:
+    return statistics.quantiles(samples, n=100)[int(p) - 1] if len(samples) > 1 else samples[0]
@@ -0,0 +1,282 @@
+# Load test for the shop's hot routes
+#
+# Seeds a synthetic catalog (vehicles, parts, users with carts), then runs
+# concurrent virtual users that log in and browse /main and /cart, add parts
+# to their cart and change quantities. Reports p50/p95/p99 latency, throughput
+# and SQL statements per request for each route, writes the results as JSON and
+# exits non-zero when they break the thresholds or regress against a baseline.
+#
+# Run from main_project (in-process, against DATABASE_URL):
+#   DATABASE_URL=sqlite:///./load.db python -m benchmarks.load_test --parts 20000 --users 200 --concurrency 20 --duration 30 \
+#       --output results/load.json --thresholds benchmarks/load_thresholds.json
+# Compare with an earlier run:
+#   python -m benchmarks.load_test --baseline results/load.json --max-regression 0.2 ...
+# Against a running server (no statement counts, the server must use the same database):
+#   python -m benchmarks.load_test --url http://127.0.0.1:8000 --no-seed ...
+
+import argparse
+import asyncio
+import contextvars
+import datetime
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+from sqlalchemy import event, func, insert, select
+
+from benchmarks.common import percentile, stub_templates
+
+PASSWORD = "load-test-password"
+# Share of requests per action once logged in
+ACTIONS = {"/main": 0.5, "/cart": 0.25, "/add_to_cart/{id}": 0.15, "/update_cart/{id}": 0.1}
+MAKES = ["Volkswagen", "Audi", "BMW", "Toyota", "Ford", "Renault", "Skoda", "Opel"]
+ENGINES = ["Diesel", "Petrol", "Hybrid", "Electric"]
+
+current_route = contextvars.ContextVar("current_route", default=None)
+
+
+def seed(parts: int, vehicles: int, users: int, cart_items: int, batch_size: int = 10000) -> tuple:
+    # Returns [(username, [cart item ids])]; catalog rows are only added up to the requested scale
+    from auth import get_password_hash
+    from database import create_database, engine
+    from db_models import Part, CarParameter, User, Cart, CartItem
+
+    create_database()
+    rng = random.Random(42)
+    with engine.begin() as connection:
+        existing = connection.execute(select(func.count(CarParameter.id))).scalar_one()
+        if vehicles > existing:
+            connection.execute(insert(CarParameter), [
+                {"manufacturer": rng.choice(MAKES), "car_name": f"Model {i}", "year": rng.randint(2000, 2024), "engine_type": rng.choice(ENGINES)}
+                for i in range(existing, vehicles)
+            ])
+        vehicle_ids = connection.execute(select(CarParameter.id)).scalars().all()
+        existing = connection.execute(select(func.count(Part.id))).scalar_one()
+
+    for start in range(existing, parts, batch_size):
+        with engine.begin() as connection:
+            connection.execute(insert(Part), [
+                {"part_name": f"Load part {i}", "description": f"Synthetic part {i} for load testing", "price": round(rng.uniform(1, 500), 2),
+                 "currency": "EUR", "stock_quantity": 1_000_000, "manufacturer": rng.choice(MAKES),
+                 "part_parameters_id": rng.choice(vehicle_ids)}
+                for i in range(start, min(start + batch_size, parts))
+            ])
+
+    # Fresh users every run, so carts start from the same size
+    run_id = uuid.uuid4().hex[:8]
+    hashed_password = get_password_hash(PASSWORD)
+    accounts = []
+    with engine.begin() as connection:
+        part_ids = connection.execute(select(Part.id).limit(max(cart_items * 20, 100))).scalars().all()
+        for i in range(users):
+            username = f"load-{run_id}-{i}"
+            user_id = connection.execute(
+                insert(User).values(username=username, email=f"{username}@load.test", hashed_password=hashed_password, role="user").returning(User.id)
+            ).scalar_one()
+            cart_id = connection.execute(insert(Cart).values(user_id=user_id).returning(Cart.id)).scalar_one()
+            item_ids = connection.execute(
+                insert(CartItem).returning(CartItem.id),
+                [{"cart_id": cart_id, "part_id": part_id, "quantity": 1} for part_id in rng.sample(part_ids, min(cart_items, len(part_ids)))],
+            ).scalars().all() if cart_items else []
+            accounts.append((username, list(item_ids)))
+    return accounts, part_ids
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statements = defaultdict(int)
+
+    def before_cursor_execute(self, *args) -> None:
+        # Runs inside the request, which inherits the virtual user's context
+        route = current_route.get()
+        if route is not None:
+            self.statements[route] += 1
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> httpx.Response:
+        token = current_route.set(route)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            raise
+        finally:
+            current_route.reset(token)
+        self.latencies[route].append((time.perf_counter() - start) * 1000)
+        # Redirects are how the cart routes report success
+        if response.status_code >= 400 or (response.headers.get("content-type", "").startswith("application/json") and "error" in response.text):
+            self.errors[route] += 1
+        return response
+
+
+async def virtual_user(client, recorder: Recorder, account: tuple, part_ids: list, deadline: float, session_length: int, seed_value: int) -> None:
+    rng = random.Random(seed_value)
+    username, item_ids = account
+    actions, weights = zip(*ACTIONS.items())
+    while time.perf_counter() < deadline:
+        response = await recorder.request(client, "/login", "POST", "/login", data={"username": username, "password": PASSWORD})
+        token = response.cookies.get("access_token")
+        if token is None:
+            return
+        # The cookie is marked secure, so it is passed explicitly for plain-HTTP runs
+        cookies = {"access_token": token}
+        for _ in range(session_length):
+            if time.perf_counter() >= deadline:
+                return
+            action = rng.choices(actions, weights)[0]
+            if action == "/add_to_cart/{id}":
+                await recorder.request(client, action, "POST", f"/add_to_cart/{rng.choice(part_ids)}", data={"quantity": 1}, cookies=cookies)
+            elif action == "/update_cart/{id}":
+                if item_ids:
+                    await recorder.request(client, action, "POST", f"/update_cart/{rng.choice(item_ids)}", data={"quantity": rng.randint(1, 3)}, cookies=cookies)
+            else:
+                await recorder.request(client, action, "GET", action, cookies=cookies)
+
+
+def summarize(recorder: Recorder, elapsed: float, count_statements: bool) -> dict:
+    routes = {}
+    for route, samples in sorted(recorder.latencies.items()):
+        routes[route] = {
+            "requests": len(samples),
+            "errors": recorder.errors[route],
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "mean_ms": round(sum(samples) / len(samples), 3),
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+            "statements_per_request": round(recorder.statements[route] / len(samples), 2) if count_statements else None,
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "total": {"requests": total, "errors": sum(recorder.errors.values()), "throughput_rps": round(total / elapsed, 2), "elapsed_s": round(elapsed, 2)},
+        "routes": routes,
+    }
+
+
+def check(results: dict, thresholds: dict = None, baseline: dict = None, max_regression: float = 0.2) -> list:
+    # Returns the failures; thresholds are absolute limits per route, the baseline an earlier run
+    failures = []
+    for route, limits in (thresholds or {}).items():
+        measured = results["routes"].get(route)
+        if measured is None:
+            continue
+        for metric, limit in limits.items():
+            value = measured.get(metric)
+            if value is not None and value > limit:
+                failures.append(f"{route} {metric} {value} > {limit}")
+    for route, before in ((baseline or {}).get("routes") or {}).items():
+        measured = results["routes"].get(route)
+        if measured is None:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if before[metric] and measured[metric] > before[metric] * (1 + max_regression):
+                failures.append(f"{route} {metric} {measured[metric]} regressed from {before[metric]} (>{max_regression:.0%})")
+        # Cache hits and first-time cart creation make statement counts jitter slightly
+        if before.get("statements_per_request") is not None and measured.get("statements_per_request") is not None \
+                and measured["statements_per_request"] > before["statements_per_request"] * (1 + max_regression):
+            failures.append(f"{route} statements_per_request {measured['statements_per_request']} up from {before['statements_per_request']}")
+    return failures
+
+
+async def run(args, accounts: list, part_ids: list) -> dict:
+    recorder = Recorder()
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        engine = None
+    else:
+        import main
+        from database import async_engine
+        main.templates = stub_templates()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app, raise_app_exceptions=False), base_url="http://load", timeout=60)
+        engine = async_engine.sync_engine
+        event.listen(engine, "before_cursor_execute", recorder.before_cursor_execute)
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    async with client:
+        await asyncio.gather(*(
+            virtual_user(client, recorder, accounts[i % len(accounts)], part_ids, deadline, args.session_length, i)
+            for i in range(args.concurrency)
+        ))
+    elapsed = time.perf_counter() - start
+
+    if engine is not None:
+        event.remove(engine, "before_cursor_execute", recorder.before_cursor_execute)
+        await async_engine.dispose()
+    return summarize(recorder, elapsed, count_statements=engine is not None)
+
+
+def load_json(path: str):
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Load test the shop's hot routes")
+    parser.add_argument("--parts", type=int, default=20000)
+    parser.add_argument("--vehicles", type=int, default=500)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--cart-items", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--session-length", type=int, default=25, help="requests between logins")
+    parser.add_argument("--url", help="run against a server instead of in-process")
+    parser.add_argument("--no-seed", action="store_true", help="reuse users from --accounts")
+    parser.add_argument("--accounts", default="load_accounts.json", help="seeded users, written after seeding")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--thresholds", help="JSON of per-route limits, e.g. {\"/main\": {\"p95_ms\": 50}}")
+    parser.add_argument("--baseline", help="results JSON of an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.no_seed:
+        accounts, part_ids = load_json(args.accounts)
+    else:
+        start = time.perf_counter()
+        accounts, part_ids = seed(args.parts, args.vehicles, args.users, args.cart_items)
+        with open(args.accounts, "w") as f:
+            json.dump([accounts, part_ids], f)
+        print(f"seeded {args.parts} parts, {args.users} users in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    summary = asyncio.run(run(args, accounts, part_ids))
+    from database import engine
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "database": engine.dialect.name,
+            "target": args.url or "in-process",
+            "scale": {"parts": args.parts, "vehicles": args.vehicles, "users": args.users, "cart_items": args.cart_items},
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+        },
+        **summary,
+    }
+
+    print(f"{'route':<20} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'stmts':>6}")
+    for route, r in results["routes"].items():
+        statements = "-" if r["statements_per_request"] is None else f"{r['statements_per_request']:.1f}"
+        print(f"{route:<20} {r['requests']:>7} {r['errors']:>5} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {statements:>6}")
+    print(f"total {results['total']['requests']} requests, {results['total']['throughput_rps']:.1f} req/s")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = check(results, load_json(args.thresholds), load_json(args.baseline), args.max_regression)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
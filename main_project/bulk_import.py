@@ -0,0 +1,196 @@
+# Streaming bulk import of supplier part feeds (CSV or JSONL)
+#
+# Rows are read one at a time, validated, and written in batches with an
+# upsert on part_number, so memory stays flat whatever the file size.
+#
+#   python bulk_import.py feed.csv --batch-size 5000
+
+import argparse
+import csv
+import json
+import sys
+import time
+from typing import Callable, Iterator, Optional, TextIO
+
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db_models import Part, CarParameter
+from catalog_cache import catalog_cache
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+PART_FIELDS = {"part_number", "part_name", "description", "price", "currency", "stock_quantity", "manufacturer", "photo_path"}
+
+
+class PartImportRow(BaseModel):
+    part_number: str = Field(min_length=1)
+    part_name: str = Field(min_length=1)
+    description: Optional[str] = None
+    price: float = Field(ge=0)
+    currency: str = "EUR"
+    stock_quantity: int = Field(default=0, ge=0)
+    manufacturer: Optional[str] = None
+    photo_path: Optional[str] = None
+    # Vehicle fitment, all four or none
+    car_name: Optional[str] = None
+    car_manufacturer: Optional[str] = None
+    year: Optional[int] = None
+    engine_type: Optional[str] = None
+
+    def vehicle_key(self) -> Optional[tuple]:
+        key = (self.car_name, self.car_manufacturer, self.year, self.engine_type)
+        return key if all(value is not None for value in key) else None
+
+
+class ImportReport(BaseModel):
+    processed: int = 0
+    imported: int = 0
+    rejected: int = 0
+    batches: int = 0
+    vehicles_created: int = 0
+    errors: list = []
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+
+    def reject(self, line: int, message: str) -> None:
+        self.rejected += 1
+        # Only a sample is kept, a broken feed must not grow the report without bound
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+
+def iter_records(stream: TextIO, fmt: str) -> Iterator[tuple]:
+    # Yields (line number, raw record); blank CSV cells count as missing
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, {key: value for key, value in record.items() if value not in ("", None)}
+    elif fmt == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, e
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def detect_format(filename: str) -> str:
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+class VehicleLookup:
+    # In-memory (car_name, manufacturer, year, engine_type) -> id map, filled once from the table
+    def __init__(self, connection):
+        self.connection = connection
+        rows = connection.execute(select(CarParameter.id, CarParameter.car_name, CarParameter.manufacturer, CarParameter.year, CarParameter.engine_type))
+        self.ids = {(car_name, manufacturer, year, engine_type): id for id, car_name, manufacturer, year, engine_type in rows}
+        self.created = 0
+
+    def get_or_create(self, key: tuple) -> int:
+        if key not in self.ids:
+            car_name, manufacturer, year, engine_type = key
+            self.ids[key] = self.connection.execute(
+                CarParameter.__table__.insert()
+                .values(car_name=car_name, manufacturer=manufacturer, year=year, engine_type=engine_type)
+                .returning(CarParameter.id)
+            ).scalar_one()
+            self.created += 1
+        return self.ids[key]
+
+
+def upsert_parts(connection, rows: list, updated_columns: tuple) -> None:
+    # New parts get every value; existing ones only have updated_columns overwritten
+    insert = (postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert)(Part.__table__)
+    connection.execute(
+        insert.on_conflict_do_update(
+            index_elements=["part_number"],
+            set_={name: insert.excluded[name] for name in updated_columns},
+        ),
+        rows,
+    )
+
+
+def import_parts(engine, stream: TextIO, fmt: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE,
+                 progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+    report = ImportReport()
+    start = time.perf_counter()
+    try:
+        with engine.connect() as connection:
+            vehicles = VehicleLookup(connection)
+            connection.commit()
+            batch = {}
+
+            def flush():
+                if batch:
+                    # One statement per set of updated columns, since set_ is shared by all its rows
+                    groups = {}
+                    for values, updated_columns in batch.values():
+                        groups.setdefault(updated_columns, []).append(values)
+                    for updated_columns, rows in groups.items():
+                        upsert_parts(connection, rows, updated_columns)
+                    report.imported += len(batch)
+                    report.batches += 1
+                    batch.clear()
+                connection.commit()
+                report.vehicles_created = vehicles.created
+                report.elapsed_seconds = round(time.perf_counter() - start, 3)
+                report.rows_per_second = round(report.processed / report.elapsed_seconds, 1) if report.elapsed_seconds else 0.0
+                if progress:
+                    progress(report)
+
+            for line, record in iter_records(stream, fmt):
+                report.processed += 1
+                if isinstance(record, Exception):
+                    report.reject(line, f"Invalid JSON: {record}")
+                    continue
+                try:
+                    row = PartImportRow.model_validate(record)
+                except ValidationError as e:
+                    report.reject(line, "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()))
+                    continue
+
+                vehicle_key = row.vehicle_key()
+                values = row.model_dump(include=PART_FIELDS)
+                values["part_parameters_id"] = vehicles.get_or_create(vehicle_key) if vehicle_key else None
+                # Fields the row leaves out keep what an existing part already has
+                updated_columns = (PART_FIELDS & row.model_fields_set) - {"part_number"}
+                if vehicle_key:
+                    updated_columns.add("part_parameters_id")
+                # A part number repeated inside one batch keeps its last row
+                batch[row.part_number] = (values, tuple(sorted(updated_columns)))
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+
+    finally:
+        # Batches committed before a failure are already visible, so cached pages must go either way
+        catalog_cache.bump()
+    return report
+
+
+def main() -> None:
+    from database import engine, create_database
+
+    parser = argparse.ArgumentParser(description="Import a CSV or JSONL part feed")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"])
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    create_database()
+
+    def show_progress(report: ImportReport) -> None:
+        print(f"\r{report.processed} rows, {report.rejected} rejected, {report.rows_per_second:.0f} rows/s", end="", file=sys.stderr)
+
+    with open(args.path, newline="", encoding="utf-8") as stream:
+        report = import_parts(engine, stream, args.format or detect_format(args.path), args.batch_size, show_progress)
+    print(file=sys.stderr)
+    print(report.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Keyset-paginated, filterable catalog reads
+
+import base64
+import json
+from typing import List, Optional, Tuple
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from db_models import Part, CarParameter
+from catalog_cache import catalog_cache
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Rows fetched per round trip when a page is streamed into a template
+STREAM_BATCH_SIZE = 25
+SORT_KEYS = ("id", "price")
+
+
+def encode_cursor(part: Part, sort: str) -> str:
+    key = [part.id] if sort == "id" else [part.price, part.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: str) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid catalog cursor")
+    if not isinstance(key, list) or len(key) != (1 if sort == "id" else 2):
+        raise ValueError("Invalid catalog cursor")
+    return key
+
+
+def catalog_query(
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    sort: str = "id",
+    manufacturer: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    part_parameters_id: Optional[int] = None,
+):
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    query = select(Part).options(joinedload(Part.part_parameters))
+
+    if manufacturer is not None:
+        query = query.filter(Part.manufacturer == manufacturer)
+    if min_price is not None:
+        query = query.filter(Part.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Part.price <= max_price)
+    if part_parameters_id is not None:
+        query = query.filter(Part.part_parameters_id == part_parameters_id)
+
+    # Seek past the last row of the previous page instead of using OFFSET
+    if sort == "id":
+        if cursor:
+            (last_id,) = decode_cursor(cursor, sort)
+            query = query.filter(Part.id > last_id)
+        query = query.order_by(Part.id)
+    else:
+        # Parts without a price have no place in a price ordering
+        query = query.filter(Part.price.is_not(None))
+        if cursor:
+            last_price, last_id = decode_cursor(cursor, sort)
+            query = query.filter(or_(Part.price > last_price, and_(Part.price == last_price, Part.id > last_id)))
+        query = query.order_by(Part.price, Part.id)
+
+    # One extra row tells whether there is a next page
+    return query.limit(limit + 1)
+
+
+async def get_catalog_page(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, sort: str = "id", **filters) -> Tuple[List[Part], Optional[str]]:
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    parts = (await db.execute(catalog_query(limit=limit, sort=sort, **filters))).scalars().all()
+    if len(parts) > limit:
+        parts = parts[:limit]
+        return parts, encode_cursor(parts[-1], sort)
+    return parts, None
+
+
+class CatalogPageStream:
+    # One catalog page, read in batches while a streamed template iterates it.
+    # A page already in the catalog cache is replayed without touching the
+    # database; a page read to the end is put into the cache. next_cursor is
+    # known once iteration is done.
+    def __init__(self, db: AsyncSession, batch_size: int = STREAM_BATCH_SIZE, limit: int = DEFAULT_PAGE_SIZE, sort: str = "id", **filters):
+        self.db = db
+        self.batch_size = batch_size
+        self.limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        self.sort = sort
+        self.key = ("page", tuple(sorted({"limit": limit, "sort": sort, **filters}.items())))
+        # Built now so invalid cursors and sort keys fail before the response starts
+        self.query = catalog_query(limit=self.limit, sort=sort, **filters)
+        self.next_cursor = None
+        # Awaited before each database round trip, lets the response flush what is rendered so far
+        self.before_fetch = None
+
+    async def batches(self):
+        version = catalog_cache.version
+        cached = catalog_cache.get(self.key, version, default=None)
+        if cached is not None:
+            parts, self.next_cursor = cached
+            for start in range(0, len(parts), self.batch_size):
+                yield parts[start:start + self.batch_size]
+            return
+
+        parts = []
+        if self.before_fetch:
+            await self.before_fetch()
+        result = await self.db.stream(self.query.execution_options(yield_per=self.batch_size))
+        rows = result.scalars()
+        try:
+            while batch := await rows.fetchmany(self.batch_size):
+                # The extra row past the limit only says there is a next page
+                more = len(batch) > self.limit - len(parts)
+                batch = batch[:self.limit - len(parts)]
+                if batch:
+                    parts.extend(batch)
+                    yield batch
+                if more:
+                    self.next_cursor = encode_cursor(parts[-1], self.sort)
+                    break
+                if self.before_fetch:
+                    await self.before_fetch()
+        finally:
+            await result.close()
+        catalog_cache.set(self.key, (parts, self.next_cursor), version)
+
+    async def __aiter__(self):
+        async for batch in self.batches():
+            for part in batch:
+                yield part
+
+
+# Cached reads. Parts come back detached from the session that loaded them,
+# with part_parameters already loaded, and are shared between requests:
+# treat them as read-only.
+
+async def get_catalog_page_cached(db: AsyncSession, **filters) -> Tuple[List[Part], Optional[str]]:
+    key = ("page", tuple(sorted(filters.items())))
+    return await catalog_cache.get_or_load(key, lambda: get_catalog_page(db, **filters))
+
+
+async def get_part_cached(db: AsyncSession, part_id: int) -> Optional[Part]:
+    async def load():
+        result = await db.execute(select(Part).options(joinedload(Part.part_parameters)).filter(Part.id == part_id))
+        return result.scalars().first()
+    return await catalog_cache.get_or_load(("part", part_id), load)
+
+
+async def get_car_parameters_cached(db: AsyncSession) -> List[CarParameter]:
+    async def load():
+        return (await db.execute(select(CarParameter).order_by(CarParameter.id))).scalars().all()
+    return await catalog_cache.get_or_load(("car_parameters",), load)
@@ -0,0 +1,182 @@
+# Versioned in-process cache for catalog reads
+#
+# Every entry is keyed by the catalog version it was loaded under. Writes to
+# the catalog bump the version, so older entries can never be served again and
+# age out through LRU eviction. With a shared version channel the bump is seen
+# by every worker, not only the one that made the write. Changes to the parts
+# themselves (not just their stock) are also counted on a second channel, for
+# the replica router.
+
+import fcntl
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class LocalVersionChannel:
+    # Version visible to this process only; the epoch tells versions of different processes apart
+    def __init__(self):
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def read(self) -> int:
+        return self.version
+
+    def publish(self) -> int:
+        self.version += 1
+        return self.version
+
+
+class FileVersionChannel:
+    # Stand-in for a cross-worker channel on one host: the version lives in a shared file
+    def __init__(self, path: str, poll_interval: float = 0.5):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.version = 0
+        self.epoch = "0"
+        self.checked_at = 0.0
+
+    def read(self) -> int:
+        now = time.monotonic()
+        if now - self.checked_at >= self.poll_interval:
+            self.checked_at = now
+            try:
+                with open(self.path) as f:
+                    self.version = int(f.read().strip() or 0)
+                    # A recreated file restarts the count, its inode keeps old versions apart
+                    self.epoch = str(os.fstat(f.fileno()).st_ino)
+            except (FileNotFoundError, ValueError):
+                pass
+        return self.version
+
+    def publish(self) -> int:
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                version = int(f.read().strip() or 0) + 1
+            except ValueError:
+                version = 1
+            f.seek(0)
+            f.truncate()
+            f.write(str(version))
+            f.flush()
+            self.epoch = str(os.fstat(f.fileno()).st_ino)
+            fcntl.flock(f, fcntl.LOCK_UN)
+        self.version = version
+        self.checked_at = time.monotonic()
+        return version
+
+
+class CatalogCache:
+    def __init__(self, maxsize: int = 1024, channel=None, write_channel=None):
+        self.maxsize = maxsize
+        self.channel = channel or LocalVersionChannel()
+        self.write_channel = write_channel or LocalVersionChannel()
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.seen_version = self.channel.read()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def version(self) -> int:
+        version = self.channel.read()
+        if version != self.seen_version:
+            # Another worker changed the catalog, entries from older versions are dead weight
+            with self.lock:
+                self.seen_version = version
+                self.entries.clear()
+                self.invalidations += 1
+        return version
+
+    def get(self, key: Hashable, version: Optional[int] = None, default=_MISSING):
+        full_key = (self.version if version is None else version, key)
+        with self.lock:
+            value = self.entries.get(full_key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(full_key)
+        return value
+
+    def set(self, key: Hashable, value, version: Optional[int] = None) -> None:
+        full_key = (self.version if version is None else version, key)
+        with self.lock:
+            self.entries[full_key] = value
+            self.entries.move_to_end(full_key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def etag(self, *scope) -> Optional[str]:
+        # Weak validator for anything rendered from the catalog at its current version.
+        # None with caching off (maxsize 0): that is the setting for hosts whose version
+        # never hears of writes made elsewhere, so it cannot vouch for clients' copies either
+        if self.maxsize <= 0:
+            return None
+        digest = hashlib.sha1(repr((self.channel.epoch, self.version, scope)).encode()).hexdigest()[:20]
+        return f'W/"{digest}"'
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable]):
+        # The version is taken before loading, so a write that lands mid-load
+        # leaves the result stored under a version nobody reads anymore
+        version = self.version
+        value = self.get(key, version)
+        if value is _MISSING:
+            value = await loader()
+            self.set(key, value, version)
+        return value
+
+    @property
+    def catalog_writes(self) -> int:
+        # Bumps from parts being added, changed or removed; stock-only bumps leave it alone
+        return self.write_channel.read()
+
+    def bump(self, catalog_write: bool = True) -> int:
+        # Cart writes only move stock and pass catalog_write=False
+        if catalog_write:
+            self.write_channel.publish()
+        version = self.channel.publish()
+        with self.lock:
+            self.seen_version = version
+            self.entries.clear()
+            self.invalidations += 1
+        return version
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.seen_version,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def channel_from_env(suffix: str = ""):
+    # CATALOG_CACHE_CHANNEL=file:/tmp/catalog.version shares invalidations between workers;
+    # other counters use the same file name plus a suffix
+    spec = os.getenv("CATALOG_CACHE_CHANNEL", "")
+    if spec.startswith("file:"):
+        return FileVersionChannel(spec[len("file:"):] + suffix, float(os.getenv("CATALOG_CACHE_POLL_INTERVAL", "0.5")))
+    return LocalVersionChannel()
+
+
+catalog_cache = CatalogCache(
+    maxsize=int(os.getenv("CATALOG_CACHE_SIZE", "1024")), channel=channel_from_env(), write_channel=channel_from_env(".writes"),
+)
@@ -0,0 +1,104 @@
+# Streaming catalog export (CSV or NDJSON, optionally gzipped)
+#
+# Rows come off a server-side cursor in partitions of EXPORT_BATCH_SIZE and are
+# encoded and compressed as they arrive, so memory does not grow with the
+# table. The columns match the bulk_import feed format, an export can be
+# imported again as is.
+#
+#   python catalog_export.py parts.csv.gz
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import zlib
+from typing import AsyncIterator, Iterable
+
+from sqlalchemy import select
+
+from db_models import Part, CarParameter
+
+EXPORT_BATCH_SIZE = 2000
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+EXPORT_COLUMNS = (
+    "id", "part_number", "part_name", "description", "price", "currency", "stock_quantity",
+    "manufacturer", "photo_path", "car_name", "car_manufacturer", "year", "engine_type",
+)
+
+
+def export_statement():
+    return (
+        select(
+            Part.id, Part.part_number, Part.part_name, Part.description, Part.price, Part.currency,
+            Part.stock_quantity, Part.manufacturer, Part.photo_path, CarParameter.car_name,
+            CarParameter.manufacturer.label("car_manufacturer"), CarParameter.year, CarParameter.engine_type,
+        )
+        .outerjoin(Part.part_parameters)
+        .order_by(Part.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def encode_header(fmt: str) -> str:
+    if fmt == "csv":
+        return ",".join(EXPORT_COLUMNS) + "\r\n"
+    if fmt == "ndjson":
+        return ""
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+
+def encode_rows(rows: Iterable, fmt: str) -> str:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows)
+
+
+async def export_chunks(session_factory, fmt: str = "csv", compress: bool = True) -> AsyncIterator[bytes]:
+    # Opens its own session, a StreamingResponse outlives request dependencies
+    encoder = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode()
+        # A sync flush per chunk lets the client start inflating right away
+        return encoder.compress(data) + encoder.flush(zlib.Z_SYNC_FLUSH) if encoder else data
+
+    header = encode_header(fmt)
+    if header or encoder:
+        yield encode(header)
+    async with session_factory() as db:
+        result = await db.stream(export_statement())
+        async for partition in result.partitions():
+            yield encode(encode_rows(partition, fmt))
+    if encoder:
+        yield encoder.flush()
+
+
+def export_to_file(engine, path: str, fmt: str = "csv") -> int:
+    opener = gzip.open if path.endswith(".gz") else open
+    count = 0
+    with opener(path, "wt", newline="", encoding="utf-8") as out, engine.connect() as connection:
+        out.write(encode_header(fmt))
+        result = connection.execute(export_statement())
+        for partition in result.partitions():
+            out.write(encode_rows(partition, fmt))
+            count += len(partition)
+    return count
+
+
+def main() -> None:
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Export the catalog as CSV or NDJSON")
+    parser.add_argument("path", help="Output file, a .gz suffix compresses it")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS))
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if ".ndjson" in args.path or ".jsonl" in args.path else "csv")
+    print(f"Exported {export_to_file(engine, args.path, fmt)} parts to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
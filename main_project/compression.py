@@ -0,0 +1,220 @@
+# Response compression
+#
+# CompressionMiddleware compresses text responses above a size threshold with
+# brotli (when the brotli package is installed and the client accepts it) or
+# gzip. Responses that already carry a Content-Encoding pass through untouched,
+# which is how pages assembled from precompressed fragments skip it.
+#
+# Fragment holds a piece of HTML together with its raw deflate encoding, ended
+# on a byte boundary by a full flush. Such pieces can be concatenated, so
+# gzip_page() builds a gzip body out of cached fragments and only deflates the
+# small parts around them per request.
+
+import os
+import struct
+import uuid
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/x-ndjson", "image/svg+xml")
+# Header of a gzip member without file name or timestamp
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+def accepted_encodings(headers: Headers) -> set:
+    accepted = set()
+    for item in headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.lower())
+    return accepted
+
+
+def choose_encoding(headers: Headers) -> Optional[str]:
+    accepted = accepted_encodings(headers)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class StreamEncoder:
+    def __init__(self, encoding: str, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        if encoding == "br":
+            self.brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self.brotli = None
+            self.deflate = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        # flush=True hands everything so far to the client, for streamed pages
+        if self.brotli is not None:
+            out = self.brotli.process(data)
+            return out + self.brotli.flush() if flush else out
+        out = self.deflate.compress(data)
+        return out + self.deflate.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        return self.brotli.finish() if self.brotli is not None else self.deflate.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = choose_encoding(Headers(scope=scope)) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if not passthrough:
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if passthrough:
+                if start_message is not None:
+                    await send(start_message)
+                    start_message = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start_message)
+                    start_message = None
+                    passthrough = True
+                    await send(message)
+                    return
+                encoder = StreamEncoder(encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                # The compressed bytes are a different representation, so a strong validator
+                # becomes weak; If-None-Match still matches it, If-Range no longer does
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    del headers["Content-Length"]
+                    body = encoder.compress(body, flush=True)
+                else:
+                    body = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(body))
+                await send(start_message)
+                start_message = None
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            body = encoder.compress(body, flush=more_body)
+            if not more_body:
+                body += encoder.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class Fragment:
+    # Rendered HTML plus its deflated bytes; renders as-is in templates
+    def __init__(self, html: str, level: int = zlib.Z_BEST_COMPRESSION):
+        self.html = html
+        self.raw = html.encode()
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self.deflated = compressor.compress(self.raw) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+    def __str__(self) -> str:
+        return self.html
+
+    def __html__(self) -> str:
+        return self.html
+
+
+def gzip_page(pieces: list, level: int = GZIP_LEVEL) -> bytes:
+    # pieces are Fragments (spliced in as cached) or str (deflated now)
+    crc, length, blocks = 0, 0, [GZIP_HEADER]
+    for piece in pieces:
+        if not isinstance(piece, Fragment):
+            piece = Fragment(piece, level)
+        crc = zlib.crc32(piece.raw, crc)
+        length += len(piece.raw)
+        blocks.append(piece.deflated)
+    # An empty final block closes the deflate stream
+    blocks.append(b"\x03\x00")
+    blocks.append(struct.pack("<II", crc & 0xFFFFFFFF, length & 0xFFFFFFFF))
+    return b"".join(blocks)
+
+
+def split_on_fragments(rendered: str, markers: dict) -> list:
+    # Cuts a page rendered with marker strings into text pieces and Fragments
+    pieces = [rendered]
+    for marker, fragment in markers.items():
+        next_pieces = []
+        for piece in pieces:
+            if isinstance(piece, str) and marker in piece:
+                parts = piece.split(marker)
+                for i, part in enumerate(parts):
+                    if i:
+                        next_pieces.append(fragment)
+                    next_pieces.append(part)
+            else:
+                next_pieces.append(piece)
+        pieces = next_pieces
+    return [piece for piece in pieces if not isinstance(piece, str) or piece]
+
+
+def fragment_markers(context: dict) -> tuple:
+    # Swaps Fragments in a template context for unique markers
+    markers, rendered_context = {}, dict(context)
+    for key, value in context.items():
+        if isinstance(value, Fragment):
+            marker = f"fragment-{uuid.uuid4().hex}"
+            markers[marker] = value
+            rendered_context[key] = marker
+    return rendered_context, markers
+
+
+def render_gzip(template, context: dict, level: int = GZIP_LEVEL) -> bytes:
+    rendered_context, markers = fragment_markers(context)
+    return gzip_page(split_on_fragments(template.render(rendered_context), markers), level)
+
+
+def fragment_response(templates, name: str, context: dict, request) -> Response:
+    # gzip clients get the page spliced from precompressed fragments, others the plain render
+    if "gzip" not in accepted_encodings(request.headers):
+        return templates.TemplateResponse(name, context)
+    body = render_gzip(templates.get_template(name), context)
+    return Response(body, media_type="text/html", headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
@@ -0,0 +1,47 @@
+# Conditional GET helpers
+#
+# Routes compute their ETag from cheap inputs (the catalog version, the user)
+# and check If-None-Match before touching the database or templates. Per-user
+# state that other workers can change (the cart) goes into the ETag as read
+# from the database, since the catalog version is only as fresh as its channel.
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Pages carry the user's cart badge, JSON catalog reads are the same for everyone
+PRIVATE = "private, no-cache"
+PUBLIC = "no-cache"
+
+
+def content_etag(*parts) -> str:
+    # Weak validator for a page rendered from exactly these values
+    return f'W/"{hashlib.sha1(repr(parts).encode()).hexdigest()[:20]}"'
+
+
+def if_none_match(header: Optional[str], etag: Optional[str]) -> bool:
+    # True when an If-None-Match value covers etag; also used by the static file handler
+    if not header or etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    return if_none_match(request.headers.get("if-none-match"), etag)
+
+
+def not_modified(etag: str, cache_control: str = PRIVATE) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def set_validators(response: Response, etag: Optional[str], cache_control: str = PRIVATE) -> Response:
+    # No validator when the catalog ETags are off, clients then always get the full response
+    if etag is not None:
+        response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
@@ -3,6 +3,7 @@ from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from typing import List
 from db_models import User, Part, CarParameter, Cart, CartItem
+from catalog_cache import catalog_cache
 from database import get_db
 from auth import get_current_user
 
@@ -61,11 +62,11 @@ def add_part_to_db(db: Session, name: str, description: str, price: float, curre
     )
     db.add(new_part)  # Add the new part to the session.
     db.commit()  # Commit the transaction to save changes in the DB.
+    catalog_cache.bump()  # Cached catalog reads are stale now.
 
 
 # Add car part parameters to the `part_parameters` table in the database.
 def add_part_parameters_to_db(db: Session, car_name: str, manufacturer: str, year: int, engine_type: str) -> None:
-    print(f"engine type is {engine_type} 2")
     new_part_parameter = CarParameter(
         car_name=car_name,
         manufacturer=manufacturer,
@@ -75,6 +76,7 @@ def add_part_parameters_to_db(db: Session, car_name: str, manufacturer: str, yea
     db.add(new_part_parameter)  # Add the new parameters to the session.
     db.commit()
     db.refresh(new_part_parameter)  # Commit the transaction to save the new parameters.
+    catalog_cache.bump()
 
 
 # Remove a part from the `parts` table in the database by its ID.
@@ -83,4 +85,5 @@ def remove_part_from_db(db: Session, part_id: int) -> None:
     if part_to_remove:
         db.delete(part_to_remove)  # Mark the part for deletion.
         db.commit()  # Commit the transaction to apply the deletion.
+        catalog_cache.bump()
 
@@ -1,6 +1,6 @@
 # DB models
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -26,15 +26,23 @@ class Part(Base):
     stock_quantity = Column(Integer)
     part_parameters_id = Column(Integer, ForeignKey("part_parameters.id"), nullable=True)
     part_number = Column(String)
-    manufacturer = Column(String)
+    manufacturer = Column(String, index=True)
     photo_path = Column(String, nullable=True)
 
     part_parameters = relationship("CarParameter", back_populates="parts")
 
+    # Keyset pagination ordered by price seeks on (price, id); fitment lookups
+    # seek parts of a vehicle on (part_parameters_id, id); bulk imports upsert on part_number
+    __table_args__ = (
+        Index("uq_parts_part_number", "part_number", unique=True),
+        Index("ix_parts_price_id", "price", "id"),
+        Index("ix_parts_part_parameters_id_id", "part_parameters_id", "id"),
+    )
+
 class Cart(Base):
     __tablename__ = "carts"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)  # One cart per user
 
     # Relationship to CartItem, with lazy loading of items
     items = relationship("CartItem", back_populates="cart")  # Changed to "items"
@@ -50,6 +58,9 @@ class CartItem(Base):
     # Reverse relationship to Cart
     cart = relationship("Cart", back_populates="items")  # Matches "items" in Cart
 
+    # One row per part in a cart, concurrent adds upsert into it
+    __table_args__ = (UniqueConstraint("cart_id", "part_id", name="uq_cart_items_cart_part"),)
+
 
 class CarParameter(Base):
     __tablename__ = 'part_parameters'
@@ -61,4 +72,11 @@ class CarParameter(Base):
 
     parts = relationship("Part", back_populates="part_parameters")
 
+    # Fitment lookups filter by make, then model, year and engine; year/engine
+    # alone covers searches that leave the make open
+    __table_args__ = (
+        Index("ix_part_parameters_fitment", "manufacturer", "car_name", "year", "engine_type"),
+        Index("ix_part_parameters_year_engine", "year", "engine_type"),
+    )
+
 
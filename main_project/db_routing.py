@@ -0,0 +1,145 @@
+# Read-replica routing
+#
+# Read-only routes take their session from get_read_db, which picks one of the
+# replicas in DATABASE_REPLICA_URLS (round robin or least connections), and
+# everything else keeps using the primary through get_async_db. After a
+# successful write (any POST/PUT/PATCH/DELETE) the client gets a short-lived
+# cookie that sends its reads to the primary as well, so it sees its own
+# writes while the replicas catch up. The cookie carries its expiry and an HMAC
+# of it, so it works across workers and cannot be stretched by the client. For
+# the same window after a catalog write (parts added, removed or imported),
+# reads that fill the catalog cache go to the primary too, so the cache never
+# stores parts a replica had not caught up on. Cart writes only move stock and
+# happen all the time; counting them would keep every read off the replicas.
+#
+# Locally, two SQLite files work as primary and replica; they are not kept in
+# sync, so copy the primary or point both URLs at the same file.
+
+import hashlib
+import hmac
+import itertools
+import os
+import threading
+import time
+
+from fastapi import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import database
+from auth import SECRET_KEY
+from catalog_cache import catalog_cache
+
+REPLICA_BALANCING = os.getenv("REPLICA_BALANCING", "round_robin")
+# Seconds a client's reads stay on the primary after it wrote
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+PIN_COOKIE = "db_primary_until"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+def checked_out(engine) -> int:
+    # Connections in use; pools without the counter (in-memory SQLite) count as idle
+    pool = engine.sync_engine.pool
+    return pool.checkedout() if hasattr(pool, "checkedout") else 0
+
+
+class ReplicaRouter:
+    def __init__(self, balancing: str = REPLICA_BALANCING, window: int = READ_YOUR_WRITES_SECONDS):
+        if balancing not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown REPLICA_BALANCING: {balancing}")
+        self.balancing = balancing
+        self.window = window
+        self.turns = itertools.count()
+        self.lock = threading.Lock()
+        self.catalog_writes = None
+        self.catalog_changed = 0.0
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+
+    def pick(self, replicas: list) -> int:
+        if self.balancing == "least_connections":
+            # Ties go round robin, so idle replicas share the load
+            start = next(self.turns)
+            order = [(start + i) % len(replicas) for i in range(len(replicas))]
+            return min(order, key=lambda i: checked_out(replicas[i]))
+        return next(self.turns) % len(replicas)
+
+    def catalog_settling(self) -> bool:
+        # Reads right after a catalog write would be cached under the new version even if
+        # a lagging replica returned old rows, so for a moment they go to the primary
+        writes = catalog_cache.catalog_writes
+        now = time.monotonic()
+        if self.catalog_writes is None:
+            self.catalog_writes = writes
+        elif writes != self.catalog_writes:
+            self.catalog_writes, self.catalog_changed = writes, now
+        return now - self.catalog_changed < self.window
+
+    def session(self, pinned: bool = False):
+        engines = database.engines
+        replicas = engines.replica_engines
+        pinned = pinned or (bool(replicas) and self.catalog_settling())
+        with self.lock:
+            if pinned:
+                self.pinned_reads += 1
+            elif replicas:
+                self.replica_reads += 1
+            else:
+                self.primary_reads += 1
+        if pinned or not replicas:
+            return engines.AsyncSessionLocal()
+        return engines.replica_sessionmakers[self.pick(replicas)]()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "replicas": len(database.engines.built_replicas()),
+                "replica_reads": self.replica_reads,
+                "primary_reads": self.primary_reads,
+                "pinned_reads": self.pinned_reads,
+            }
+
+
+def pin_value(until: int) -> str:
+    # "<expiry>.<signature>"; only this server can issue a pin
+    signature = hmac.new(SECRET_KEY.encode(), f"{PIN_COOKIE}:{until}".encode(), hashlib.sha256).hexdigest()[:32]
+    return f"{until}.{signature}"
+
+
+def is_pinned(request: Request) -> bool:
+    value = request.cookies.get(PIN_COOKIE, "")
+    try:
+        until = int(value.partition(".")[0])
+    except ValueError:
+        return False
+    # A valid signature still pins for one window at most
+    now = time.time()
+    return hmac.compare_digest(value, pin_value(until)) and now < until <= now + READ_YOUR_WRITES_SECONDS + 1
+
+
+async def get_read_db(request: Request):
+    async with router.session(pinned=is_pinned(request)) as db:
+        yield db
+
+
+class ReadYourWritesMiddleware:
+    # Sets the pin cookie on successful writes; only matters when there are replicas
+    def __init__(self, app: ASGIApp, window: int = READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS or not self.window or not database.replica_configs():
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = f"{PIN_COOKIE}={pin_value(round(time.time() + self.window))}; Max-Age={self.window}; Path=/; HttpOnly; SameSite=Lax"
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
+
+
+router = ReplicaRouter()
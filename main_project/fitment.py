@@ -0,0 +1,53 @@
+# Vehicle fitment lookup: parts that fit a make/model/year/engine, with facet counts
+
+from typing import List, Optional, Tuple
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from db_models import Part, CarParameter
+from catalog import encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+FITMENT_ATTRIBUTES = {
+    "manufacturer": CarParameter.manufacturer,
+    "car_name": CarParameter.car_name,
+    "year": CarParameter.year,
+    "engine_type": CarParameter.engine_type,
+}
+FACETS = ("manufacturer", "year", "engine_type")
+
+
+def vehicle_conditions(filters: dict, skip: Optional[str] = None) -> list:
+    return [FITMENT_ATTRIBUTES[name] == value for name, value in filters.items() if value is not None and name != skip]
+
+
+async def find_fitting_parts(db: AsyncSession, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, **filters) -> Tuple[List[Part], Optional[str]]:
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    # The vehicle table is small next to parts: resolve the matching vehicles
+    # through the fitment index, then seek parts on (part_parameters_id, id)
+    vehicles = select(CarParameter.id).where(*vehicle_conditions(filters))
+    query = select(Part).options(joinedload(Part.part_parameters)).where(Part.part_parameters_id.in_(vehicles))
+    if cursor:
+        (last_id,) = decode_cursor(cursor, "id")
+        query = query.where(Part.id > last_id)
+    parts = (await db.execute(query.order_by(Part.id).limit(limit + 1))).scalars().all()
+    if len(parts) > limit:
+        parts = parts[:limit]
+        return parts, encode_cursor(parts[-1], "id")
+    return parts, None
+
+
+async def fitment_facets(db: AsyncSession, **filters) -> dict:
+    # Each facet is counted under every filter but its own, so the other
+    # values stay visible as alternatives
+    facets = {}
+    for name in FACETS:
+        attribute = FITMENT_ATTRIBUTES[name]
+        rows = await db.execute(
+            select(attribute, func.count(Part.id))
+            .join(Part, Part.part_parameters_id == CarParameter.id)
+            .where(*vehicle_conditions(filters, skip=name))
+            .group_by(attribute)
+            .order_by(attribute)
+        )
+        facets[name] = [{"value": value, "count": count} for value, count in rows.all()]
+    return facets
@@ -1,97 +1,307 @@
-from fastapi import FastAPI, Form, Depends, HTTPException, File, UploadFile, status, Request
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+import time
+# Start of the app import, for the cold-start timings
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Form, Depends, HTTPException, File, UploadFile, status, Request, Response
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from fastapi.staticfiles import StaticFiles
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.templating import Jinja2Templates
 from starlette.requests import Request
 import os
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from auth import (
-    get_password_hash, authenticate_user, create_access_token,
-    get_current_user, pwd_context,
+    get_password_hash, get_password_hash_async, authenticate_user, authenticate_user_async, create_access_token,
+    get_current_user, is_admin, pwd_context, principal_cache, password_pool,
      ADMIN_PASSWORD
 )
-from crud import add_part_parameters_to_db, add_part_to_db, remove_part_from_db, get_or_create_cart
+from async_crud import (
+    add_part_parameters_to_db, add_part_to_db, remove_part_from_db, get_cart_summary,
+    reserve_stock, release_stock, ensure_cart_id, upsert_cart_item, get_user_cart_item,
+    set_cart_item_quantity, delete_cart_item
+)
 from db_models import User, Part, CartItem, Cart, CarParameter
-from pydantic_models import Token
-from database import get_db, create_database
+from pydantic_models import Token, PartOut, CatalogPage, SearchPage, FitmentPage
+from fitment import find_fitting_parts, fitment_facets
+from search import search_parts
+from catalog import get_catalog_page_cached, get_part_cached, get_car_parameters_cached, CatalogPageStream, DEFAULT_PAGE_SIZE
+from streaming import stream_template, Spliced, Deferred
+from catalog_cache import catalog_cache
+from conditional import content_etag, etag_matches, not_modified, set_validators, PUBLIC
+from typing import Optional
+from database import get_db, get_async_db, get_pool_statistics, engines
+from catalog_export import export_chunks, EXPORT_FORMATS
+from bulk_import import import_parts, detect_format, DEFAULT_BATCH_SIZE
+from starlette.concurrency import run_in_threadpool
+import io
+import logging
 import random
-
-create_database()
-
-app = FastAPI()
+from photo_store import UPLOAD_DIR, store_upload
+from photo_variants import photo_variants, photo_url
+from static_assets import CachedStaticFiles, static_url
+from compression import CompressionMiddleware, Fragment, fragment_response
+from metrics import MetricsMiddleware, metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from profiler import slow_request_profiler
+from app_logging import RequestIdMiddleware, HIGH_VOLUME, state as logging_state
+from startup import start_worker, stop_worker
+from db_routing import get_read_db, ReadYourWritesMiddleware, router as db_router
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.startup = await start_worker(time.perf_counter() - IMPORT_STARTED)
+    yield
+    await stop_worker()
+
+
+app = FastAPI(lifespan=lifespan)
+# Reads of a client that just wrote go to the primary for a few seconds
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(CompressionMiddleware)
+# Outside compression, so compression time is part of the measured latency
+app.add_middleware(MetricsMiddleware)
+# Correlation ID for everything logged while handling the request
+app.add_middleware(RequestIdMiddleware)
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Directory where uploaded photos will be stored
-UPLOAD_DIR = "static/uploaded_photos"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
-
-
 # Mount static directory an Load templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# The directory may not exist yet on a clean checkout; the lifespan creates it
+app.mount("/static", CachedStaticFiles(directory="static", check_dir=False), name="static")
 templates = Jinja2Templates(directory="templates")
+# {{ static_url("style.css") }} gives a fingerprinted URL that browsers cache for good
+templates.env.globals["static_url"] = static_url
+# {{ photo_url(product.photo_path, "medium", "webp") }} picks a resized rendition in templates
+templates.env.globals["photo_url"] = photo_url
 
 # Title page route
 @app.get("/", response_class=HTMLResponse)
 async def title_page(request: Request) -> HTMLResponse:
     return templates.TemplateResponse("index.html", {"request": request})
 
+# Catalog paging and filters shared by the shop, admin and JSON catalog routes
+def catalog_filters(
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    sort: str = "id",
+    manufacturer: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    part_parameters_id: Optional[int] = None,
+) -> dict:
+    return {
+        "cursor": cursor,
+        "limit": limit,
+        "sort": sort,
+        "manufacturer": manufacturer,
+        "min_price": min_price,
+        "max_price": max_price,
+        "part_parameters_id": part_parameters_id,
+    }
+
+
+async def load_catalog_page(db: AsyncSession, filters: dict) -> tuple:
+    try:
+        return await get_catalog_page_cached(db, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/catalog", response_model=CatalogPage)
+async def catalog(request: Request, response: Response, filters: dict = Depends(catalog_filters), db: AsyncSession = Depends(get_read_db)) -> CatalogPage:
+    etag = catalog_cache.etag("catalog")
+    if etag_matches(request, etag):
+        return not_modified(etag, PUBLIC)
+    set_validators(response, etag, PUBLIC)
+    parts, next_cursor = await load_catalog_page(db, filters)
+    return CatalogPage(items=[PartOut.model_validate(part) for part in parts], next_cursor=next_cursor)
+
+
+@app.get("/catalog/{part_id}", response_model=PartOut)
+async def catalog_part(part_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)) -> PartOut:
+    etag = catalog_cache.etag("catalog")
+    if etag_matches(request, etag):
+        return not_modified(etag, PUBLIC)
+    set_validators(response, etag, PUBLIC)
+    part = await get_part_cached(db, part_id)
+    if part is None:
+        raise HTTPException(status_code=404, detail="Part not found")
+    return PartOut.model_validate(part)
+
+
+# Ranked full-text search over part name, number, manufacturer and description
+@app.get("/search", response_model=SearchPage)
+async def search(request: Request, response: Response, q: str, limit: int = 20, offset: int = 0, db: AsyncSession = Depends(get_read_db)) -> SearchPage:
+    etag = catalog_cache.etag("catalog")
+    if etag_matches(request, etag):
+        return not_modified(etag, PUBLIC)
+    set_validators(response, etag, PUBLIC)
+    parts, next_offset = await catalog_cache.get_or_load(
+        ("search", q, limit, offset), lambda: search_parts(db, q, limit, offset)
+    )
+    return SearchPage(items=[PartOut.model_validate(part) for part in parts], next_offset=next_offset)
+
+
+# Parts that fit a vehicle, with counts per make, year and engine type
+@app.get("/fitment", response_model=FitmentPage)
+async def fitment(
+    request: Request,
+    response: Response,
+    manufacturer: Optional[str] = None,
+    car_name: Optional[str] = None,
+    year: Optional[int] = None,
+    engine_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
+) -> FitmentPage:
+    etag = catalog_cache.etag("catalog")
+    if etag_matches(request, etag):
+        return not_modified(etag, PUBLIC)
+    set_validators(response, etag, PUBLIC)
+    vehicle = {"manufacturer": manufacturer, "car_name": car_name, "year": year, "engine_type": engine_type}
+
+    async def load() -> tuple:
+        parts, next_cursor = await find_fitting_parts(db, cursor=cursor, limit=limit, **vehicle)
+        return parts, next_cursor, await fitment_facets(db, **vehicle)
+
+    try:
+        parts, next_cursor, facets = await catalog_cache.get_or_load(("fitment", tuple(vehicle.items()), cursor, limit), load)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FitmentPage(items=[PartOut.model_validate(part) for part in parts], next_cursor=next_cursor, facets=facets)
+
+
 @app.get("/main", response_class=HTMLResponse)
-async def shop(request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> HTMLResponse:
-    products = db.query(Part).all()
+async def shop(request: Request, filters: dict = Depends(catalog_filters), db: AsyncSession = Depends(get_read_db), user: User = Depends(get_current_user)) -> HTMLResponse:
+    # Item count for the header badge, aggregated in SQL; no cart row is created on a first visit.
+    # It is read before the validator: a cart change made on another worker must change the ETag
+    cart_summary = await get_cart_summary(db, user.id)
+    etag = catalog_cache.etag("main", user.id, cart_summary.item_count, cart_summary.line_count, cart_summary.total_price)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # Products are read in batches while the template renders them
+    try:
+        products = CatalogPageStream(db, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     random_fact = random.choice(car_facts)
-    
-    # Get or create the user's cart and calculate item count
-    cart = get_or_create_cart(db, user.id)
-    cart_count = sum(item.quantity for item in cart.items)
 
-    return templates.TemplateResponse("shop.html", {"request": request, "products": products, "cart_count": cart_count, "random_fact": random_fact})
+    context = {"request": request, "products": products, "next_cursor": Deferred(lambda: products.next_cursor), "filters": filters, "cart_count": cart_summary.item_count, "cart_summary": cart_summary, "random_fact": random_fact}
+    return set_validators(stream_template(templates, "shop.html", context, db), etag)
 
 
-def generate_html_content(db: Session) -> dict:
+async def generate_html_content(db: AsyncSession, filters: Optional[dict] = None) -> dict:
     car_message = random.choice(car_facts)
 
-    # Query parts and parameters
-    parts_list = db.query(Part).all()
-    part_parameters_list = db.query(CarParameter).all()
+    filters = filters or catalog_filters()
 
-    # Generate the HTML for parts
-    parts_html = "".join(
-        f"<li>{part.part_name}: {part.description} - {part.price:.2f} {part.currency} | Stock: {part.stock_quantity} | Car: {part.part_parameters if part.part_parameters else 'N/A'}" +
-        f"<form action='/remove_part/' method='post' style='display:inline; margin-left: 10px;'><input type='hidden' name='id' value='{part.id}' /><input type='password' name='admin_code' placeholder='Admin Code' required style='padding: 3px; width: 120px; margin-right: 5px;' /><button type='submit' style='padding: 3px 6px; background-color: #e74c3c; color: white; border: none; cursor: pointer; border-radius: 5px;'>Remove</button></form>" +
-        (f"<br><img src='/static/{part.photo_path}' alt='No Image' style='max-width: 200px; max-height: 200px; margin-top: 10px;'>" if part.photo_path else '') +
-        "</li>" 
-        for part in parts_list
-    )
-
-    # Generate the HTML for part parameters
-    part_parameters_html = "".join(
-        f"<option value='{parameter.id}'>{parameter.car_name} ({parameter.year}) - {parameter.engine_type}</option>" for parameter in part_parameters_list
-    )
+    # Rows rendered earlier at this catalog version are cached compressed, otherwise
+    # they are streamed from the database and cached once the page is complete
+    cached_rows = catalog_cache.get(("admin_rows", tuple(filters.items())), default=None)
+    if cached_rows is not None:
+        parts_html, next_cursor = cached_rows
+    else:
+        parts_html = PartRowStream(db, filters)
+        next_cursor = Deferred(lambda: parts_html.next_cursor)
+    part_parameters_html = await catalog_cache.get_or_load(("admin_options",), lambda: render_part_parameter_options(db))
 
     # Return a dictionary to pass to the HTML template
     return {
         "car_message": car_message,
         "parts_html": parts_html,
-        "part_parameters_html": part_parameters_html
+        "part_parameters_html": part_parameters_html,
+        "next_cursor": next_cursor
     }
 
 
+def render_part_row(part: Part) -> str:
+    return (
+        f"<li>{part.part_name}: {part.description} - {part.price:.2f} {part.currency} | Stock: {part.stock_quantity} | Car: {part.part_parameters if part.part_parameters else 'N/A'}" +
+        f"<form action='/remove_part/' method='post' style='display:inline; margin-left: 10px;'><input type='hidden' name='id' value='{part.id}' /><input type='password' name='admin_code' placeholder='Admin Code' required style='padding: 3px; width: 120px; margin-right: 5px;' /><button type='submit' style='padding: 3px 6px; background-color: #e74c3c; color: white; border: none; cursor: pointer; border-radius: 5px;'>Remove</button></form>" +
+        (f"<br><picture><source srcset='{photo_url(part.photo_path, 'thumb', 'webp')}' type='image/webp'><img src='{photo_url(part.photo_path)}' alt='No Image' style='max-width: 200px; max-height: 200px; margin-top: 10px;'></picture>" if part.photo_path else '') +
+        "</li>"
+    )
+
+
+class PartRowStream(Spliced):
+    # Admin rows written into the page batch by batch, then cached as a compressed fragment
+    def __init__(self, db: AsyncSession, filters: dict):
+        self.key = ("admin_rows", tuple(filters.items()))
+        self.version = catalog_cache.version
+        self.parts = CatalogPageStream(db, **filters)
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        return self.parts.next_cursor
+
+    async def __aiter__(self):
+        rows = []
+        async for batch in self.parts.batches():
+            html = "".join(render_part_row(part) for part in batch)
+            rows.append(html)
+            yield html
+        catalog_cache.set(self.key, (Fragment("".join(rows)), self.next_cursor), self.version)
+
+
+async def render_part_parameter_options(db: AsyncSession) -> Fragment:
+    part_parameters_list = await get_car_parameters_cached(db)
+    return Fragment("".join(
+        f"<option value='{parameter.id}'>{parameter.car_name} ({parameter.year}) - {parameter.engine_type}</option>" for parameter in part_parameters_list
+    ))
+
+
 # Main webpage route
 @app.get("/shop", response_class=HTMLResponse)
-async def read_root(request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> HTMLResponse:
+async def read_root(request: Request, filters: dict = Depends(catalog_filters), db: AsyncSession = Depends(get_read_db), user: User = Depends(get_current_user)) -> HTMLResponse:
+    etag = catalog_cache.etag("shop", user.id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
     try:
-        content = generate_html_content(db)
-        return templates.TemplateResponse("admin.html", {"request": request, **content})
+        content = await generate_html_content(db, filters)
+        context = {"request": request, **content}
+        if isinstance(content["parts_html"], Fragment):
+            return set_validators(fragment_response(templates, "admin.html", context, request), etag)
+        return set_validators(stream_template(templates, "admin.html", context, db), etag)
     except Exception as e:
         return HTMLResponse(content=f"<h1>Error: {e}</h1>")
 
 
 
 
+# Connection and password-hashing pool statistics for the current worker, for scraping while the app runs
+@app.get("/pool_stats")
+async def pool_stats() -> dict:
+    return {**get_pool_statistics(), "password_hashing": password_pool.stats()}
+
+
+# Catalog and principal cache hit/miss counters for the current worker
+@app.get("/cache_stats")
+async def cache_stats() -> dict:
+    return {"catalog": catalog_cache.stats(), "principals": principal_cache.stats(), "photo_variants": photo_variants.stats()}
+
+
+# Prometheus scrape target: per-route latency, status counts, in-flight requests and SQL per request for this worker
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    gauges = {
+        "db_pool": get_pool_statistics(),
+        "cache": {"catalog": catalog_cache.stats(), "principals": principal_cache.stats(), "photo_variants": photo_variants.stats()},
+        "worker_pool": {"password_hashing": password_pool.stats()},
+        "profiler": {"slow_requests": slow_request_profiler.stats()},
+        "log_queue": {"app": logging_state.stats()},
+        "db_routing": {"reads": db_router.stats()},
+        "worker_startup": {phase: {"seconds": seconds} for phase, seconds in getattr(app.state, "startup", {}).items()},
+    }
+    return Response(metrics.render(gauges), media_type=METRICS_CONTENT_TYPE)
+
+
 # Login page route
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request) -> HTMLResponse:
@@ -104,14 +314,14 @@ async def show_registration_form(request: Request) -> HTMLResponse:
 
 
 @app.post("/login")
-async def login(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)) -> RedirectResponse:
-    print(f"Login attempt for user: {username}")
-    
+async def login(request: Request, username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_async_db)) -> RedirectResponse:
+    logger.debug("Login attempt", extra={"username": username, **HIGH_VOLUME})
+
     # Use the session `db` to query the database
-    user = authenticate_user(username, password, db)
+    user = await authenticate_user_async(username, password, db)
 
     if not user:
-        print(f"Authentication failed for user: {username}")
+        logger.info("Login failed", extra={"username": username})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
@@ -119,7 +329,7 @@ async def login(request: Request, username: str = Form(...), password: str = For
     
     access_token = create_access_token(data={"sub": user.username})
 
-    print(f"Login successful for user: {username}")
+    logger.debug("Login succeeded", extra={"username": username, **HIGH_VOLUME})
     # return JSONResponse({"access_token": access_token, "token_type": "bearer"})
     response=RedirectResponse(url="/main", status_code=303)
     response.set_cookie(
@@ -135,26 +345,26 @@ async def login(request: Request, username: str = Form(...), password: str = For
 
 # Register a User
 @app.post("/register", response_class=HTMLResponse)
-async def register(request: Request, username: str = Form(...), email: str = Form(...), password: str = Form(...),role: str = Form("user"), db: Session = Depends(get_db)) -> HTMLResponse:
-    user_in_db = db.query(User).filter(User.email == email).first()
+async def register(request: Request, username: str = Form(...), email: str = Form(...), password: str = Form(...),role: str = Form("user"), db: AsyncSession = Depends(get_async_db)) -> HTMLResponse:
+    user_in_db = (await db.execute(select(User).filter(User.email == email))).scalars().first()
     if user_in_db:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = get_password_hash(password)    
+    hashed_password = await get_password_hash_async(password)
     new_user = User(email=email, username=username, hashed_password=hashed_password, role=role)
 
     # Add new user to the database and commit
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return templates.TemplateResponse("register_success.html", {"request": request})
     
 
 # Login User and Issue Token
 @app.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> dict:
-    user = authenticate_user(form_data.username, form_data.password, db)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)) -> dict:
+    user = await authenticate_user_async(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -188,23 +398,16 @@ async def add_part(
     stock_quantity: int = Form(...),
     part_parameters: int = Form(None),  # Optional
     file: UploadFile = None,  # Optional file upload
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> HTMLResponse:
     try:
-        # Save the file to the server if it was uploaded
-        file_location = None
-        print(f"File: {file}")
-        file_content = await file.read()
-        if file_content:
-            print(f"Saving file: {file.filename}")
-            file_location = os.path.join(UPLOAD_DIR, file.filename)
-            print(f"File location: {file_location}")
-            with open(file_location, "wb") as file_object:
-                file_object.write(file_content)
-
+        # Stream the photo to content-addressed storage if one was uploaded
+        file_location = await store_upload(file) if file is not None else None
+        if file_location:
+            photo_variants.schedule(file_location)
 
         # Call the add_part_to_db function with the path to the saved file
-        add_part_to_db(
+        await add_part_to_db(
             
             name=name,
             description=description,
@@ -226,6 +429,8 @@ async def add_part(
         </body>
         </html>
         """)
+    except HTTPException:
+        raise
     except Exception as e:
         return HTMLResponse(content=f"<h1>Error: {e}</h1>")
 
@@ -238,11 +443,10 @@ async def add_part_parameters(
     manufacturer: str = Form(...),
     year: int = Form(...),
     engine_type: str = Form(...),
-    db: Session = Depends(get_db)    
+    db: AsyncSession = Depends(get_async_db)
 ) -> HTMLResponse:
-    print(f"engine type is {engine_type} 1")
     try:
-        add_part_parameters_to_db(db, car_name, manufacturer, year, engine_type)
+        await add_part_parameters_to_db(db, car_name, manufacturer, year, engine_type)
         return HTMLResponse(content="""
         <html>
         <head>
@@ -260,12 +464,12 @@ async def add_part_parameters(
 
 # Remove part route
 @app.post("/remove_part/", response_class=HTMLResponse)
-async def remove_part(db: Session = Depends(get_db), id: int = Form(...), admin_code: str = Form(...)) -> HTMLResponse:
+async def remove_part(db: AsyncSession = Depends(get_async_db), id: int = Form(...), admin_code: str = Form(...)) -> HTMLResponse:
     try:
         if admin_code != ADMIN_PASSWORD:
             raise HTTPException(status_code=403, detail="Unauthorized: Incorrect Admin Code")
         
-        remove_part_from_db(db, id)
+        await remove_part_from_db(db, id)
         return HTMLResponse(content="""
         <html>
         <head>
@@ -280,19 +484,59 @@ async def remove_part(db: Session = Depends(get_db), id: int = Form(...), admin_
         return HTMLResponse(content=f"<h1>Error: {e}</h1>")
     
 
+# Bulk import of a supplier feed (CSV or JSONL), streamed from the spooled upload
+@app.post("/import_parts/")
+async def import_parts_route(
+    file: UploadFile = File(...),
+    admin_code: str = Form(...),
+    format: Optional[str] = Form(None),
+    batch_size: int = Form(DEFAULT_BATCH_SIZE),
+) -> JSONResponse:
+    if admin_code != ADMIN_PASSWORD:
+        raise HTTPException(status_code=403, detail="Unauthorized: Incorrect Admin Code")
+    fmt = format or detect_format(file.filename or "")
+    if fmt not in ("csv", "jsonl") or batch_size < 1:
+        raise HTTPException(status_code=400, detail="format must be csv or jsonl and batch_size positive")
+
+    # The import is blocking database and parsing work, keep it off the event loop
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        report = await run_in_threadpool(import_parts, engines.engine, stream, fmt, batch_size)
+    finally:
+        stream.detach()
+    return JSONResponse(report.model_dump())
+
+
+# Full catalog dump for marketplaces and analytics, streamed from a server-side cursor
+@app.get("/export/parts")
+async def export_parts(format: str = "csv", gzip: bool = True, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)) -> StreamingResponse:
+    if not await is_admin(db, current_user):
+        raise HTTPException(status_code=403, detail="Only admins can export the catalog")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+    filename = f"parts.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_chunks(db_router.session, format, compress=gzip),
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.put("/admin/set_role/{user_id}")
-async def set_role(user_id: int, role: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> dict:
+async def set_role(user_id: int, role: str, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)) -> dict:
     # Check if the current user is an admin
-    if current_user.role != "admin":
+    if not await is_admin(db, current_user):
         raise HTTPException(status_code=403, detail="Only admins can set roles")
     
     # Fetch user by ID and update role
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
     user.role = role
-    db.commit()
+    await db.commit()
+    principal_cache.invalidate_user(user.id)
     return {"message": f"User {user.username}'s role updated to {role}"}
 
 
@@ -301,50 +545,27 @@ async def set_role(user_id: int, role: str, current_user: User = Depends(get_cur
 async def add_to_cart(
     product_id: int,
     quantity: int = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)  # Dependency injection for current user
 ) -> dict:
     # Use the current user's ID
     user_id = current_user.id
 
-    # Fetch the part
-    part = db.query(Part).filter(Part.id == product_id).first()
-    if not part:
-        return {"error": "Product not found"}
-    
-    if part.stock_quantity < quantity:
+    if quantity < 1:
+        return {"error": "Quantity must be at least 1"}
+
+    # Take the stock first: one conditional UPDATE, so concurrent adds cannot oversell
+    if not await reserve_stock(db, product_id, quantity):
+        await db.rollback()
+        if not await db.get(Part, product_id):
+            return {"error": "Product not found"}
         return {"error": "Not enough stock"}
-    
-    # Fetch or create the cart
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-    if not cart:
-        cart = Cart(user_id=user_id)
-        db.add(cart)
-        db.commit()
-        db.refresh(cart)
-    
-    # Check if the item is already in the cart
-    cart_item = db.query(CartItem).filter(
-        CartItem.cart_id == cart.id,
-        CartItem.part_id == product_id
-    ).first()
-    
-    if cart_item:
-        if part.stock_quantity >= cart_item.quantity + quantity:
-            cart_item.quantity += quantity
-        else:
-            return {"error": "Not enough stock to add this quantity"}
-    else:
-        new_cart_item = CartItem(
-            cart_id=cart.id,
-            part_id=part.id,
-            quantity=quantity
-        )
-        db.add(new_cart_item)
-    
-    # Reduce the stock
-    part.stock_quantity -= quantity
-    db.commit()
+
+    # Add to the user's cart in the same transaction
+    cart_id = await ensure_cart_id(db, user_id)
+    await upsert_cart_item(db, cart_id, product_id, quantity)
+    await db.commit()
+    catalog_cache.bump(catalog_write=False)
     
     return RedirectResponse(url="/cart", status_code=302)
 
@@ -352,50 +573,50 @@ async def add_to_cart(
 async def update_cart_item(
     item_id: int,
     quantity: int = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ) -> RedirectResponse:
+    if quantity < 0:
+        return {"error": "Quantity cannot be negative"}
+
     # Fetch the cart item
-    cart_item = db.query(CartItem).filter(CartItem.id == item_id).first()
+    cart_item = await get_user_cart_item(db, current_user.id, item_id)
     if not cart_item:
         return {"error": "Cart item not found"}
 
-    # Fetch the associated part
-    part = db.query(Part).filter(Part.id == cart_item.part_id).first()
-    if not part:
-        return {"error": "Associated part not found"}
-
-    # Check stock availability
-    if part.stock_quantity + cart_item.quantity < quantity:
+    # Take or give back only the difference
+    delta = quantity - cart_item.quantity
+    if delta > 0 and not await reserve_stock(db, cart_item.part_id, delta):
+        await db.rollback()
         return {"error": "Not enough stock"}
+    if delta < 0:
+        await release_stock(db, cart_item.part_id, -delta)
 
     # Update the quantity
-    part.stock_quantity += cart_item.quantity - quantity  # Restore stock for removed quantity
-    cart_item.quantity = quantity
+    if not await set_cart_item_quantity(db, item_id, cart_item.quantity, quantity):
+        await db.rollback()
+        return {"error": "Cart item changed, please try again"}
 
-    db.commit()
+    await db.commit()
+    catalog_cache.bump(catalog_write=False)
     return RedirectResponse(url="/cart", status_code=302)
 
 
 @app.post("/remove_from_cart/{item_id}")
 async def remove_from_cart(
     item_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ) -> RedirectResponse:
-    # Fetch the cart item
-    cart_item = db.query(CartItem).filter(CartItem.id == item_id).first()
-    if not cart_item:
+    # Remove the item from the cart; only the request that deletes the row gives its stock back
+    removed = await delete_cart_item(db, current_user.id, item_id)
+    if not removed:
         return {"error": "Cart item not found"}
 
-    # Fetch the associated part
-    part = db.query(Part).filter(Part.id == cart_item.part_id).first()
-    if part:
-        part.stock_quantity += cart_item.quantity  # Restore stock
-
-    # Remove the item from the cart
-    db.delete(cart_item)
-    db.commit()
+    part_id, quantity = removed
+    await release_stock(db, part_id, quantity)  # Restore stock
+    await db.commit()
+    catalog_cache.bump(catalog_write=False)
 
     return RedirectResponse(url="/cart", status_code=302)
 
@@ -404,42 +625,52 @@ async def remove_from_cart(
 @app.get("/cart")
 async def view_cart(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)  # Dependency to get the authenticated user
 ) -> HTMLResponse:
     user_id = current_user.id
-    
-    # Fetch the user's cart
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-    if not cart or not cart.items:
-        return templates.TemplateResponse(
+    # Fetch the user's cart items together with their parts and line totals in one query.
+    # The validator is built from these rows, so it changes with any cart, price or stock
+    # change, whichever worker made it
+    rows = (await db.execute(
+        select(CartItem, Part, (CartItem.quantity * Part.price).label("total_price"))
+        .join(Cart, CartItem.cart_id == Cart.id)
+        .join(Part, CartItem.part_id == Part.id)
+        .filter(Cart.user_id == user_id)
+        .order_by(CartItem.id)
+    )).all()
+    etag = content_etag("cart", user_id, [
+        (item.id, item.quantity, part.id, part.part_name, part.price, part.stock_quantity, part.photo_path) for item, part, _ in rows
+    ])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # Totals come from one aggregate query
+    cart_summary = await get_cart_summary(db, user_id)
+    if not rows:
+        return set_validators(templates.TemplateResponse(
             "cart.html",
-            {"request": request, "cart_items": [], "cart_total": 0}
-        )
+            {"request": request, "cart_items": [], "cart_total": 0, "cart_summary": cart_summary}
+        ), etag)
 
-    # Calculate the total cost and prepare cart items
+    # Prepare cart items
     cart_items = []
-    total_cost = 0
-    for item in cart.items:
-        part = db.query(Part).filter(Part.id == item.part_id).first()
-        if part:
-            total_price = part.price * item.quantity
-            total_cost += total_price
-            cart_items.append({
-                "id": item.id,
-                "name": part.part_name,
-                "image_url": part.photo_path or "/static/default_image.png",  # Replace with default image path
-                "price": part.price,
-                "quantity": item.quantity,
-                "stock_quantity": part.stock_quantity,
-                "part_name": part.part_name,
-                "total_price": total_price,
-            })
+    for item, part, total_price in rows:
+        cart_items.append({
+            "id": item.id,
+            "name": part.part_name,
+            "image_url": photo_url(part.photo_path),
+            "price": part.price,
+            "quantity": item.quantity,
+            "stock_quantity": part.stock_quantity,
+            "part_name": part.part_name,
+            "total_price": total_price,
+        })
     
-    return templates.TemplateResponse(
+    return set_validators(templates.TemplateResponse(
         "cart.html",
-        {"request": request, "cart_items": cart_items, "cart_total": total_cost}
-    )
+        {"request": request, "cart_items": cart_items, "cart_total": cart_summary.total_price, "cart_summary": cart_summary}
+    ), etag)
 
 
 car_facts = [
@@ -462,9 +693,10 @@ car_facts = [
 ]
 
 
-# if __name__ == "__main__":
-#     import uvicorn
-#     uvicorn.run(app, host="0.0.0.0", port=8000)
+if __name__ == "__main__":
+    # python main.py serves like server.py, with its options
+    from server import main as serve
+    serve()
 
 
 # fastapi dev main_project/main.py
@@ -0,0 +1,223 @@
+# Request and database metrics in Prometheus text format
+#
+# MetricsMiddleware times every request (until the last body chunk, so streamed
+# pages count in full) into per-route histograms, counts responses by status
+# and tracks requests in flight. instrument_engine() hooks the cursor events of
+# an engine; statements and database time are added to the request that issued
+# them through a contextvar, which follows the request into child tasks and the
+# threadpool. Everything is per worker process and served at /metrics.
+
+import bisect
+import contextvars
+import math
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from profiler import slow_request_profiler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: dict) -> list:
+        # Cumulative buckets, as the exposition format wants them
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            samples.append((f"{name}_bucket", {**labels, "le": format_value(bound)}, cumulative))
+        samples.append((f"{name}_sum", labels, self.sum))
+        samples.append((f"{name}_count", labels, cumulative))
+        return samples
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.responses = {}
+        self.latency = {}
+        self.statements = {}
+        self.db_seconds = {}
+        self.statements_total = 0
+        self.db_seconds_total = 0.0
+
+    def started(self) -> None:
+        with self.lock:
+            self.in_flight += 1
+
+    def finished(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        key = (method, route)
+        with self.lock:
+            self.in_flight -= 1
+            self.responses[(method, route, status)] = self.responses.get((method, route, status), 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.statements.setdefault(key, Histogram(STATEMENT_BUCKETS)).observe(stats.statements)
+            self.db_seconds.setdefault(key, Histogram(DB_BUCKETS)).observe(stats.db_seconds)
+
+    def record_statement(self, seconds: float) -> None:
+        stats = current_request.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += seconds
+        with self.lock:
+            self.statements_total += 1
+            self.db_seconds_total += seconds
+
+    def render(self, extra_gauges: Optional[dict] = None) -> str:
+        families = {
+            "http_requests_in_flight": ("gauge", "Requests being served", []),
+            "http_responses_total": ("counter", "Responses by route and status", []),
+            "http_request_duration_seconds": ("histogram", "Time until the last body chunk was sent", []),
+            "http_request_db_statements": ("histogram", "SQL statements issued per request", []),
+            "http_request_db_seconds": ("histogram", "Time spent in SQL statements per request", []),
+            "db_statements_total": ("counter", "SQL statements issued, inside requests or not", []),
+            "db_seconds_total": ("counter", "Time spent in SQL statements", []),
+        }
+        with self.lock:
+            families["http_requests_in_flight"][2].append(("http_requests_in_flight", {}, self.in_flight))
+            for (method, route, status), count in sorted(self.responses.items()):
+                families["http_responses_total"][2].append(("http_responses_total", {"method": method, "route": route, "status": str(status)}, count))
+            for name, histograms in (("http_request_duration_seconds", self.latency), ("http_request_db_statements", self.statements),
+                                     ("http_request_db_seconds", self.db_seconds)):
+                for (method, route), histogram in sorted(histograms.items()):
+                    families[name][2].extend(histogram.samples(name, {"method": method, "route": route}))
+            families["db_statements_total"][2].append(("db_statements_total", {}, self.statements_total))
+            families["db_seconds_total"][2].append(("db_seconds_total", {}, self.db_seconds_total))
+        for name, (labels, value) in flatten_gauges(extra_gauges or {}):
+            families.setdefault(name, ("gauge", None, []))[2].append((name, labels, value))
+
+        lines = []
+        for name, (kind, help_text, samples) in families.items():
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{sample}{format_labels(labels)} {format_value(value)}" for sample, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+def format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def flatten_gauges(groups: dict) -> list:
+    # {"db_pool": {"sync": {"checked_out": 1}}} -> db_pool_checked_out{source="sync"} 1; non-numbers are skipped
+    samples = []
+    for prefix, sources in groups.items():
+        for source, values in sources.items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    samples.append((f"{prefix}_{key}", ({"source": source}, value)))
+    return samples
+
+
+def route_label(scope: Scope) -> str:
+    # The route template keeps label cardinality bounded; mounts are labelled by their prefix
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    return scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, registry: Optional[Metrics] = None, profiler=None):
+        self.app = app
+        self.registry = registry or metrics
+        self.profiler = profiler if profiler is not None else slow_request_profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestStats()
+        token = current_request.set(stats)
+        profile = self.profiler.start() if self.profiler.enabled else None
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.registry.started()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            route = route_label(scope)
+            self.registry.finished(scope["method"], route, status, elapsed, stats)
+            if profile is not None:
+                self.profiler.finish(profile, f"{scope['method']} {route}", elapsed)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info["metrics_query_start"].pop()
+    metrics.record_statement(time.perf_counter() - started)
+
+
+def handle_error(exception_context) -> None:
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_query_start"):
+        started = connection.info["metrics_query_start"].pop()
+        metrics.record_statement(time.perf_counter() - started)
+
+
+def instrument_engine(engine) -> None:
+    # AsyncEngine events are registered on its sync engine
+    engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(engine, "handle_error", handle_error)
+
+
+metrics = Metrics()
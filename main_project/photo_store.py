@@ -0,0 +1,62 @@
+# Content-addressed storage for uploaded part photos
+#
+# Uploads are streamed to a temporary file in fixed-size chunks while being
+# hashed, then moved to <UPLOAD_DIR>/<first two hex digits>/<sha256><ext>. The
+# same photo uploaded twice is stored once, and client file names never reach
+# the filesystem.
+
+import hashlib
+import os
+import uuid
+from typing import Optional
+
+import anyio
+from fastapi import HTTPException, UploadFile
+
+UPLOAD_DIR = "static/uploaded_photos"
+CHUNK_SIZE = 64 * 1024
+MAX_PHOTO_BYTES = int(os.getenv("PHOTO_MAX_BYTES", str(10 * 1024 * 1024)))
+PHOTO_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+
+def photo_extension(filename: Optional[str]) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in PHOTO_EXTENSIONS:
+        raise HTTPException(status_code=415, detail=f"Photo must be one of {', '.join(sorted(PHOTO_EXTENSIONS))}")
+    return ".jpg" if extension == ".jpeg" else extension
+
+
+def photo_path(digest: str, extension: str, directory: str = UPLOAD_DIR) -> str:
+    return os.path.join(directory, digest[:2], digest + extension)
+
+
+async def store_upload(upload: UploadFile, directory: str = UPLOAD_DIR, max_bytes: int = MAX_PHOTO_BYTES) -> Optional[str]:
+    # Returns the stored path, or None when no photo was chosen in the form
+    if not upload.filename:
+        return None
+    extension = photo_extension(upload.filename)
+    digest = hashlib.sha256()
+    size = 0
+    await anyio.Path(directory).mkdir(parents=True, exist_ok=True)
+    temp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}")
+    try:
+        async with await anyio.open_file(temp_path, "wb") as out:
+            while chunk := await upload.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Photo exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                await out.write(chunk)
+        if size == 0:
+            return None
+
+        final_path = photo_path(digest.hexdigest(), extension, directory)
+        final = anyio.Path(final_path)
+        if await final.exists():
+            return final_path
+        await final.parent.mkdir(exist_ok=True)
+        # Atomic rename, a concurrent upload of the same photo just replaces identical bytes
+        await anyio.Path(temp_path).rename(final_path)
+        return final_path
+    finally:
+        await anyio.Path(temp_path).unlink(missing_ok=True)
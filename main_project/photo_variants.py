@@ -0,0 +1,151 @@
+# Resized renditions of part photos
+#
+# Pages ask for a variant through photo_url(); if it is not on disk yet the
+# original is served for now and the variant is rendered in a process pool,
+# off the request path. Variants live in a size-bounded directory, the oldest
+# are evicted first and simply rendered again when next needed.
+
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from static_assets import STATIC_DIR, static_url
+
+# Served through the /static mount, so it has to be inside the static directory
+VARIANT_DIR = os.getenv("PHOTO_VARIANT_DIR", "static/photo_variants")
+VARIANT_CACHE_BYTES = int(os.getenv("PHOTO_VARIANT_CACHE_BYTES", str(512 * 1024 * 1024)))
+VARIANT_WORKERS = int(os.getenv("PHOTO_VARIANT_WORKERS", "2"))
+# Name -> bounding box; the aspect ratio is kept
+VARIANTS = {"thumb": (200, 200), "medium": (800, 800)}
+VARIANT_FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True})}
+DEFAULT_IMAGE_URL = "/static/default_image.png"
+
+
+def photo_key(photo_path: str) -> str:
+    # Uploads are already named by content hash; older free-form names are hashed by path
+    stem = os.path.splitext(os.path.basename(photo_path))[0]
+    if len(stem) == 64 and all(c in "0123456789abcdef" for c in stem):
+        return stem
+    return hashlib.sha256(photo_path.encode()).hexdigest()
+
+
+def original_url(photo_path: str) -> str:
+    # Fingerprinted, so older uploads stored under their client file name are cached for good too
+    return static_url(photo_path[len("static/"):] if photo_path.startswith("static/") else photo_path)
+
+
+def render_variants(source: str, directory: str, key: str) -> int:
+    # Runs in a worker process; Pillow is only needed there
+    from PIL import Image, ImageOps
+
+    written = 0
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        for name, size in VARIANTS.items():
+            variant = image.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            for extension, (fmt, options) in VARIANT_FORMATS.items():
+                path = os.path.join(directory, f"{key}-{name}.{extension}")
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                rendition = variant.convert("RGB") if fmt == "JPEG" and variant.mode != "RGB" else variant
+                rendition.save(temp_path, fmt, **options)
+                os.replace(temp_path, path)
+                written += os.path.getsize(path)
+    return written
+
+
+class PhotoVariantCache:
+    def __init__(self, directory: str = VARIANT_DIR, max_bytes: int = VARIANT_CACHE_BYTES, workers: int = VARIANT_WORKERS,
+                 static_dir: str = STATIC_DIR):
+        self.directory = directory
+        # URL path of the directory under /static; None when it is outside the mount and cannot be served
+        relative = os.path.relpath(os.path.abspath(directory), os.path.abspath(static_dir))
+        self.url_prefix = None if relative == os.pardir or relative.startswith(os.pardir + os.sep) else "/static/" + relative.replace(os.sep, "/")
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.executor = None
+        self.pending = set()
+        # Photos that could not be rendered are not retried on every page view
+        self.broken = set()
+        self.lock = threading.Lock()
+        self.rendered = 0
+        self.failed = 0
+        self.evicted = 0
+
+    def variant_path(self, key: str, variant: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{key}-{variant}.{extension}")
+
+    def url(self, photo_path: Optional[str], variant: str = "thumb", extension: str = "jpg") -> str:
+        if not photo_path:
+            return DEFAULT_IMAGE_URL
+        if variant not in VARIANTS or extension not in VARIANT_FORMATS:
+            raise ValueError(f"Unknown photo variant: {variant}.{extension}")
+        if self.url_prefix is None:
+            return original_url(photo_path)
+        key = photo_key(photo_path)
+        if os.path.exists(self.variant_path(key, variant, extension)):
+            return f"{self.url_prefix}/{key}-{variant}.{extension}"
+        self.schedule(photo_path)
+        return original_url(photo_path)
+
+    def schedule(self, photo_path: str) -> None:
+        # Workers are started lazily, so importing the app starts no processes
+        if not self.workers:
+            return
+        key = photo_key(photo_path)
+        with self.lock:
+            if key in self.pending or key in self.broken:
+                return
+            self.pending.add(key)
+            if self.executor is None:
+                os.makedirs(self.directory, exist_ok=True)
+                # Spawned, not forked: the server already runs threads (log writer, password
+                # hashing, profiler) whose held locks a forked child would inherit
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        future = self.executor.submit(render_variants, photo_path, self.directory, key)
+        future.add_done_callback(lambda f: self.finished(key, f))
+
+    def finished(self, key: str, future) -> None:
+        with self.lock:
+            self.pending.discard(key)
+            if future.exception() is not None:
+                self.broken.add(key)
+                self.failed += 1
+                return
+            self.rendered += 1
+        self.enforce_limit()
+
+    def enforce_limit(self) -> None:
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith(".tmp")]
+        except FileNotFoundError:
+            return
+        sizes = {entry.path: entry.stat() for entry in entries}
+        total = sum(stat.st_size for stat in sizes.values())
+        for path in sorted(sizes, key=lambda p: sizes[p].st_mtime):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= sizes[path].st_size
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        return {"pending": len(self.pending), "rendered": self.rendered, "failed": self.failed, "evicted": self.evicted}
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+photo_variants = PhotoVariantCache()
+
+
+def photo_url(photo_path: Optional[str], variant: str = "thumb", extension: str = "jpg") -> str:
+    return photo_variants.url(photo_path, variant, extension)
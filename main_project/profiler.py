@@ -0,0 +1,104 @@
+# Sampling profiler for slow requests
+#
+# With PROFILE_SLOW_MS set, a background thread samples the Python stacks of
+# all threads every PROFILE_INTERVAL_MS while requests are in flight. When a
+# request takes longer than the threshold, the samples taken during it are
+# written to PROFILE_DIR in the folded format read by flamegraph.pl and
+# speedscope. Requests served at the same time share the event loop thread,
+# so a profile can contain their stacks too.
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Samples kept for requests in progress; about a minute at the default interval
+PROFILE_MAX_SAMPLES = int(os.getenv("PROFILE_MAX_SAMPLES", "50000"))
+# Threads parked in these modules are idle, not working for a request
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+
+
+def frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def folded_stack(thread_name: str, frame) -> str:
+    if frame.f_code.co_filename.endswith(IDLE_MODULES):
+        return None
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms: float = PROFILE_SLOW_MS, interval_ms: float = PROFILE_INTERVAL_MS,
+                 directory: str = PROFILE_DIR, max_samples: int = PROFILE_MAX_SAMPLES):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.samples = deque(maxlen=max_samples)
+        self.active = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.written = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def start(self) -> float:
+        # The sampler thread is started on first use, so importing the app never spawns it
+        with self.lock:
+            self.active += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="slow-request-profiler", daemon=True)
+                self.thread.start()
+            self.wakeup.set()
+        return time.perf_counter()
+
+    def finish(self, started: float, label: str, elapsed: float) -> str:
+        with self.lock:
+            self.active -= 1
+            if not self.active:
+                self.wakeup.clear()
+        if elapsed < self.threshold:
+            return None
+        stacks = Counter(stack for taken, stack in list(self.samples) if taken >= started)
+        if not stacks:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms-{re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')}.folded"
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+        self.written += 1
+        return path
+
+    def run(self) -> None:
+        own_id = threading.get_ident()
+        while True:
+            self.wakeup.wait()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = folded_stack(names.get(thread_id, str(thread_id)), frame)
+                if stack is not None:
+                    self.samples.append((now, stack))
+            time.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {"threshold_ms": self.threshold * 1000, "samples": len(self.samples), "profiles_written": self.written}
+
+
+slow_request_profiler = SlowRequestProfiler()
@@ -1,6 +1,7 @@
 # Pydantic Models
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, ConfigDict
 from pydantic import field_validator
+from typing import Dict, List, Optional, Union
 
 class UserLogin(BaseModel):
     email: str
@@ -35,3 +36,40 @@ class UserCreate(BaseModel):
         if 'password' in values and v != values['password']:
             raise ValueError("Passwords do not match.")
         return v
+
+
+class PartOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    part_name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    currency: Optional[str] = None
+    stock_quantity: Optional[int] = None
+    part_number: Optional[str] = None
+    manufacturer: Optional[str] = None
+    part_parameters_id: Optional[int] = None
+    photo_path: Optional[str] = None
+
+class CatalogPage(BaseModel):
+    items: List[PartOut]
+    next_cursor: Optional[str] = None
+
+class CartSummary(BaseModel):
+    item_count: int = 0
+    line_count: int = 0
+    total_price: float = 0.0
+
+class SearchPage(BaseModel):
+    items: List[PartOut]
+    next_offset: Optional[int] = None
+
+class FacetCount(BaseModel):
+    value: Optional[Union[int, str]] = None
+    count: int
+
+class FitmentPage(BaseModel):
+    items: List[PartOut]
+    next_cursor: Optional[str] = None
+    facets: Dict[str, List[FacetCount]]
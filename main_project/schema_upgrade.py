@@ -0,0 +1,90 @@
+# Schema upgrades for existing databases
+#
+# create_all only creates missing tables; it never adds indexes or constraints
+# to tables that already exist. The cart upserts (ON CONFLICT (user_id) and
+# ON CONFLICT (cart_id, part_id)) and the bulk import (ON CONFLICT
+# (part_number)) need unique indexes, and the keyset/fitment queries want
+# their composite indexes, so they are added here. Duplicate carts and cart
+# rows that would block a unique index are merged first; duplicate part
+# numbers are not guessed at and stop the upgrade instead.
+
+from sqlalchemy import inspect, text
+
+import db_models  # noqa: F401  registers the tables on Base.metadata
+from database import Base
+
+# (table, columns) -> index created when no unique constraint or index covers the columns
+UNIQUE_KEYS = {
+    ("carts", ("user_id",)): "uq_carts_user_id",
+    ("cart_items", ("cart_id", "part_id")): "uq_cart_items_cart_part",
+    ("parts", ("part_number",)): "uq_parts_part_number",
+}
+
+MERGE_DUPLICATE_CARTS = [
+    # Items of a user's extra carts move to the user's oldest cart
+    """UPDATE cart_items SET cart_id = (
+           SELECT MIN(keep.id) FROM carts keep
+           WHERE keep.user_id = (SELECT dup.user_id FROM carts dup WHERE dup.id = cart_items.cart_id))
+       WHERE cart_id NOT IN (SELECT MIN(id) FROM carts GROUP BY user_id)""",
+    "DELETE FROM carts WHERE id NOT IN (SELECT MIN(id) FROM carts GROUP BY user_id)",
+]
+
+MERGE_DUPLICATE_CART_ITEMS = [
+    # One row per part in a cart, holding the summed quantity
+    """UPDATE cart_items SET quantity = (
+           SELECT SUM(COALESCE(other.quantity, 1)) FROM cart_items other
+           WHERE other.cart_id = cart_items.cart_id AND other.part_id = cart_items.part_id)
+       WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY cart_id, part_id HAVING COUNT(*) > 1)""",
+    "DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY cart_id, part_id)",
+]
+
+MERGE_DUPLICATES = {
+    # Merging carts can leave two rows for the same part in one cart
+    "uq_carts_user_id": MERGE_DUPLICATE_CARTS + MERGE_DUPLICATE_CART_ITEMS,
+    "uq_cart_items_cart_part": MERGE_DUPLICATE_CART_ITEMS,
+}
+
+
+def unique_column_sets(inspector, table: str) -> set:
+    constraints = [tuple(constraint["column_names"]) for constraint in inspector.get_unique_constraints(table)]
+    indexes = [tuple(index["column_names"]) for index in inspector.get_indexes(table) if index.get("unique")]
+    return set(constraints + indexes)
+
+
+def missing_unique_keys(connection) -> list:
+    # (table, columns, index name) the upserts need but an existing table lacks
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    return [
+        (table, columns, name) for (table, columns), name in UNIQUE_KEYS.items()
+        if table in tables and columns not in unique_column_sets(inspector, table)
+    ]
+
+
+def upgrade_schema(connection) -> list:
+    # Idempotent; takes a sync Connection inside a transaction, returns what it created
+    created = []
+    for table, columns, name in missing_unique_keys(connection):
+        for statement in MERGE_DUPLICATES.get(name, []):
+            connection.execute(text(statement))
+        if name == "uq_parts_part_number":
+            duplicates = connection.execute(text(
+                "SELECT part_number FROM parts WHERE part_number IS NOT NULL GROUP BY part_number HAVING COUNT(*) > 1 LIMIT 10"
+            )).scalars().all()
+            if duplicates:
+                raise RuntimeError(f"Cannot add {name}: duplicate part numbers {', '.join(duplicates)}; merge or renumber those parts first")
+        connection.execute(text(f"CREATE UNIQUE INDEX {name} ON {table} ({', '.join(columns)})"))
+        created.append(name)
+
+    # Plain indexes from the models, e.g. the keyset and fitment ones
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if not index.unique and index.name not in existing:
+                index.create(connection)
+                created.append(index.name)
+    return created
@@ -0,0 +1,97 @@
+# Full-text part search: a GIN tsvector index on PostgreSQL, an FTS5 table on SQLite
+#
+# Both indexes are maintained by the database itself (an expression index on
+# PostgreSQL, triggers on SQLite), so every write path, crud helpers and bulk
+# statements alike, keeps them in sync.
+
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import select, text, func, or_, literal_column, table, column
+from sqlalchemy.ext.asyncio import AsyncSession
+from db_models import Part
+
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Part name and number weigh most, then manufacturer, then the description
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(part_name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(part_number, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(manufacturer, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_parts_search ON parts USING GIN (({SEARCH_VECTOR_SQL}))",
+]
+
+SQLITE_FTS_COLUMNS = "part_name, description, manufacturer, part_number"
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS parts_fts USING fts5({SQLITE_FTS_COLUMNS}, content='parts', content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS parts_fts_insert AFTER INSERT ON parts BEGIN
+        INSERT INTO parts_fts(rowid, {SQLITE_FTS_COLUMNS}) VALUES (new.id, new.part_name, new.description, new.manufacturer, new.part_number);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS parts_fts_delete AFTER DELETE ON parts BEGIN
+        INSERT INTO parts_fts(parts_fts, rowid, {SQLITE_FTS_COLUMNS}) VALUES ('delete', old.id, old.part_name, old.description, old.manufacturer, old.part_number);
+    END""",
+    # Only the searchable columns; stock updates from the cart must not reindex the row
+    f"""CREATE TRIGGER IF NOT EXISTS parts_fts_update AFTER UPDATE OF {SQLITE_FTS_COLUMNS} ON parts BEGIN
+        INSERT INTO parts_fts(parts_fts, rowid, {SQLITE_FTS_COLUMNS}) VALUES ('delete', old.id, old.part_name, old.description, old.manufacturer, old.part_number);
+        INSERT INTO parts_fts(rowid, {SQLITE_FTS_COLUMNS}) VALUES (new.id, new.part_name, new.description, new.manufacturer, new.part_number);
+    END""",
+]
+
+
+def ensure_search_index(connection) -> None:
+    # Idempotent; takes a sync Connection, e.g. from engine.begin() or AsyncConnection.run_sync
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+    elif dialect == "sqlite":
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'parts_fts'")).first()
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            # Index the rows that were there before the FTS table
+            connection.execute(text("INSERT INTO parts_fts(parts_fts) VALUES ('rebuild')"))
+
+
+def fts5_query(query: str) -> str:
+    # Quote every word so user input cannot use FTS5 syntax; a trailing * matches prefixes
+    words = re.findall(r"\w+", query)
+    return " ".join('"' + word + '"*' for word in words)
+
+
+def search_statement(dialect: str, query: str):
+    if dialect == "postgresql":
+        vector = literal_column(SEARCH_VECTOR_SQL)
+        tsquery = func.websearch_to_tsquery("simple", query)
+        return select(Part).where(vector.op("@@")(tsquery)).order_by(func.ts_rank(vector, tsquery).desc(), Part.id)
+    if dialect == "sqlite":
+        parts_fts = table("parts_fts", column("rowid"))
+        return (
+            select(Part)
+            .join(parts_fts, parts_fts.c.rowid == Part.id)
+            .where(text("parts_fts MATCH :match").bindparams(match=fts5_query(query)))
+            # bm25 is lower for better matches; weights follow the FTS column order
+            .order_by(text("bm25(parts_fts, 10.0, 1.0, 5.0, 10.0)"), Part.id)
+        )
+    # No full-text index on other backends: a plain scan keeps search working
+    pattern = f"%{query}%"
+    return select(Part).where(or_(
+        Part.part_name.ilike(pattern), Part.description.ilike(pattern),
+        Part.manufacturer.ilike(pattern), Part.part_number.ilike(pattern),
+    )).order_by(Part.id)
+
+
+async def search_parts(db: AsyncSession, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[Part], Optional[int]]:
+    # Returns one page of ranked matches and the offset of the next page, if any
+    query = query.strip()
+    if not query or (db.get_bind().dialect.name == "sqlite" and not fts5_query(query)):
+        return [], None
+    limit = min(max(limit, 1), MAX_SEARCH_PAGE_SIZE)
+    statement = search_statement(db.get_bind().dialect.name, query).limit(limit + 1).offset(max(offset, 0))
+    parts = (await db.execute(statement)).scalars().all()
+    if len(parts) > limit:
+        return parts[:limit], offset + limit
+    return parts, None
@@ -0,0 +1,119 @@
+# Production server entry point
+#
+#   python server.py --workers 4
+#
+# Runs main:app under uvicorn with several worker processes. The workers are
+# spawned, not forked, and import the app themselves, so each builds its own
+# database pools in the lifespan; the schema step runs once in the supervisor
+# before they start. A dead worker is replaced by the supervisor.
+# uvloop and httptools are used when installed. On SIGTERM/SIGINT the
+# workers stop accepting connections and let in-flight requests finish for up
+# to --graceful-timeout seconds, then the lifespan closes the pools.
+#
+# Every option can also be set through the environment variable in brackets.
+# With several workers, catalog cache invalidations have to reach all of them:
+# unless CATALOG_CACHE_CHANNEL is set, the workers share a version file in the
+# temp directory.
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import tempfile
+
+import uvicorn
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def default_workers() -> int:
+    # One per core; async workers gain nothing from more, and every worker holds its own DB pool
+    return env_int("WEB_CONCURRENCY", os.cpu_count() or 1)
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the shop with several worker processes")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"), help="[HOST]")
+    parser.add_argument("--port", type=int, default=env_int("PORT", 8000), help="[PORT]")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="[WEB_CONCURRENCY] default: CPU count")
+    parser.add_argument("--backlog", type=int, default=env_int("BACKLOG", 2048),
+                        help="[BACKLOG] pending connections the kernel queues; capped by net.core.somaxconn")
+    parser.add_argument("--keep-alive", type=int, default=env_int("KEEP_ALIVE", 15),
+                        help="[KEEP_ALIVE] seconds an idle connection stays open; keep above the load balancer's idle timeout")
+    parser.add_argument("--graceful-timeout", type=int, default=env_int("GRACEFUL_TIMEOUT", 30),
+                        help="[GRACEFUL_TIMEOUT] seconds in-flight requests get on shutdown")
+    parser.add_argument("--limit-concurrency", type=int, default=env_int("LIMIT_CONCURRENCY", 0),
+                        help="[LIMIT_CONCURRENCY] per worker; beyond it requests get 503, 0 is unlimited")
+    parser.add_argument("--max-requests", type=int, default=env_int("MAX_REQUESTS", 0),
+                        help="[MAX_REQUESTS] restart a worker after this many requests, 0 never")
+    parser.add_argument("--forwarded-allow-ips", default=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+                        help="[FORWARDED_ALLOW_IPS] proxies trusted for X-Forwarded-* headers")
+    parser.add_argument("--access-log", action="store_true", default=os.getenv("ACCESS_LOG", "") == "1",
+                        help="[ACCESS_LOG=1] per-request log lines; /metrics already counts requests")
+    return parser.parse_args(argv)
+
+
+def server_options(args: argparse.Namespace) -> dict:
+    return {
+        "host": args.host,
+        "port": args.port,
+        "workers": args.workers,
+        "loop": event_loop(),
+        "http": http_protocol(),
+        "backlog": args.backlog,
+        "timeout_keep_alive": args.keep_alive,
+        "timeout_graceful_shutdown": args.graceful_timeout,
+        "limit_concurrency": args.limit_concurrency or None,
+        "limit_max_requests": args.max_requests or None,
+        "proxy_headers": True,
+        "forwarded_allow_ips": args.forwarded_allow_ips,
+        "access_log": args.access_log,
+        "server_header": False,
+        "log_level": os.getenv("LOG_LEVEL", "info").lower(),
+    }
+
+
+def prepare_schema() -> None:
+    # Runs once in the supervisor, so workers do not race each other creating tables
+    from database import DB_SCHEMA, check_schema, engines
+
+    async def prepare():
+        await check_schema(DB_SCHEMA)
+        await engines.dispose()
+
+    asyncio.run(prepare())
+    os.environ["DB_SCHEMA"] = "skip"
+
+
+def share_catalog_cache(workers: int) -> None:
+    # The default channel only reaches its own process, so other workers would keep
+    # serving the catalog as it was before a write until they restart
+    if workers > 1 and not os.getenv("CATALOG_CACHE_CHANNEL"):
+        os.environ["CATALOG_CACHE_CHANNEL"] = "file:" + os.path.join(tempfile.gettempdir(), "catalog.version")
+
+
+def main(argv=None) -> None:
+    options = server_options(parse_args(argv))
+    # Templates and static files are looked up relative to the app directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if options["workers"] > 1:
+        # Set before the workers are spawned, they inherit the environment
+        share_catalog_cache(options["workers"])
+        prepare_schema()
+    # The app is passed by import string so that every worker imports it itself
+    uvicorn.run("main:app", app_dir=".", **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Worker startup and shutdown, run from the app's lifespan
+#
+# Importing the app has no side effects: logging, directories, static asset
+# fingerprints, database engines, the schema check and pool warm-up all happen
+# here, once per worker process and after any fork. Each phase is timed; the
+# timings are logged and exported at /metrics as worker_startup_seconds.
+
+import asyncio
+import logging
+import os
+import time
+
+from app_logging import setup_logging, shutdown_logging
+from database import engines, check_schema, warm_up, DB_SCHEMA, DB_WARMUP_CONNECTIONS
+from photo_store import UPLOAD_DIR
+from photo_variants import photo_variants
+from static_assets import fingerprint_static
+
+logger = logging.getLogger(__name__)
+
+
+async def start_worker(import_seconds: float) -> dict:
+    timings = {"import": round(import_seconds, 4)}
+    start = phase_start = time.perf_counter()
+
+    def done(phase: str) -> None:
+        nonlocal phase_start
+        now = time.perf_counter()
+        timings[phase] = round(now - phase_start, 4)
+        phase_start = now
+
+    setup_logging()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    done("setup")
+    # Asset fingerprints for static_url, computed before templates ask for them
+    await asyncio.to_thread(fingerprint_static)
+    done("static")
+    # Built now rather than by the first request
+    engines.engine
+    engines.async_engine
+    engines.replica_engines
+    done("engines")
+    missing = await check_schema(DB_SCHEMA)
+    done("schema")
+    await warm_up(DB_WARMUP_CONNECTIONS)
+    done("warmup")
+    timings["total"] = round(import_seconds + time.perf_counter() - start, 4)
+    logger.info("Worker ready", extra={"pid": os.getpid(), "startup_seconds": timings, "created_tables": missing if DB_SCHEMA == "create" else []})
+    return timings
+
+
+async def stop_worker() -> None:
+    photo_variants.shutdown()
+    await engines.dispose()
+    shutdown_logging()
@@ -0,0 +1,219 @@
+# Cache-friendly static file serving
+#
+# static_url("css/site.css") gives /static/css/site.<hash>.css. Fingerprinted
+# URLs and content-addressed files (photo uploads and their variants, named by
+# sha256) never change, so they are sent with a year-long immutable
+# Cache-Control and browsers stop asking for them. Everything else is
+# revalidated against a strong content ETag. Precompressed .br/.gz siblings are
+# served when the client accepts them, and single byte ranges are honoured.
+#
+#   python static_assets.py static   # write .gz (and .br with brotli installed) next to text assets
+
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+from functools import lru_cache
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.staticfiles import StaticFiles
+
+from compression import accepted_encodings
+from conditional import if_none_match
+
+STATIC_DIR = "static"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+FINGERPRINT_LENGTH = 12
+# name.<fingerprint>.ext as produced by static_url
+FINGERPRINTED = re.compile(r"^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % FINGERPRINT_LENGTH)
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}")
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE = {".css", ".js", ".svg", ".html", ".json", ".txt", ".map", ".xml"}
+RANGE_CHUNK_SIZE = 64 * 1024
+# Files whose digests are kept; fingerprint_static stops warming at this many
+DIGEST_CACHE_SIZE = 16384
+
+
+@lru_cache(maxsize=DIGEST_CACHE_SIZE)
+def _digest(path: str, mtime_ns: int, size: int) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(RANGE_CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def file_digest(path: str, stat_result: Optional[os.stat_result] = None) -> str:
+    # Cached per (path, mtime, size), a file is only hashed again after it changes; the
+    # absolute path makes static_url and the static mount share one entry per file
+    stat_result = stat_result or os.stat(path)
+    return _digest(os.path.abspath(path), stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def fingerprint_static(directory: str = STATIC_DIR) -> int:
+    # Hashes every file that is not content-addressed, so neither static_url in templates nor
+    # the first request for a file hashes it on the event loop; run it in a thread at startup
+    hashed = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if CONTENT_ADDRESSED.match(name) or name.endswith((".br", ".gz")):
+                continue
+            if hashed >= DIGEST_CACHE_SIZE:
+                return hashed
+            try:
+                file_digest(os.path.join(root, name))
+            except OSError:
+                continue
+            hashed += 1
+    return hashed
+
+
+def static_url(path: str, directory: str = STATIC_DIR) -> str:
+    if CONTENT_ADDRESSED.match(os.path.basename(path)):
+        return f"/static/{path}"
+    try:
+        fingerprint = file_digest(os.path.join(directory, path))[:FINGERPRINT_LENGTH]
+    except FileNotFoundError:
+        return f"/static/{path}"
+    stem, ext = os.path.splitext(path)
+    return f"/static/{stem}.{fingerprint}{ext}"
+
+
+def parse_range(header: str, size: int) -> Optional[tuple]:
+    # A single "bytes=start-end" range as (start, end inclusive); None when unsatisfiable
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    start, end = match.groups()
+    if start == "":
+        length = int(end)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start, end = int(start), int(end) if end else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def is_fresh_sibling(path: str, original: os.stat_result) -> bool:
+    # A precompressed copy older than its source is ignored until regenerated
+    try:
+        return os.stat(path).st_mtime_ns >= original.st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+class CachedStaticFiles(StaticFiles):
+    def lookup_path(self, path: str):
+        full_path, stat_result = super().lookup_path(path)
+        match = FINGERPRINTED.match(os.path.basename(path))
+        if stat_result is None and match:
+            full_path, stat_result = super().lookup_path(os.path.join(os.path.dirname(path), match["stem"] + match["ext"]))
+        # Runs in a worker thread, so a file new since startup is hashed here rather than in file_response
+        if stat_result is not None and stat.S_ISREG(stat_result.st_mode) and not CONTENT_ADDRESSED.match(os.path.basename(full_path)):
+            file_digest(str(full_path), stat_result)
+        return full_path, stat_result
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        full_path = str(full_path)
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(self.get_path(scope))
+        match = FINGERPRINTED.match(name)
+        # Content-addressed names already identify their bytes, large photos are never hashed here
+        digest = hashlib.sha256(name.encode()).hexdigest() if CONTENT_ADDRESSED.match(name) else file_digest(full_path, stat_result)
+        # A stale fingerprint still gets the current file, just not as immutable
+        immutable = bool(CONTENT_ADDRESSED.match(name) or (match and digest.startswith(match["fingerprint"])))
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        compressible = os.path.splitext(full_path)[1] in COMPRESSIBLE
+        headers = {"Cache-Control": IMMUTABLE if immutable else REVALIDATE, "Accept-Ranges": "bytes"}
+        if compressible:
+            headers["Vary"] = "Accept-Encoding"
+
+        # Ranges always address the identity representation
+        range_header = request_headers.get("range")
+        encoding, path, etag_suffix = None, full_path, ""
+        if compressible and range_header is None:
+            accepted = accepted_encodings(request_headers)
+            for candidate, suffix in PRECOMPRESSED:
+                if candidate in accepted and is_fresh_sibling(full_path + suffix, stat_result):
+                    encoding, path, etag_suffix = candidate, full_path + suffix, "-" + suffix[1:]
+                    break
+        # Strong validator: the content hash, per representation
+        headers["ETag"] = f'"{digest[:32]}{etag_suffix}"'
+
+        if if_none_match(request_headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        # Multiple ranges and a stale If-Range fall back to the full file
+        if range_header and "," not in range_header and request_headers.get("if-range", headers["ETag"]) == headers["ETag"]:
+            size = stat_result.st_size
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(read_range(path, start, end), status_code=206, headers=headers, media_type=media_type)
+
+        response = FileResponse(path, status_code=status_code, headers=headers, media_type=media_type,
+                                stat_result=None if encoding else stat_result)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+
+async def read_range(path: str, start: int, end: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            chunk = await f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def precompress(directory: str) -> int:
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1] not in COMPRESSIBLE:
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            outputs = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                outputs.append((".br", brotli.compress(data, quality=11)))
+            for suffix, compressed in outputs:
+                # Not worth a sibling if it barely shrinks
+                if len(compressed) < len(data) * 0.9:
+                    with open(path + suffix, "wb") as f:
+                        f.write(compressed)
+                    written += 1
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompress static text assets")
+    parser.add_argument("directory", nargs="?", default=STATIC_DIR)
+    args = parser.parse_args()
+    print(f"Wrote {precompress(args.directory)} precompressed files in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
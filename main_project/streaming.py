@@ -0,0 +1,130 @@
+# Streamed template rendering
+#
+# stream_template() renders with Jinja2's generate_async() into a
+# StreamingResponse. The template runs in its own task and hands chunks over a
+# queue, so whatever is rendered before a database round trip (the page
+# header, the rows so far) is sent while the query runs. Rendered text is
+# otherwise coalesced into chunks of STREAM_CHUNK_SIZE. The queue is bounded, so
+# with a slow client the template waits instead of buffering the whole page,
+# and a client that disconnects stops the rendering task.
+#
+# Context values that are Spliced are async iterables of HTML, written in place
+# of {{ name }} batch by batch. Values with a before_fetch attribute (such as
+# catalog.CatalogPageStream) get a hook that flushes the response before they
+# query the database.
+
+import asyncio
+import uuid
+from contextlib import aclosing
+from functools import lru_cache
+
+from starlette.responses import StreamingResponse
+
+STREAM_CHUNK_SIZE = 16 * 1024
+# Rendered pieces the template may run ahead of the client
+STREAM_QUEUE_SIZE = 8
+_FLUSH = object()
+_DONE = object()
+
+
+class Spliced:
+    # Base for async iterables of HTML strings written in place of their variable
+    def __aiter__(self):
+        raise NotImplementedError
+
+
+class Deferred:
+    # A template value only known after the streamed parts were rendered, e.g. next_cursor
+    def __init__(self, resolve):
+        self.resolve = resolve
+
+    def __str__(self) -> str:
+        value = self.resolve()
+        return "" if value is None else str(value)
+
+    def __html__(self) -> str:
+        return str(self)
+
+    def __bool__(self) -> bool:
+        return bool(self.resolve())
+
+
+@lru_cache(maxsize=8)
+def async_environment(env):
+    # Same loader, filters and globals, with async rendering
+    return env.overlay(enable_async=True)
+
+
+async def render_chunks(template, context: dict, chunk_size: int = STREAM_CHUNK_SIZE, queue_size: int = STREAM_QUEUE_SIZE):
+    queue = asyncio.Queue(maxsize=queue_size)
+    render_context, spliced = dict(context), {}
+    for key, value in context.items():
+        if isinstance(value, Spliced):
+            marker = f"splice-{uuid.uuid4().hex}"
+            spliced[marker] = value
+            render_context[key] = marker
+        elif hasattr(value, "before_fetch"):
+            value.before_fetch = lambda: queue.put(_FLUSH)
+
+    async def produce():
+        try:
+            async for chunk in template.generate_async(render_context):
+                for marker, stream in spliced.items():
+                    if marker in chunk:
+                        before, _, chunk = chunk.partition(marker)
+                        await queue.put(before)
+                        await queue.put(_FLUSH)
+                        async for html in stream:
+                            await queue.put(html)
+                            await queue.put(_FLUSH)
+                await queue.put(chunk)
+            await queue.put(_DONE)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(produce())
+    try:
+        buffer, size = [], 0
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if item is not _FLUSH:
+                buffer.append(item)
+                size += len(item)
+            if buffer and (item is _FLUSH or size >= chunk_size):
+                yield "".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        task.cancel()
+
+
+def stream_template(templates, name: str, context: dict, db=None) -> StreamingResponse:
+    # db is the request's session: dependency cleanup has already closed it once
+    # streaming starts, the rows read while rendering reopen it and it is closed again here
+    template = async_environment(templates.env).get_template(name)
+
+    async def body():
+        try:
+            async with aclosing(render_chunks(template, context)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            if db is not None:
+                await db.close()
+
+    return ClosingStreamingResponse(body(), media_type="text/html")
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    # Starlette cancels the send loop on disconnect but leaves the body generator
+    # open until garbage collection; closing it stops the render task and frees the session
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
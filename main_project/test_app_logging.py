@@ -0,0 +1,100 @@
+import io
+import json
+import logging
+import queue
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app_logging import JSONFormatter, NonBlockingQueueHandler, RequestContextFilter, RequestIdMiddleware, correlation_id, setup_logging, shutdown_logging, state
+from main import app
+
+
+def build_logger(max_size: int = 100):
+    handler = NonBlockingQueueHandler(queue.SimpleQueue(), max_size)
+    handler.addFilter(RequestContextFilter())
+    logger = logging.getLogger(f"test_app_logging.{max_size}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = [handler]
+    return logger, handler
+
+
+def test_records_are_queued_with_correlation_id_and_formatted_as_json():
+    logger, handler = build_logger()
+    token = correlation_id.set("req-1")
+    try:
+        logger.info("Login failed", extra={"username": "alice"})
+    finally:
+        correlation_id.reset(token)
+
+    entry = json.loads(JSONFormatter().format(handler.queue.get_nowait()))
+    assert entry["message"] == "Login failed"
+    assert entry["level"] == "INFO"
+    assert entry["correlation_id"] == "req-1"
+    assert entry["username"] == "alice"
+
+
+def test_full_queue_drops_instead_of_blocking():
+    logger, handler = build_logger(max_size=2)
+    for i in range(5):
+        logger.info("event %d", i)
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_sampled_events():
+    logger, handler = build_logger()
+    for _ in range(50):
+        logger.debug("dropped", extra={"sample_rate": 0.0})
+        logger.debug("kept", extra={"sample_rate": 1.0})
+    assert handler.queue.qsize() == 50
+
+
+def test_exception_is_rendered_before_queueing():
+    logger, handler = build_logger()
+    try:
+        raise ValueError("broken")
+    except ValueError:
+        logger.exception("Import failed")
+    record = handler.queue.get_nowait()
+    assert record.exc_info is None
+    assert "ValueError: broken" in json.loads(JSONFormatter().format(record))["exception"]
+
+
+def test_request_id_is_propagated_and_echoed():
+    seen = []
+    test_app = FastAPI()
+    test_app.add_middleware(RequestIdMiddleware)
+
+    @test_app.get("/")
+    async def index() -> dict:
+        seen.append(correlation_id.get())
+        return {}
+
+    client = TestClient(test_app)
+    response = client.get("/", headers={"X-Request-ID": "abc-123"})
+    assert response.headers["X-Request-ID"] == "abc-123" == seen[-1]
+    # Unsafe client values are replaced
+    response = client.get("/", headers={"X-Request-ID": "a b\"c"})
+    assert response.headers["X-Request-ID"] == seen[-1] != "a b\"c"
+    assert len(seen[-1]) == 32
+
+
+def test_authenticated_routes_do_not_write_to_stdout(capsys):
+    client = TestClient(app)
+    client.cookies.set("access_token", "not-a-token")
+    client.get("/cart")
+    assert capsys.readouterr().out == ""
+
+
+def test_setup_leaves_logging_module_flags_alone_unless_asked():
+    before = logging._srcfile
+    shutdown_logging()
+    setup_logging(stream=io.StringIO())
+    assert logging._srcfile == before and logging.logThreads
+    shutdown_logging()
+
+    setup_logging(stream=io.StringIO(), lean_records=True)
+    assert logging._srcfile is None and not logging.logThreads
+    shutdown_logging()
+    assert logging._srcfile == before and logging.logThreads
+    assert state.listener is None
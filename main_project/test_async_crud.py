@@ -0,0 +1,89 @@
+import asyncio
+import uuid
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db_models import Part, CarParameter, Cart, CartItem, User
+from database import Base
+from async_crud import add_part_to_db, add_part_parameters_to_db, remove_part_from_db, get_or_create_cart, get_cart_summary
+
+@pytest.fixture(scope="module")
+def run(tmp_path_factory):
+    # A fresh database per run, so rows written by earlier runs cannot leak into the assertions
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('async_crud')}/test.db")
+    TestingAsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    asyncio.run(create_tables())
+
+    def run_with_session(test):
+        async def wrapper():
+            async with TestingAsyncSessionLocal() as db:
+                return await test(db)
+        return asyncio.run(wrapper())
+    yield run_with_session
+    asyncio.run(engine.dispose())
+
+
+def test_async_add_part_to_db(run):
+    async def test(db):
+        await add_part_to_db(db, name="AsyncPart1", description="Test Part", price=100.0, currency="USD", stock_quantity=10)
+        part = (await db.execute(select(Part).filter_by(part_name="AsyncPart1"))).scalars().first()
+        assert part is not None
+        assert part.price == 100.0
+    run(test)
+
+
+def test_async_add_part_parameters_to_db(run):
+    async def test(db):
+        await add_part_parameters_to_db(db, car_name="Async Car", manufacturer="Test Maker", year=2022, engine_type="V8")
+        param = (await db.execute(select(CarParameter).filter_by(car_name="Async Car"))).scalars().first()
+        assert param is not None
+        assert param.engine_type == "V8"
+    run(test)
+
+
+def test_async_remove_part_from_db(run):
+    async def test(db):
+        part = Part(part_name="AsyncPartToRemove", description="Remove This", price=50.0, currency="USD", stock_quantity=5)
+        db.add(part)
+        await db.commit()
+
+        await remove_part_from_db(db, part_id=part.id)
+        assert await db.get(Part, part.id) is None
+    run(test)
+
+
+def test_async_get_or_create_cart(run):
+    async def test(db):
+        cart = await get_or_create_cart(db, user_id=4242)
+        assert cart.items == []
+        again = await get_or_create_cart(db, user_id=4242)
+        assert again.id == cart.id
+        carts = (await db.execute(select(Cart).filter_by(user_id=4242))).scalars().all()
+        assert len(carts) == 1
+    run(test)
+
+
+def test_async_get_cart_summary(run):
+    async def test(db):
+        user = User(username="summary", email=f"summary-{uuid.uuid4().hex}@example.com")
+        db.add(user)
+        await db.flush()
+        summary = await get_cart_summary(db, user_id=user.id)
+        assert (summary.item_count, summary.line_count, summary.total_price) == (0, 0, 0.0)
+        # Reading the summary must not create a cart
+        assert (await db.execute(select(Cart).filter_by(user_id=user.id))).scalars().first() is None
+
+        cart = Cart(user_id=user.id)
+        parts = [Part(part_name="SummaryPart", price=2.5, stock_quantity=1), Part(part_name="SummaryPart", price=10.0, stock_quantity=1)]
+        db.add_all([cart, *parts])
+        await db.flush()
+        db.add_all([CartItem(cart_id=cart.id, part_id=parts[0].id, quantity=2), CartItem(cart_id=cart.id, part_id=parts[1].id, quantity=1)])
+        await db.commit()
+
+        summary = await get_cart_summary(db, user_id=user.id)
+        assert (summary.item_count, summary.line_count, summary.total_price) == (3, 2, 15.0)
+    run(test)
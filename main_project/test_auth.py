@@ -1,10 +1,17 @@
 import pytest
 from fastapi.testclient import TestClient
-from fastapi import status
+from fastapi import Depends, FastAPI, status
 from sqlalchemy.orm import Session
-from unittest.mock import MagicMock
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from unittest.mock import MagicMock, AsyncMock
+import asyncio
+import time
+import async_crud
+from auth import principal_cache, PrincipalCache, PasswordWorkerPool, authenticate_user_async, BCRYPT_ROUNDS
+from fastapi import HTTPException
 from main import app, get_db, authenticate_user, create_access_token, get_current_user
 from db_models import User
+from database import Base, get_async_db
 from jose import jwt
 from datetime import timedelta
 
@@ -75,4 +82,113 @@ def test_create_access_token():
 
 
 
-pytest.main(["-v", "test_auth.py"])
\ No newline at end of file
+# Test the principal cache in get_current_user
+def test_get_current_user_caches_principal(monkeypatch):
+    user = User(id=7, username="cacheduser", hashed_password="hashedpassword")
+    lookup = AsyncMock(return_value=user)
+    monkeypatch.setattr(async_crud, "get_user_by_username", lookup)
+    principal_cache.clear()
+    token = create_access_token({"sub": "cacheduser"})
+
+    assert asyncio.run(get_current_user(token, MagicMock())) is user
+    assert asyncio.run(get_current_user(token, MagicMock())) is user
+    assert lookup.await_count == 1
+
+    # A role change drops the user's cached principals
+    principal_cache.invalidate_user(7)
+    asyncio.run(get_current_user(token, MagicMock()))
+    assert lookup.await_count == 2
+
+def test_principal_cache_expires():
+    cache = PrincipalCache(ttl=30)
+    user = User(id=1, username="testuser")
+    cache.set("token", user, token_expires_at=time.time() - 1)
+    assert cache.get("token") is None
+    assert cache.stats()["misses"] == 1
+
+
+# Test password hashing off the event loop
+def test_password_pool_rejects_when_saturated():
+    pool = PasswordWorkerPool(workers=1, max_pending=0)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(pool.run(hash_password, "testpassword"))
+    assert exc_info.value.status_code == 503
+    assert pool.stats()["rejected"] == 1
+
+def test_authenticate_user_async_rehashes_weaker_hash(monkeypatch):
+    weak_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    user = User(username="testuser", hashed_password=weak_context.hash("testpassword"))
+    monkeypatch.setattr(async_crud, "get_user_by_username", AsyncMock(return_value=user))
+    db = MagicMock()
+    db.commit = AsyncMock()
+
+    assert asyncio.run(authenticate_user_async("testuser", "testpassword", db)) is user
+    assert f"$2b${BCRYPT_ROUNDS:02d}$" in user.hashed_password
+    db.commit.assert_awaited_once()
+
+
+pytest.main(["-v", "test_auth.py"])
+
+def test_cached_principal_survives_a_rollback(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/principal.db")
+    SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def seed():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with SessionLocal() as db:
+            db.add(User(username="rollback", hashed_password="x", role="user"))
+            await db.commit()
+    asyncio.run(seed())
+
+    async def override_get_async_db():
+        async with SessionLocal() as db:
+            yield db
+
+    # Like add_to_cart when the stock runs out: the same request rolls its session back
+    test_app = FastAPI()
+
+    @test_app.get("/fail")
+    async def fail(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)) -> dict:
+        await db.rollback()
+        return {"username": user.username, "role": user.role}
+
+    test_app.dependency_overrides[get_async_db] = override_get_async_db
+    principal_cache.clear()
+    client = TestClient(test_app, cookies={"access_token": create_access_token({"sub": "rollback"})})
+    assert client.get("/fail").json() == {"username": "rollback", "role": "user"}
+    assert client.get("/fail").json() == {"username": "rollback", "role": "user"}
+    assert principal_cache.stats()["hits"] >= 1
+    principal_cache.clear()
+    asyncio.run(engine.dispose())
+
+
+def test_revoked_admin_is_refused_while_still_cached(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/revoked.db")
+    SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def seed():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with SessionLocal() as db:
+            db.add(User(username="former-admin", hashed_password="x", role="user"))
+            await db.commit()
+    asyncio.run(seed())
+
+    async def override_get_async_db():
+        async with SessionLocal() as db:
+            yield db
+
+    # Another worker revoked the role; this worker's cache still holds the admin principal
+    token = create_access_token({"sub": "former-admin"})
+    principal_cache.clear()
+    principal_cache.set(token, User(id=1, username="former-admin", role="admin"), time.time() + 60)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    try:
+        client = TestClient(app, cookies={"access_token": token})
+        assert client.put("/admin/set_role/1", params={"role": "admin"}).status_code == 403
+        assert client.get("/export/parts").status_code == 403
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
+        principal_cache.clear()
+        asyncio.run(engine.dispose())
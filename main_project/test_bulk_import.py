@@ -0,0 +1,94 @@
+import io
+import json
+import pytest
+from sqlalchemy import create_engine, select
+from db_models import Part, CarParameter
+from database import Base
+from bulk_import import import_parts
+from catalog_cache import catalog_cache
+
+CSV_FEED = """part_number,part_name,price,stock_quantity,manufacturer,car_name,car_manufacturer,year,engine_type
+BOS-1,Oil filter,9.5,10,Bosch,Golf,Volkswagen,2015,Diesel
+BOS-2,Air filter,12,5,Bosch,Golf,Volkswagen,2015,Diesel
+BRE-1,Brake pad,-3,1,Brembo,,,,
+,Nameless,1,1,,,,,
+NGK-1,Spark plug,4.2,,NGK,A4,Audi,2018,Petrol
+BOS-1,Oil filter HD,11,7,Bosch,Golf,Volkswagen,2015,Diesel
+"""
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/import.db")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def test_csv_import_batches_upserts_and_rejects(engine):
+    progress = []
+    report = import_parts(engine, io.StringIO(CSV_FEED), "csv", batch_size=2, progress=lambda r: progress.append(r.processed))
+
+    assert report.processed == 6
+    assert report.imported == 4
+    assert report.rejected == 2
+    assert [error["line"] for error in report.errors] == [4, 5]
+    assert report.vehicles_created == 2
+    assert report.batches == 2
+    # One call per batch and a final one once the feed is exhausted
+    assert progress == [2, 6, 6]
+
+    with engine.connect() as connection:
+        parts = {part.part_number: part for part in connection.execute(select(Part))}
+        vehicles = connection.execute(select(CarParameter)).all()
+    assert sorted(parts) == ["BOS-1", "BOS-2", "NGK-1"]
+    # The later row for BOS-1 updated the first one in place
+    assert (parts["BOS-1"].part_name, parts["BOS-1"].stock_quantity) == ("Oil filter HD", 7)
+    assert parts["BOS-1"].part_parameters_id == parts["BOS-2"].part_parameters_id
+    assert parts["NGK-1"].stock_quantity == 0
+    assert len(vehicles) == 2
+
+
+def test_jsonl_reimport_reuses_existing_vehicles(engine):
+    rows = [
+        {"part_number": "MAN-1", "part_name": "Cabin filter", "price": 15, "car_name": "Golf", "car_manufacturer": "Volkswagen", "year": 2015, "engine_type": "Diesel"},
+        {"part_number": "MAN-2", "part_name": "Fuel filter", "price": "abc"},
+    ]
+    feed = "\n".join(json.dumps(row) for row in rows) + "\n{not json\n"
+
+    first = import_parts(engine, io.StringIO(feed), "jsonl")
+    second = import_parts(engine, io.StringIO(feed), "jsonl")
+
+    assert (first.imported, first.rejected, first.vehicles_created) == (1, 2, 1)
+    assert (second.imported, second.rejected, second.vehicles_created) == (1, 2, 0)
+    with engine.connect() as connection:
+        assert len(connection.execute(select(Part)).all()) == 1
+
+
+def test_failed_import_still_invalidates_catalog_cache(engine):
+    def fail_after_first_batch(report):
+        raise RuntimeError("connection lost")
+
+    version = catalog_cache.version
+    with pytest.raises(RuntimeError):
+        import_parts(engine, io.StringIO(CSV_FEED), "csv", batch_size=2, progress=fail_after_first_batch)
+    # The first batch was committed, so cached catalog pages are out of date
+    with engine.connect() as connection:
+        assert connection.execute(select(Part)).all()
+    assert catalog_cache.version != version
+
+
+def test_reimport_with_fewer_fields_keeps_the_rest(engine):
+    full = {"part_number": "VAL-1", "part_name": "Wiper", "description": "Front, 600 mm", "price": 20, "stock_quantity": 8,
+            "manufacturer": "Valeo", "photo_path": "photos/val-1.jpg",
+            "car_name": "Clio", "car_manufacturer": "Renault", "year": 2019, "engine_type": "Petrol"}
+    import_parts(engine, io.StringIO(json.dumps(full) + "\n"), "jsonl")
+    # A price-only feed names the required fields and nothing else
+    report = import_parts(engine, io.StringIO("part_number,part_name,price\nVAL-1,Wiper blade,22\n"), "csv")
+
+    assert report.imported == 1
+    with engine.connect() as connection:
+        part = connection.execute(select(Part)).one()
+    assert (part.part_name, part.price) == ("Wiper blade", 22)
+    assert (part.description, part.manufacturer, part.photo_path, part.stock_quantity) == ("Front, 600 mm", "Valeo", "photos/val-1.jpg", 8)
+    assert part.part_parameters_id is not None
@@ -0,0 +1,79 @@
+import asyncio
+import uuid
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db_models import Part
+from database import Base
+from catalog import get_catalog_page
+
+# A manufacturer of our own keeps these rows apart from other tests' data
+MANUFACTURER = f"Keyset-{uuid.uuid4()}"
+PRICES = [5.0, 1.0, 3.0, 3.0, 2.0, 4.0, 3.0]
+
+
+async def seed(engine, TestingAsyncSessionLocal):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with TestingAsyncSessionLocal() as db:
+        for i, price in enumerate(PRICES):
+            db.add(Part(part_name=f"Keyset{i}", description="d", price=price, currency="EUR", stock_quantity=1, manufacturer=MANUFACTURER))
+        await db.commit()
+
+
+@pytest.fixture(scope="module")
+def run(tmp_path_factory):
+    # A database of its own, so the tracked test.db is left alone
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('catalog')}/test.db")
+    TestingAsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    asyncio.run(seed(engine, TestingAsyncSessionLocal))
+
+    def run_with_session(test):
+        async def wrapper():
+            async with TestingAsyncSessionLocal() as db:
+                return await test(db)
+        return asyncio.run(wrapper())
+    yield run_with_session
+    asyncio.run(engine.dispose())
+
+
+async def walk(db, **filters) -> list:
+    pages, cursor = [], None
+    while True:
+        parts, cursor = await get_catalog_page(db, cursor=cursor, manufacturer=MANUFACTURER, **filters)
+        pages.append(parts)
+        if cursor is None:
+            return pages
+
+
+def test_catalog_pages_by_id(run):
+    async def test(db):
+        pages = await walk(db, limit=3)
+        assert [len(page) for page in pages] == [3, 3, 1]
+        ids = [part.id for page in pages for part in page]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(PRICES)
+    run(test)
+
+
+def test_catalog_pages_by_price_with_ties(run):
+    async def test(db):
+        pages = await walk(db, limit=2, sort="price")
+        parts = [part for page in pages for part in page]
+        assert [part.price for part in parts] == sorted(PRICES)
+        assert len({part.id for part in parts}) == len(PRICES)
+    run(test)
+
+
+def test_catalog_price_range_filter(run):
+    async def test(db):
+        parts, cursor = await get_catalog_page(db, manufacturer=MANUFACTURER, min_price=2.0, max_price=3.0)
+        assert sorted(part.price for part in parts) == [2.0, 3.0, 3.0, 3.0]
+        assert cursor is None
+    run(test)
+
+
+def test_catalog_rejects_bad_cursor(run):
+    async def test(db):
+        with pytest.raises(ValueError):
+            await get_catalog_page(db, cursor="not-a-cursor")
+    run(test)
@@ -0,0 +1,78 @@
+import asyncio
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from crud import add_part_to_db
+from catalog_cache import CatalogCache, FileVersionChannel, catalog_cache
+
+
+def test_cache_hits_misses_and_lru_eviction():
+    cache = CatalogCache(maxsize=2)
+    loads = []
+
+    async def load(key):
+        async def loader():
+            loads.append(key)
+            return key.upper()
+        return await cache.get_or_load(key, loader)
+
+    async def scenario():
+        assert await load("a") == "A"
+        assert await load("a") == "A"
+        await load("b")
+        await load("a")  # "a" is now the most recently used
+        await load("c")  # evicts "b"
+        await load("b")
+
+    asyncio.run(scenario())
+    assert loads == ["a", "b", "c", "b"]
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 4
+    assert stats["evictions"] == 2
+    assert stats["size"] == 2
+
+
+def test_bump_invalidates_entries():
+    cache = CatalogCache()
+    cache.set("parts", [1])
+    assert cache.get("parts") == [1]
+    cache.bump()
+    cache.get("parts")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["size"] == 0
+    assert stats["version"] == 1
+
+
+def test_stock_only_bumps_are_not_catalog_writes():
+    cache = CatalogCache()
+    cache.bump(catalog_write=False)
+    assert (cache.version, cache.catalog_writes) == (1, 0)
+    cache.bump()
+    assert (cache.version, cache.catalog_writes) == (2, 1)
+
+
+def test_file_channel_shares_invalidation_between_workers(tmp_path):
+    path = str(tmp_path / "catalog.version")
+    worker_a = CatalogCache(channel=FileVersionChannel(path, poll_interval=0))
+    worker_b = CatalogCache(channel=FileVersionChannel(path, poll_interval=0))
+    worker_b.set("parts", [1])
+
+    worker_a.bump()
+    assert worker_b.version == 1
+    assert worker_b.stats()["size"] == 0
+    assert worker_b.stats()["invalidations"] == 1
+
+
+def test_crud_writes_bump_catalog_version(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db", connect_args={"check_same_thread": False})
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        before = catalog_cache.version
+        add_part_to_db(db, name="CachedPart", description="Bump", price=1.0, currency="USD", stock_quantity=1)
+        assert catalog_cache.version == before + 1
+    finally:
+        db.close()
@@ -0,0 +1,77 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db_models import Part, CarParameter
+from database import Base
+import catalog_export
+from catalog_export import export_chunks, export_to_file, EXPORT_COLUMNS
+from bulk_import import import_parts
+
+PARTS = 25
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # Small partitions so the export spans several cursor fetches
+    monkeypatch.setattr(catalog_export, "EXPORT_BATCH_SIZE", 4)
+    path = tmp_path / "export.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        vehicle_id = connection.execute(
+            insert(CarParameter).values(car_name="Golf", manufacturer="Volkswagen", year=2015, engine_type="Diesel").returning(CarParameter.id)
+        ).scalar_one()
+        connection.execute(insert(Part), [
+            {"part_number": f"P-{i}", "part_name": f"Part, \"{i}\"", "price": i, "currency": "EUR", "stock_quantity": i,
+             "part_parameters_id": vehicle_id if i % 2 else None}
+            for i in range(PARTS)
+        ])
+    engine.dispose()
+    return path
+
+
+def collect(db_path, fmt, compress) -> bytes:
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        chunks = [chunk async for chunk in export_chunks(async_sessionmaker(bind=engine), fmt, compress)]
+        await engine.dispose()
+        return chunks
+    chunks = asyncio.run(run())
+    # Header plus one chunk per partition of 4 rows, then the gzip trailer
+    assert len(chunks) >= PARTS // 4
+    return b"".join(chunks)
+
+
+def test_streamed_csv_export_is_gzipped(db_path):
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(collect(db_path, "csv", True)).decode())))
+    assert len(rows) == PARTS
+    assert list(rows[0]) == list(EXPORT_COLUMNS)
+    assert rows[3]["part_name"] == 'Part, "3"'
+    assert (rows[3]["car_name"], rows[3]["year"]) == ("Golf", "2015")
+    assert rows[4]["car_name"] == ""
+
+
+def test_streamed_ndjson_export(db_path):
+    rows = [json.loads(line) for line in collect(db_path, "ndjson", False).decode().splitlines()]
+    assert [row["id"] for row in rows] == list(range(1, PARTS + 1))
+    assert rows[1]["car_manufacturer"] == "Volkswagen"
+
+
+def test_file_export_imports_back(db_path, tmp_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    assert export_to_file(engine, str(tmp_path / "parts.csv.gz")) == PARTS
+
+    target = create_engine(f"sqlite:///{tmp_path}/copy.db")
+    Base.metadata.create_all(bind=target)
+    with gzip.open(tmp_path / "parts.csv.gz", "rt", newline="") as stream:
+        report = import_parts(target, stream, "csv")
+    assert (report.imported, report.rejected, report.vehicles_created) == (PARTS, 0, 1)
+    with target.connect() as connection:
+        assert connection.execute(select(Part.part_name).where(Part.part_number == "P-7")).scalar_one() == 'Part, "7"'
+    engine.dispose()
+    target.dispose()
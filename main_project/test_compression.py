@@ -0,0 +1,77 @@
+import gzip
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse, Response
+from fastapi.testclient import TestClient
+from jinja2 import Environment
+from compression import CompressionMiddleware, Fragment, gzip_page, render_gzip
+
+ROW = "<li style='display:inline; margin-left: 10px;'>Oil filter</li>"
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse(ROW * 50)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/encoded")
+    def encoded():
+        return Response(gzip.compress(b"x" * 500), media_type="text/plain", headers={"Content-Encoding": "gzip"})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((ROW for _ in range(20)), media_type="text/html")
+
+    return TestClient(app)
+
+
+def test_middleware_compresses_above_threshold():
+    client = make_client()
+    big = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert big.headers["content-encoding"] == "gzip"
+    assert int(big.headers["content-length"]) < len(ROW * 50)
+    assert big.text == ROW * 50
+    assert "Accept-Encoding" in big.headers["vary"]
+
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+    # Already encoded bodies are left alone
+    assert client.get("/encoded", headers={"Accept-Encoding": "gzip"}).content == b"x" * 500
+
+    streamed = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["content-encoding"] == "gzip"
+    assert streamed.text == ROW * 20
+
+
+def test_gzip_page_splices_precompressed_fragments():
+    rows = Fragment(ROW * 100)
+    options = Fragment("<option value='1'>Golf (2015) - Diesel</option>")
+    body = gzip_page(["<html><ul>", rows, "</ul><select>", options, "</select></html>"])
+    assert gzip.decompress(body).decode() == f"<html><ul>{ROW * 100}</ul><select>{options}</select></html>"
+
+    template = Environment(autoescape=True).from_string("<h1>{{ title }}</h1>{{ rows }}<p>{{ rows }}</p>")
+    rendered = gzip.decompress(render_gzip(template, {"title": "<Admin>", "rows": rows})).decode()
+    assert rendered == f"<h1>&lt;Admin&gt;</h1>{ROW * 100}<p>{ROW * 100}</p>"
+
+
+def test_compressed_responses_get_a_weak_etag(tmp_path):
+    from static_assets import CachedStaticFiles
+
+    (tmp_path / "app.js").write_text("console.log('x');\n" * 100)
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+    app.mount("/static", CachedStaticFiles(directory=str(tmp_path)), name="static")
+    client = TestClient(app)
+
+    identity = client.get("/static/app.js", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/static/app.js", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == "W/" + identity.headers["etag"]
+    # Revalidating with the weak tag still gets a 304
+    assert client.get("/static/app.js", headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]}).status_code == 304
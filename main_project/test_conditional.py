@@ -0,0 +1,113 @@
+import asyncio
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import main
+from main import app, get_async_db, get_current_user
+from db_models import Cart, CartItem, Part, User
+from database import Base
+from catalog_cache import catalog_cache
+from query_counter import assert_max_queries
+from db_routing import get_read_db
+
+
+@pytest.fixture
+def client(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/conditional.db")
+    TestingAsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def seed():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingAsyncSessionLocal() as db:
+            user = User(username="etag", email=f"{uuid.uuid4()}@test.com", hashed_password="x")
+            db.add(user)
+            await db.commit()
+            return user
+    user = asyncio.run(seed())
+
+    (tmp_path / "cart.html").write_text("{{ cart_total }}")
+    original_templates = main.templates
+    main.templates = Jinja2Templates(directory=str(tmp_path))
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    # Read routes take their session from get_read_db; both must use the counted test engine
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_read_db] = override_get_async_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    yield TestClient(app), engine
+    app.dependency_overrides.pop(get_async_db)
+    app.dependency_overrides.pop(get_read_db)
+    app.dependency_overrides.pop(get_current_user)
+    main.templates = original_templates
+    asyncio.run(engine.dispose())
+
+
+def test_catalog_if_none_match_is_answered_without_queries(client):
+    client, engine = client
+    first = client.get("/catalog")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    with assert_max_queries(engine, 0):
+        repeat = client.get("/catalog", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.content == b""
+    assert repeat.headers["etag"] == etag
+
+    # Any catalog write changes the validator
+    catalog_cache.bump()
+    changed = client.get("/catalog", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_cart_validator_follows_the_database(client):
+    client, engine = client
+    first = client.get("/cart")
+    etag = first.headers["etag"]
+
+    # Only the cart rows are read, nothing is rendered
+    with assert_max_queries(engine, 1):
+        repeat = client.get("/cart", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.headers["etag"] == etag
+
+    # A cart write seen only by the database, as when another worker handled it,
+    # still changes the validator, although this worker's catalog version did not move
+    async def add_item():
+        async with engine.begin() as connection:
+            user_id = (await connection.execute(select(User.id).filter_by(username="etag"))).scalar_one()
+            part_id = (await connection.execute(insert(Part).values(part_name="P", price=3.0, stock_quantity=1))).inserted_primary_key[0]
+            cart_id = (await connection.execute(insert(Cart).values(user_id=user_id))).inserted_primary_key[0]
+            await connection.execute(insert(CartItem).values(cart_id=cart_id, part_id=part_id, quantity=2))
+    version = catalog_cache.version
+    asyncio.run(add_item())
+    assert catalog_cache.version == version
+    changed = client.get("/cart", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.text == "6.0"
+    assert changed.headers["etag"] != etag
+
+
+def test_catalog_etags_are_off_without_catalog_caching(client, monkeypatch):
+    # CATALOG_CACHE_SIZE=0 is the multi-host setting: writes on other hosts never reach this version
+    client, _ = client
+    etag = client.get("/catalog").headers["etag"]
+    monkeypatch.setattr(catalog_cache, "maxsize", 0)
+    for header in [etag, "*"]:
+        response = client.get("/catalog", headers={"If-None-Match": header})
+        assert response.status_code == 200
+        assert "etag" not in response.headers
+
+
+def test_etags_are_per_user_and_page():
+    assert catalog_cache.etag("cart", 1) != catalog_cache.etag("cart", 2)
+    assert catalog_cache.etag("cart", 1) != catalog_cache.etag("main", 1)
+    assert catalog_cache.etag("cart", 1).startswith('W/"')
@@ -7,21 +7,19 @@ from db_models import User, Part, CartItem, CarParameter
 from database import Base
 from crud import add_part_to_db, add_part_parameters_to_db, remove_part_from_db
 
-# Setup test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"  # Use SQLite for testing
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
 # Override the dependency
 @pytest.fixture(scope="module")
-def test_db():
+def test_db(tmp_path_factory):
+    # Setup test database, one per run so the tracked test.db is left alone
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('crud')}/test.db", connect_args={"check_same_thread": False})
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base.metadata.create_all(bind=engine)  # Create tables
     db = TestingSessionLocal()
     try:
         yield db
     finally:
         db.close()
+        engine.dispose()
 
 @pytest.fixture(scope="module")
 def client(test_db):
@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import create_engine, exc, text
+from db_pool import pool_settings, pool_options, pool_statistics, StatsQueuePool
+
+
+def test_pool_settings_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "1")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "0.5")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "600")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "true")
+    settings = pool_settings()
+    assert settings == {"pool_size": 3, "max_overflow": 1, "pool_timeout": 0.5, "pool_recycle": 600, "pool_pre_ping": True}
+
+
+def test_memory_sqlite_keeps_default_pool():
+    assert pool_options("sqlite://") == {}
+    assert pool_options("sqlite:///./test.db")["poolclass"] is StatsQueuePool
+
+
+def test_pool_statistics_count_checkouts_and_timeouts(monkeypatch, tmp_path):
+    monkeypatch.setenv("DB_POOL_SIZE", "1")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "0.1")
+    url = f"sqlite:///{tmp_path}/pool.db"
+    engine = create_engine(url, **pool_options(url))
+
+    conn = engine.connect()
+    conn.execute(text("SELECT 1"))
+    stats = pool_statistics(engine)
+    assert stats["checked_out"] == 1
+    assert stats["checkouts"] == 1
+
+    # The only slot is taken, the next checkout must time out
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    stats = pool_statistics(engine)
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds_max"] >= 0.1
+
+    conn.close()
+    engine.dispose()
+    # Counters survive the pool being recreated
+    assert pool_statistics(engine)["timeouts"] == 1
+    assert pool_statistics(engine)["checked_out"] == 0
@@ -0,0 +1,133 @@
+import asyncio
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, text
+import database
+import db_routing
+from catalog_cache import catalog_cache
+from database import Base, LazyEngines
+from db_models import Part
+from db_routing import PIN_COOKIE, ReadYourWritesMiddleware, ReplicaRouter, pin_value
+from main import app
+
+
+def seed(path, part_name: str) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Part).values(part_name=part_name, description="d", price=1.0, currency="EUR", stock_quantity=1))
+    engine.dispose()
+
+
+@pytest.fixture
+def databases(tmp_path, monkeypatch):
+    # Two SQLite files stand in for a primary and its replicas; their rows tell them apart
+    seed(tmp_path / "primary.db", "from-primary")
+    seed(tmp_path / "replica1.db", "from-replica-1")
+    seed(tmp_path / "replica2.db", "from-replica-2")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/primary.db")
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", f"sqlite:///{tmp_path}/replica1.db, sqlite:///{tmp_path}/replica2.db")
+    engines = LazyEngines()
+    monkeypatch.setattr(database, "engines", engines)
+    # Settle on the current catalog version, so reads are not held on the primary
+    catalog_cache.bump()
+    router = ReplicaRouter()
+    router.catalog_settling()
+    monkeypatch.setattr(db_routing, "router", router)
+    yield engines, router
+    asyncio.run(engines.dispose())
+
+
+def read_part_name(router, pinned: bool = False) -> str:
+    async def read():
+        async with router.session(pinned=pinned) as db:
+            return (await db.execute(text("SELECT part_name FROM parts"))).scalar_one()
+    return asyncio.run(read())
+
+
+def test_reads_rotate_over_replicas(databases):
+    engines, router = databases
+    assert [read_part_name(router) for _ in range(4)] == ["from-replica-1", "from-replica-2"] * 2
+    assert read_part_name(router, pinned=True) == "from-primary"
+    assert router.stats() == {"replicas": 2, "replica_reads": 4, "primary_reads": 0, "pinned_reads": 1}
+
+
+def test_least_connections_avoids_busy_replica(databases):
+    engines, _ = databases
+    router = ReplicaRouter("least_connections")
+
+    async def read_while_replica_1_is_busy():
+        async with engines.replica_engines[0].connect():
+            async with router.session() as db:
+                return (await db.execute(text("SELECT part_name FROM parts"))).scalar_one()
+    assert asyncio.run(read_while_replica_1_is_busy()) == "from-replica-2"
+
+
+def test_catalog_write_sends_reads_to_primary_for_a_while(databases):
+    _, router = databases
+    # Cart writes move stock only and leave the replicas in use
+    catalog_cache.bump(catalog_write=False)
+    assert read_part_name(router).startswith("from-replica")
+    catalog_cache.bump()
+    assert read_part_name(router) == "from-primary"
+    router.catalog_changed = time.monotonic() - router.window
+    assert read_part_name(router).startswith("from-replica")
+
+
+def test_without_replicas_reads_use_primary(tmp_path, monkeypatch):
+    seed(tmp_path / "primary.db", "from-primary")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/primary.db")
+    monkeypatch.delenv("DATABASE_REPLICA_URLS", raising=False)
+    engines = LazyEngines()
+    monkeypatch.setattr(database, "engines", engines)
+    router = ReplicaRouter()
+    assert read_part_name(router) == "from-primary"
+    assert router.stats()["primary_reads"] == 1
+    asyncio.run(engines.dispose())
+
+
+def test_catalog_route_reads_replica_unless_client_just_wrote(databases):
+    client = TestClient(app)
+    catalog_cache.entries.clear()
+    assert client.get("/catalog").json()["items"][0]["part_name"] == "from-replica-1"
+    catalog_cache.entries.clear()
+    client.cookies.set(PIN_COOKIE, pin_value(int(time.time()) + 5))
+    assert client.get("/catalog").json()["items"][0]["part_name"] == "from-primary"
+
+
+def test_forged_or_stretched_pin_cookies_are_ignored(databases):
+    client = TestClient(app)
+    now = int(time.time())
+    for value in [str(now + 5), f"{now + 5}.{'0' * 32}", pin_value(now + 3600), pin_value(now - 1), "garbage"]:
+        catalog_cache.entries.clear()
+        client.cookies.set(PIN_COOKIE, value)
+        assert client.get("/catalog").json()["items"][0]["part_name"].startswith("from-replica")
+
+
+def test_successful_writes_set_the_pin_cookie(databases):
+    test_app = FastAPI()
+    test_app.add_middleware(ReadYourWritesMiddleware, window=5)
+
+    @test_app.post("/write")
+    async def write() -> dict:
+        return {}
+
+    @test_app.post("/fail")
+    async def fail() -> dict:
+        raise ValueError
+
+    @test_app.get("/read")
+    async def read() -> dict:
+        return {}
+
+    client = TestClient(test_app, raise_server_exceptions=False)
+    response = client.post("/write")
+    assert f"{PIN_COOKIE}=" in response.headers["set-cookie"]
+    assert "Max-Age=5" in response.headers["set-cookie"]
+    until = int(response.cookies[PIN_COOKIE].partition(".")[0])
+    assert response.cookies[PIN_COOKIE] == pin_value(until)
+    assert time.time() < until <= time.time() + 6
+    assert "set-cookie" not in client.get("/read").headers
+    assert "set-cookie" not in client.post("/fail").headers
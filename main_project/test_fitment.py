@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db_models import Part, CarParameter
+from database import Base
+from fitment import find_fitting_parts, fitment_facets
+
+VEHICLES = [
+    ("Volkswagen", "Golf", 2015, "Diesel"),
+    ("Volkswagen", "Golf", 2015, "Petrol"),
+    ("Volkswagen", "Golf", 2018, "Diesel"),
+    ("Volkswagen", "Passat", 2015, "Diesel"),
+    ("Audi", "A4", 2015, "Diesel"),
+]
+
+
+@pytest.fixture
+def run(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/fitment.db")
+    TestingAsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def seed():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingAsyncSessionLocal() as db:
+            # Vehicle i gets i + 1 parts
+            for i, (manufacturer, car_name, year, engine_type) in enumerate(VEHICLES):
+                vehicle = CarParameter(manufacturer=manufacturer, car_name=car_name, year=year, engine_type=engine_type)
+                db.add_all([Part(part_name=f"{car_name}-{year}-{engine_type}-{n}", part_parameters=vehicle) for n in range(i + 1)])
+            db.add(Part(part_name="Universal wiper"))
+            await db.commit()
+
+    asyncio.run(seed())
+
+    def run_with_session(test):
+        async def wrapper():
+            async with TestingAsyncSessionLocal() as db:
+                return await test(db)
+        return asyncio.run(wrapper())
+    yield run_with_session
+    asyncio.run(engine.dispose())
+
+
+def test_find_parts_for_vehicle(run):
+    async def test(db):
+        parts, cursor = await find_fitting_parts(db, manufacturer="Volkswagen", car_name="Golf", year=2015, engine_type="Diesel")
+        assert [part.part_name for part in parts] == ["Golf-2015-Diesel-0"]
+        assert cursor is None
+
+        pages, cursor = [], None
+        while True:
+            parts, cursor = await find_fitting_parts(db, year=2015, engine_type="Diesel", limit=3, cursor=cursor)
+            pages.append(len(parts))
+            if cursor is None:
+                break
+        assert pages == [3, 3, 3, 1]
+    run(test)
+
+
+def test_facets_ignore_their_own_filter(run):
+    async def test(db):
+        facets = await fitment_facets(db, manufacturer="Volkswagen", year=2015)
+        # Other makes stay visible with their counts for the same year
+        assert facets["manufacturer"] == [{"value": "Audi", "count": 5}, {"value": "Volkswagen", "count": 7}]
+        assert facets["year"] == [{"value": 2015, "count": 7}, {"value": 2018, "count": 3}]
+        assert facets["engine_type"] == [{"value": "Diesel", "count": 5}, {"value": "Petrol", "count": 2}]
+    run(test)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+import database
+from database import LazyEngines
+from main import app
+from metrics import Metrics, MetricsMiddleware, instrument_engine
+from profiler import SlowRequestProfiler
+
+
+def build_app(registry, profiler):
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    test_app = FastAPI()
+    test_app.add_middleware(MetricsMiddleware, registry=registry, profiler=profiler)
+
+    @test_app.get("/parts/{part_id}")
+    def read_part(part_id: int) -> dict:
+        with engine.connect() as connection:
+            for _ in range(part_id):
+                connection.execute(text("SELECT 1"))
+        return {"id": part_id}
+
+    @test_app.get("/slow")
+    def slow() -> dict:
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return {}
+
+    return test_app
+
+
+def test_requests_are_recorded_per_route_template():
+    registry = Metrics()
+    client = TestClient(build_app(registry, SlowRequestProfiler(threshold_ms=0)))
+    client.get("/parts/3")
+    client.get("/parts/1")
+    client.get("/missing")
+
+    rendered = registry.render()
+    assert 'http_responses_total{method="GET",route="/parts/{part_id}",status="200"} 2' in rendered
+    assert 'http_responses_total{method="GET",route="unmatched",status="404"} 1' in rendered
+    assert 'http_request_duration_seconds_count{method="GET",route="/parts/{part_id}"} 2' in rendered
+    # Statements run in the threadpool are attributed to the request that issued them
+    assert 'http_request_db_statements_sum{method="GET",route="/parts/{part_id}"} 4' in rendered
+    assert 'http_request_db_statements_bucket{method="GET",route="/parts/{part_id}",le="1"} 1' in rendered
+    assert 'http_request_db_statements_bucket{method="GET",route="/parts/{part_id}",le="+Inf"} 2' in rendered
+    assert "http_requests_in_flight 0" in rendered
+
+
+def test_extra_gauges_are_flattened():
+    rendered = Metrics().render({"db_pool": {"sync": {"checked_out": 2, "pool": "QueuePool"}}})
+    assert "# TYPE db_pool_checked_out gauge" in rendered
+    assert 'db_pool_checked_out{source="sync"} 2' in rendered
+    assert "db_pool_pool" not in rendered
+
+
+def test_slow_requests_are_profiled(tmp_path):
+    profiler = SlowRequestProfiler(threshold_ms=20, interval_ms=1, directory=str(tmp_path))
+    client = TestClient(build_app(Metrics(), profiler))
+    client.get("/parts/0")
+    assert list(tmp_path.iterdir()) == []
+
+    client.get("/slow")
+    profiles = list(tmp_path.iterdir())
+    assert len(profiles) == 1
+    assert "GET_slow" in profiles[0].name
+    lines = profiles[0].read_text().splitlines()
+    assert any("slow (test_metrics.py" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_metrics_endpoint(tmp_path, monkeypatch):
+    # Engines are built lazily; pool gauges appear once this worker has one
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/metrics.db")
+    engines = LazyEngines()
+    monkeypatch.setattr(database, "engines", engines)
+    client = TestClient(app)
+    assert "db_pool_checked_out" not in client.get("/metrics").text
+
+    engines.engine
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert "db_pool_checked_out" in response.text
+    asyncio.run(engines.dispose())
@@ -0,0 +1,40 @@
+import asyncio
+import io
+import os
+import pytest
+from fastapi import HTTPException, UploadFile
+import photo_store
+from photo_store import store_upload
+
+
+def upload(data: bytes, filename: str = "photo.JPEG") -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+def test_identical_uploads_are_stored_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(photo_store, "CHUNK_SIZE", 4)
+    data = b"not really a jpeg, but long enough for several chunks"
+
+    first = asyncio.run(store_upload(upload(data), str(tmp_path)))
+    second = asyncio.run(store_upload(upload(data, "renamed.jpg"), str(tmp_path)))
+    other = asyncio.run(store_upload(upload(data + b"!", "photo.jpg"), str(tmp_path)))
+
+    assert first == second != other
+    assert first.endswith(".jpg") and os.path.basename(os.path.dirname(first)) == os.path.basename(first)[:2]
+    with open(first, "rb") as f:
+        assert f.read() == data
+    # Only the two stored objects remain, no temporary files
+    assert sorted(len(files) for _, _, files in os.walk(tmp_path) if files) == [1, 1]
+
+
+def test_upload_limits(tmp_path):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(store_upload(upload(b"x" * 11), str(tmp_path), max_bytes=10))
+    assert error.value.status_code == 413
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(store_upload(upload(b"x", "photo.exe"), str(tmp_path)))
+    assert error.value.status_code == 415
+
+    assert asyncio.run(store_upload(upload(b""), str(tmp_path))) is None
+    assert asyncio.run(store_upload(upload(b"x", ""), str(tmp_path))) is None
+    assert not any(files for _, _, files in os.walk(tmp_path))
@@ -0,0 +1,50 @@
+import os
+import pytest
+from photo_variants import PhotoVariantCache, photo_key, render_variants
+
+PHOTO = "static/uploaded_photos/ab/" + "ab" * 32 + ".jpg"
+
+
+def test_url_falls_back_to_original_until_variant_exists(tmp_path):
+    cache = PhotoVariantCache(directory=str(tmp_path / "variants"), workers=0, static_dir=str(tmp_path))
+    assert cache.url(PHOTO) == "/" + PHOTO
+    assert cache.url("legacy.png") == "/static/legacy.png"
+    assert cache.url(None) == "/static/default_image.png"
+
+    (tmp_path / "variants").mkdir()
+    variant = tmp_path / "variants" / f"{photo_key(PHOTO)}-medium.webp"
+    variant.write_bytes(b"webp")
+    assert cache.url(PHOTO, "medium", "webp") == f"/static/variants/{photo_key(PHOTO)}-medium.webp"
+    with pytest.raises(ValueError):
+        cache.url(PHOTO, "huge")
+
+
+def test_directory_outside_static_serves_originals(tmp_path):
+    cache = PhotoVariantCache(directory=str(tmp_path / "variants"), workers=1, static_dir=str(tmp_path / "static"))
+    (tmp_path / "variants").mkdir()
+    (tmp_path / "variants" / f"{photo_key(PHOTO)}-thumb.jpg").write_bytes(b"jpg")
+    assert cache.url(PHOTO) == "/" + PHOTO
+    assert cache.stats()["pending"] == 0
+
+
+def test_cache_evicts_oldest_variants(tmp_path):
+    cache = PhotoVariantCache(directory=str(tmp_path), max_bytes=25, workers=0)
+    for age, name in enumerate(["old", "middle", "new"]):
+        path = tmp_path / f"{name}-thumb.jpg"
+        path.write_bytes(b"x" * 10)
+        os.utime(path, (1000 + age, 1000 + age))
+    cache.enforce_limit()
+    assert sorted(os.listdir(tmp_path)) == ["middle-thumb.jpg", "new-thumb.jpg"]
+    assert cache.stats()["evicted"] == 1
+
+
+def test_render_variants(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    source = tmp_path / "photo.png"
+    Image.new("RGBA", (1600, 1000), (200, 30, 30, 255)).save(source)
+
+    assert render_variants(str(source), str(tmp_path), "key") > 0
+    with Image.open(tmp_path / "key-thumb.jpg") as thumb:
+        assert thumb.size == (200, 125)
+    with Image.open(tmp_path / "key-medium.webp") as medium:
+        assert medium.size == (800, 500)
@@ -0,0 +1,100 @@
+import asyncio
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from fastapi.templating import Jinja2Templates
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import main
+from main import app, get_async_db, get_current_user
+from db_models import User, Part, Cart, CartItem, CarParameter
+from database import Base
+from query_counter import assert_max_queries
+from db_routing import get_read_db
+
+CART_SIZE = 40
+MANUFACTURER = f"Counted-{uuid.uuid4()}"
+
+
+async def seed(engine, TestingAsyncSessionLocal) -> User:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with TestingAsyncSessionLocal() as db:
+        user = User(username="n_plus_one", email=f"{uuid.uuid4()}@test.com", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        cart = Cart(user_id=user.id)
+        db.add(cart)
+        await db.flush()
+        for i in range(CART_SIZE):
+            parameter = CarParameter(car_name=f"Car{i}", manufacturer="Maker", year=2015, engine_type="Diesel")
+            part = Part(part_name=f"CountedPart{i}", description="d", price=1.0, currency="EUR", stock_quantity=5, manufacturer=MANUFACTURER, part_parameters=parameter)
+            db.add(part)
+            await db.flush()
+            db.add(CartItem(cart_id=cart.id, part_id=part.id, quantity=1))
+        await db.commit()
+        return user
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    # A database of its own, so the tracked test.db is left alone
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('query_counts')}/test.db")
+    TestingAsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    user = asyncio.run(seed(engine, TestingAsyncSessionLocal))
+    yield engine, TestingAsyncSessionLocal, user
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture(scope="module")
+def client(database, tmp_path_factory):
+    _, TestingAsyncSessionLocal, user = database
+
+    # Minimal templates that touch the same context the real pages do
+    template_dir = tmp_path_factory.mktemp("templates")
+    (template_dir / "cart.html").write_text("{% for item in cart_items %}{{ item.name }}{% endfor %}{{ cart_total }}")
+    (template_dir / "admin.html").write_text("{{ parts_html }}{{ part_parameters_html }}")
+    original_templates = main.templates
+    main.templates = Jinja2Templates(directory=str(template_dir))
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    # Read routes take their session from get_read_db; both must use the counted test engine
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_read_db] = override_get_async_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_async_db)
+    app.dependency_overrides.pop(get_read_db)
+    app.dependency_overrides.pop(get_current_user)
+    main.templates = original_templates
+
+
+def test_view_cart_query_count(database, client):
+    engine, _, _ = database
+    with assert_max_queries(engine, 2):
+        response = client.get("/cart")
+    assert response.status_code == 200
+    assert response.text.count("CountedPart") == CART_SIZE
+
+
+def test_admin_catalog_query_count(database, client):
+    engine, _, _ = database
+    with assert_max_queries(engine, 2):
+        response = client.get("/shop", params={"manufacturer": MANUFACTURER})
+    assert response.status_code == 200
+    assert "CountedPart39" in response.text
+
+
+def test_assert_max_queries_reports_overrun(database):
+    engine, TestingAsyncSessionLocal, _ = database
+
+    async def two_queries():
+        async with TestingAsyncSessionLocal() as db:
+            await db.get(Part, 1)
+            await db.get(User, 1)
+
+    with pytest.raises(AssertionError, match="at most 1 SQL statements, got 2"):
+        with assert_max_queries(engine, 1):
+            asyncio.run(two_queries())
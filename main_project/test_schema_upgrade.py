@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine, text
+import database
+from database import Base, LazyEngines, check_schema
+from schema_upgrade import missing_unique_keys
+
+# The cart and parts tables as they were before the unique indexes
+OLD_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR, email VARCHAR, hashed_password VARCHAR, role VARCHAR)",
+    """CREATE TABLE parts (id INTEGER PRIMARY KEY, part_name VARCHAR, description VARCHAR, price FLOAT, currency VARCHAR,
+           stock_quantity INTEGER, part_parameters_id INTEGER, part_number VARCHAR, manufacturer VARCHAR, photo_path VARCHAR)""",
+    "CREATE TABLE carts (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL)",
+    "CREATE TABLE cart_items (id INTEGER PRIMARY KEY, cart_id INTEGER NOT NULL, part_id INTEGER NOT NULL, quantity INTEGER)",
+]
+
+
+@pytest.fixture
+def old_database(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path}/old.db"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            connection.execute(text(statement))
+    # create_all adds the other tables but leaves these as they are
+    Base.metadata.create_all(engine)
+    monkeypatch.setenv("DATABASE_URL", url)
+    engines = LazyEngines()
+    monkeypatch.setattr(database, "engines", engines)
+    yield engine
+    engine.dispose()
+    asyncio.run(engines.dispose())
+
+
+def test_existing_tables_get_unique_indexes_and_duplicates_are_merged(old_database):
+    with old_database.begin() as connection:
+        connection.execute(text("INSERT INTO parts (id, part_number) VALUES (1, 'A'), (2, 'B'), (3, NULL), (4, NULL)"))
+        # User 7 has two carts, both holding part 1, and part 2 twice in the first one
+        connection.execute(text("INSERT INTO carts (id, user_id) VALUES (1, 7), (2, 7), (3, 8)"))
+        connection.execute(text(
+            "INSERT INTO cart_items (cart_id, part_id, quantity) VALUES (1, 1, 2), (2, 1, 3), (1, 2, 1), (1, 2, 1), (3, 1, 1)"
+        ))
+
+    with pytest.raises(RuntimeError, match="uq_carts_user_id"):
+        asyncio.run(check_schema("check"))
+    asyncio.run(check_schema("create"))
+
+    with old_database.connect() as connection:
+        assert missing_unique_keys(connection) == []
+        assert connection.execute(text("SELECT id, user_id FROM carts ORDER BY id")).all() == [(1, 7), (3, 8)]
+        items = connection.execute(text("SELECT cart_id, part_id, quantity FROM cart_items ORDER BY cart_id, part_id")).all()
+        assert items == [(1, 1, 5), (1, 2, 2), (3, 1, 1)]
+    assert asyncio.run(check_schema("check")) == []
+
+
+def test_duplicate_part_numbers_stop_the_upgrade(old_database):
+    with old_database.begin() as connection:
+        connection.execute(text("INSERT INTO parts (id, part_number) VALUES (1, 'A'), (2, 'A')"))
+    with pytest.raises(RuntimeError, match="duplicate part numbers A"):
+        asyncio.run(check_schema("create"))
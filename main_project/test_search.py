@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db_models import Part
+from database import Base
+from crud import add_part_to_db, remove_part_from_db
+from search import ensure_search_index, search_parts
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    # A fresh file so the FTS table is built from scratch
+    path = f"{tmp_path}/search.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    # A row that exists before the index does
+    db.add(Part(part_name="Legacy gasket", description="Head gasket", manufacturer="Elring", part_number="EL-1"))
+    db.commit()
+    with engine.begin() as connection:
+        ensure_search_index(connection)
+
+    def search(query, **kwargs):
+        async def run():
+            async with async_sessionmaker(bind=async_engine)() as async_db:
+                return await search_parts(async_db, query, **kwargs)
+        return asyncio.run(run())
+
+    yield db, search
+    db.close()
+    asyncio.run(async_engine.dispose())
+
+
+def test_search_ranks_name_matches_first(sessions):
+    db, search = sessions
+    add_part_to_db(db, name="Oil filter", description="Spin-on filter", price=9.0, currency="EUR", stock_quantity=3)
+    add_part_to_db(db, name="Drain plug", description="Fits the oil filter housing", price=2.0, currency="EUR", stock_quantity=3)
+
+    parts, next_offset = search("oil filter")
+    assert [part.part_name for part in parts] == ["Oil filter", "Drain plug"]
+    assert next_offset is None
+
+
+def test_search_finds_rows_indexed_by_rebuild_and_prefixes(sessions):
+    db, search = sessions
+    parts, _ = search("gask")
+    assert [part.part_number for part in parts] == ["EL-1"]
+    parts, _ = search("elring")
+    assert len(parts) == 1
+
+
+def test_search_follows_crud_writes(sessions):
+    db, search = sessions
+    add_part_to_db(db, name="Brake disc", description="Vented", price=40.0, currency="EUR", stock_quantity=3)
+    part = db.query(Part).filter_by(part_name="Brake disc").first()
+
+    # Stock changes leave the index alone, renames are picked up
+    db.execute(update(Part).where(Part.id == part.id).values(stock_quantity=0))
+    db.execute(update(Part).where(Part.id == part.id).values(part_name="Brake rotor"))
+    db.commit()
+    assert search("disc") == ([], None)
+    assert len(search("rotor")[0]) == 1
+
+    remove_part_from_db(db, part.id)
+    assert search("rotor") == ([], None)
+
+
+def test_search_paginates_and_ignores_query_syntax(sessions):
+    db, search = sessions
+    for i in range(5):
+        add_part_to_db(db, name=f"Spark plug {i}", description="Iridium", price=5.0, currency="EUR", stock_quantity=3)
+
+    first, next_offset = search("spark", limit=3)
+    second, last_offset = search("spark", limit=3, offset=next_offset)
+    assert (len(first), next_offset, len(second), last_offset) == (3, 3, 2, None)
+    assert len(search('"spark*(')[0]) == 5
+    assert search("  ") == ([], None)
@@ -0,0 +1,62 @@
+import asyncio
+import os
+from sqlalchemy import text
+import database
+import server
+from database import LazyEngines
+
+
+def test_options_come_from_environment(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    monkeypatch.setenv("KEEP_ALIVE", "75")
+    options = server.server_options(server.parse_args([]))
+    assert options["workers"] == 3
+    assert options["timeout_keep_alive"] == 75
+    assert options["backlog"] == 2048
+    assert options["limit_concurrency"] is None
+    assert options["loop"] in ("uvloop", "asyncio")
+    assert options["http"] in ("httptools", "h11")
+
+
+def test_arguments_override_environment(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    options = server.server_options(server.parse_args(["--workers", "1", "--limit-concurrency", "200"]))
+    assert options["workers"] == 1
+    assert options["limit_concurrency"] == 200
+
+
+def test_forked_child_gets_fresh_pools(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/fork.db")
+    engines = LazyEngines()
+    with engines.engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    inherited_pool = engines.engine.pool
+    assert inherited_pool.checkedin() == 1
+
+    engines.after_fork()
+    # The parent's connection is left alone, the child starts with an empty pool
+    assert engines.engine.pool is not inherited_pool
+    assert inherited_pool.checkedin() == 1
+    assert engines.engine.pool.checkedin() == 0
+    asyncio.run(engines.dispose())
+
+
+def test_schema_is_prepared_once_before_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/prepared.db")
+    monkeypatch.setenv("DB_SCHEMA", "create")
+    monkeypatch.setattr(database, "engines", LazyEngines())
+    server.prepare_schema()
+    assert os.environ["DB_SCHEMA"] == "skip"
+    assert (tmp_path / "prepared.db").exists()
+
+
+def test_workers_share_catalog_invalidations(monkeypatch):
+    monkeypatch.delenv("CATALOG_CACHE_CHANNEL", raising=False)
+    server.share_catalog_cache(1)
+    assert "CATALOG_CACHE_CHANNEL" not in os.environ
+    server.share_catalog_cache(4)
+    assert os.environ["CATALOG_CACHE_CHANNEL"].startswith("file:")
+    # An explicit channel is kept
+    monkeypatch.setenv("CATALOG_CACHE_CHANNEL", "file:/srv/catalog.version")
+    server.share_catalog_cache(4)
+    assert os.environ["CATALOG_CACHE_CHANNEL"] == "file:/srv/catalog.version"
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+import database
+import main
+import startup
+from database import LazyEngines, check_schema, get_pool_statistics, warm_up
+
+
+@pytest.fixture
+def fresh_engines(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/startup.db")
+    engines = LazyEngines()
+    monkeypatch.setattr(database, "engines", engines)
+    monkeypatch.setattr(startup, "engines", engines)
+    yield engines
+    asyncio.run(engines.dispose())
+
+
+def test_engines_are_built_on_first_use(fresh_engines):
+    assert fresh_engines.built() == []
+    assert get_pool_statistics() == {}
+    fresh_engines.AsyncSessionLocal
+    assert fresh_engines.built() == ["async_engine"]
+    assert set(get_pool_statistics()) == {"async"}
+
+
+def test_schema_check_and_create(fresh_engines):
+    with pytest.raises(RuntimeError, match="missing tables"):
+        asyncio.run(check_schema("check"))
+    assert "parts" in asyncio.run(check_schema("create"))
+    assert asyncio.run(check_schema("check")) == []
+    assert asyncio.run(check_schema("skip")) == []
+
+
+def test_warm_up_fills_the_pool(fresh_engines):
+    async def run():
+        await warm_up(3)
+        return fresh_engines.async_engine.pool.checkedin()
+    assert asyncio.run(run()) == 3
+
+
+def test_lifespan_starts_and_stops_the_worker(fresh_engines, tmp_path, monkeypatch):
+    monkeypatch.setattr(startup, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    with TestClient(main.app) as client:
+        timings = main.app.state.startup
+        assert {"import", "engines", "schema", "warmup", "total"} <= set(timings)
+        assert (tmp_path / "uploads").is_dir()
+        assert 'worker_startup_seconds{source="total"}' in client.get("/metrics").text
+    # Pools are closed on shutdown and rebuilt on next use
+    assert fresh_engines.built() == []
+
+
+def test_app_imports_without_static_directory(tmp_path):
+    # A clean checkout has no static/ yet; only the lifespan creates it
+    app_dir = os.path.dirname(os.path.abspath(main.__file__))
+    result = subprocess.run([sys.executable, "-c", "import main"], cwd=tmp_path, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": app_dir}, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert not (tmp_path / "static").exists()
@@ -0,0 +1,94 @@
+import gzip
+import os
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from static_assets import CachedStaticFiles, _digest, fingerprint_static, static_url, precompress, IMMUTABLE
+
+CSS = b"body { color: #333; }\n" * 200
+PHOTO = "ab" * 32 + ".jpg"
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "site.css").write_bytes(CSS)
+    (tmp_path / "photos").mkdir()
+    (tmp_path / "photos" / PHOTO).write_bytes(bytes(range(256)) * 4)
+    app = FastAPI()
+    app.mount("/static", CachedStaticFiles(directory=str(tmp_path)), name="static")
+    return TestClient(app), tmp_path
+
+
+def test_fingerprinted_assets_are_immutable(client):
+    client, directory = client
+    url = static_url("site.css", str(directory))
+    assert url.startswith("/static/site.") and url != "/static/site.css"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == CSS
+    assert response.headers["cache-control"] == IMMUTABLE
+
+    plain = client.get("/static/site.css")
+    assert plain.headers["cache-control"] == "no-cache"
+    assert plain.headers["etag"] == response.headers["etag"]
+    assert client.get("/static/site.css", headers={"If-None-Match": plain.headers["etag"]}).status_code == 304
+    # Weak comparison and the wildcard, as for the dynamic routes
+    for header in ['"other", W/' + plain.headers["etag"], "*"]:
+        assert client.get("/static/site.css", headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/static/site.css", headers={"If-None-Match": '"other"'}).status_code == 200
+
+    # After an edit the old fingerprint still resolves, but is no longer cached for good
+    (directory / "site.css").write_bytes(CSS + b"a { color: red; }\n")
+    stale = client.get(url)
+    assert stale.headers["cache-control"] == "no-cache"
+    assert static_url("site.css", str(directory)) != url
+
+
+def test_precompressed_siblings_are_served(client):
+    client, directory = client
+    assert precompress(str(directory)) >= 1
+    response = client.get("/static/site.css", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"].endswith('-gz"')
+    assert response.content == CSS  # decoded by the client
+
+    identity = client.get("/static/site.css", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] != response.headers["etag"]
+
+
+def test_range_requests(client):
+    client, directory = client
+    data = (directory / "photos" / PHOTO).read_bytes()
+    url = f"/static/photos/{PHOTO}"
+
+    response = client.get(url, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == data[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(data)}"
+    assert response.headers["cache-control"] == IMMUTABLE
+
+    assert client.get(url, headers={"Range": "bytes=-5"}).content == data[-5:]
+    assert client.get(url, headers={"Range": f"bytes={len(data)}-"}).status_code == 416
+    # A validator that no longer matches gets the whole file
+    assert client.get(url, headers={"Range": "bytes=0-1", "If-Range": '"other"'}).status_code == 200
+
+
+def test_refused_encodings_are_not_served(client):
+    client, directory = client
+    precompress(str(directory))
+    response = client.get("/static/site.css", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "content-encoding" not in response.headers
+    assert response.content == CSS
+
+
+def test_fingerprints_are_computed_up_front(client):
+    client, directory = client
+    _digest.cache_clear()
+    assert fingerprint_static(str(directory)) == 1  # site.css; the photo is content-addressed
+    assert _digest.cache_info().currsize == 1
+    static_url("site.css", str(directory))
+    client.get("/static/site.css")
+    assert _digest.cache_info().misses == 1
@@ -0,0 +1,98 @@
+import asyncio
+import httpx
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from main import app, get_async_db, get_current_user
+from db_models import User, Part, Cart, CartItem
+from database import Base
+
+STOCK = 7
+REQUESTS = 300
+USERS = 3
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # A fresh database file: the stress run needs the cart unique constraints
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/stock.db", poolclass=AsyncAdaptedQueuePool, pool_size=10, max_overflow=0)
+    TestingAsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    yield TestingAsyncSessionLocal
+    app.dependency_overrides.pop(get_async_db)
+    app.dependency_overrides.pop(get_current_user, None)
+    asyncio.run(engine.dispose())
+
+
+def test_parallel_adds_never_oversell(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            users = [User(username=f"buyer{i}", email=f"buyer{i}@test.com", hashed_password="x") for i in range(USERS)]
+            part = Part(part_name="LowStock", description="d", price=1.0, currency="EUR", stock_quantity=STOCK)
+            db.add_all(users + [part])
+            await db.commit()
+
+        # Each request is made by one of a few users, picked by a query parameter
+        async def override_get_current_user(user_index: int = 0):
+            return users[user_index]
+
+        app.dependency_overrides[get_current_user] = override_get_current_user
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post(f"/add_to_cart/{part.id}", params={"user_index": i % USERS}, data={"quantity": "1"})
+                for i in range(REQUESTS)
+            ))
+
+        succeeded = sum(1 for r in responses if r.status_code == 302)
+        refused = sum(1 for r in responses if r.status_code == 200 and r.json() == {"error": "Not enough stock"})
+        assert succeeded == STOCK
+        assert refused == REQUESTS - STOCK
+
+        async with session_factory() as db:
+            assert (await db.get(Part, part.id)).stock_quantity == 0
+            assert await db.scalar(select(func.sum(CartItem.quantity))) == STOCK
+            assert await db.scalar(select(func.count(CartItem.id))) <= USERS
+            assert await db.scalar(select(func.count(Cart.id))) <= USERS
+
+    asyncio.run(scenario())
+
+
+def test_update_and_remove_return_stock(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            user = User(username="buyer", email="buyer@test.com", hashed_password="x")
+            part = Part(part_name="Restock", description="d", price=1.0, currency="EUR", stock_quantity=5)
+            db.add_all([user, part])
+            await db.commit()
+        app.dependency_overrides[get_current_user] = lambda: user
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.post(f"/add_to_cart/{part.id}", data={"quantity": "2"})).status_code == 302
+            async with session_factory() as db:
+                item_id = await db.scalar(select(CartItem.id))
+
+            assert (await client.post(f"/update_cart/{item_id}", data={"quantity": "6"})).json() == {"error": "Not enough stock"}
+            assert (await client.post(f"/update_cart/{item_id}", data={"quantity": "4"})).status_code == 302
+            async with session_factory() as db:
+                assert (await db.get(Part, part.id)).stock_quantity == 1
+
+            assert (await client.post(f"/remove_from_cart/{item_id}")).status_code == 302
+            assert (await client.post(f"/remove_from_cart/{item_id}")).json() == {"error": "Cart item not found"}
+            async with session_factory() as db:
+                assert (await db.get(Part, part.id)).stock_quantity == 5
+
+    asyncio.run(scenario())
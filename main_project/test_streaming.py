@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from jinja2 import Environment
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db_models import Part
+from database import Base
+from catalog import CatalogPageStream, get_catalog_page
+from catalog_cache import catalog_cache
+from query_counter import QueryCounter
+from streaming import render_chunks, Spliced, Deferred
+
+PARTS = 70
+
+
+@pytest.fixture
+def run(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/streaming.db")
+    TestingAsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def seed():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingAsyncSessionLocal() as db:
+            db.add_all([Part(part_name=f"Streamed{i}", price=float(i)) for i in range(PARTS)])
+            await db.commit()
+    asyncio.run(seed())
+    catalog_cache.bump()
+
+    def run_with_session(test):
+        async def wrapper():
+            async with TestingAsyncSessionLocal() as db:
+                return await test(db, engine)
+        return asyncio.run(wrapper())
+    yield run_with_session
+    asyncio.run(engine.dispose())
+
+
+def test_page_stream_reads_in_batches_and_fills_the_cache(run):
+    async def test(db, engine):
+        expected, expected_cursor = await get_catalog_page(db, limit=30)
+        stream = CatalogPageStream(db, batch_size=25, limit=30)
+        fetches = []
+
+        async def before_fetch():
+            fetches.append(1)
+        stream.before_fetch = before_fetch
+
+        batches = [[part.id for part in batch] async for batch in stream.batches()]
+        assert [len(batch) for batch in batches] == [25, 5]
+        assert sum(batches, []) == [part.id for part in expected]
+        assert stream.next_cursor == expected_cursor
+        assert len(fetches) == 2
+
+        # The same page again is replayed from the cache
+        with QueryCounter(engine) as counter:
+            replay = [part.id async for part in CatalogPageStream(db, batch_size=25, limit=30)]
+        assert replay == sum(batches, [])
+        assert counter.count == 0
+    run(test)
+
+
+def test_template_header_is_flushed_before_rows_are_read(run):
+    class Rows(Spliced):
+        async def __aiter__(self):
+            for i in range(3):
+                yield f"<li>{i}</li>"
+
+    env = Environment(autoescape=True, enable_async=True)
+    template = env.from_string("<h1>{{ title }}</h1>{% for part in products %}{{ part.part_name }},{% endfor %}<ul>{{ rows }}</ul>{{ next_cursor }}")
+
+    async def test(db, engine):
+        products = CatalogPageStream(db, batch_size=25, limit=60)
+        context = {"title": "Parts", "products": products, "rows": Rows(), "next_cursor": Deferred(lambda: products.next_cursor)}
+        chunks = [chunk async for chunk in render_chunks(template, context)]
+
+        assert chunks[0] == "<h1>Parts</h1>"
+        # One chunk per database batch, one per spliced batch
+        assert len(chunks) >= 6
+        page = "".join(chunks)
+        assert page.count("Streamed") == 60
+        assert "<ul><li>0</li><li>1</li><li>2</li></ul>" in page
+        assert page.endswith(products.next_cursor)
+    run(test)
+
+
+def test_rendering_waits_for_a_slow_client_and_stops_when_it_leaves():
+    rendered = []
+
+    class Rows(Spliced):
+        async def __aiter__(self):
+            for i in range(1000):
+                rendered.append(i)
+                yield f"<li>{i}</li>"
+
+    template = Environment(autoescape=True, enable_async=True).from_string("<ul>{{ rows }}</ul>")
+
+    async def test():
+        chunks = render_chunks(template, {"rows": Rows()}, queue_size=4)
+        await anext(chunks)
+        await asyncio.sleep(0.05)
+        # The client has read one chunk; the producer is held a few pieces ahead of it
+        assert len(rendered) < 10
+        await chunks.aclose()
+        await asyncio.sleep(0.05)
+        stopped_at = len(rendered)
+        await asyncio.sleep(0.05)
+        assert len(rendered) == stopped_at
+    asyncio.run(test())